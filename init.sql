@@ -31,6 +31,20 @@ CREATE EXTENSION IF NOT EXISTS ltree WITH SCHEMA public;
 COMMENT ON EXTENSION ltree IS 'data type for hierarchical tree-like structures';
 
 
+--
+-- Name: pg_trgm; Type: EXTENSION; Schema: -; Owner: -
+--
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm WITH SCHEMA public;
+
+
+--
+-- Name: EXTENSION pg_trgm; Type: COMMENT; Schema: -; Owner: 
+--
+
+COMMENT ON EXTENSION pg_trgm IS 'text similarity measurement and index searching based on trigrams';
+
+
 --
 -- Name: init_citation_count(); Type: FUNCTION; Schema: public; Owner: postgres
 --
@@ -47,6 +61,72 @@ $$;
 
 ALTER FUNCTION public.init_citation_count() OWNER TO postgres;
 
+--
+-- Name: keyword_stats_apply(jsonb, character varying, integer, boolean, timestamp without time zone, integer); Type: FUNCTION; Schema: public; Owner: postgres
+--
+
+CREATE FUNCTION public.keyword_stats_apply(p_keywords jsonb, p_status character varying, p_subject_area_id integer, p_is_public boolean, p_created_at timestamp without time zone, p_delta integer) RETURNS void
+    LANGUAGE plpgsql
+    AS $$
+DECLARE
+    ids integer[];
+    -- Статус хранится кодом: 1 — в работе, 2 — приостановлен, 3 — завершен
+    st smallint := CASE p_status WHEN 'в работе' THEN 1 WHEN 'приостановлен' THEN 2 WHEN 'завершен' THEN 3 ELSE 0 END;
+    -- Проекты без предметной области учитываются под subject_area_id = 0
+    sa integer := coalesce(p_subject_area_id, 0);
+    pub boolean := coalesce(p_is_public, false);
+    mon date := date_trunc('month', p_created_at)::date;
+    -- Пары строятся только по первым 50 словам (по id): число строк пар растёт как k², а
+    -- один и тот же набор слов всегда даёт одно и то же подмножество (см. app.keywords)
+    pair_ids integer[];
+BEGIN
+    IF p_keywords IS NULL OR jsonb_typeof(p_keywords) <> 'array' THEN
+        RETURN;
+    END IF;
+
+    IF p_delta > 0 THEN
+        INSERT INTO keywords (keyword)
+        SELECT DISTINCT lower(btrim(k)) FROM jsonb_array_elements_text(p_keywords) AS k
+        WHERE btrim(k) <> ''
+        ORDER BY 1
+        ON CONFLICT (keyword) DO NOTHING;
+    END IF;
+    SELECT array_agg(w.id ORDER BY w.id) INTO ids
+    FROM keywords w
+    WHERE w.keyword IN (SELECT lower(btrim(k)) FROM jsonb_array_elements_text(p_keywords) AS k);
+    IF ids IS NULL THEN
+        RETURN;
+    END IF;
+    pair_ids := ids[1:50];
+
+    -- Строки обновляются в порядке id слова, чтобы параллельные записи не взаимоблокировались
+    INSERT INTO keyword_counts AS c (keyword_id, status, subject_area_id, is_public, projects)
+    SELECT id, st, sa, pub, p_delta FROM unnest(ids) AS id ORDER BY id
+    ON CONFLICT (keyword_id, status, subject_area_id, is_public) DO UPDATE SET projects = c.projects + EXCLUDED.projects;
+
+    INSERT INTO keyword_monthly AS m (month, keyword_id, status, subject_area_id, is_public, projects)
+    SELECT mon, id, st, sa, pub, p_delta FROM unnest(ids) AS id ORDER BY id
+    ON CONFLICT (month, keyword_id, status, subject_area_id, is_public) DO UPDATE SET projects = m.projects + EXCLUDED.projects;
+
+    INSERT INTO keyword_pairs AS p (keyword_a, keyword_b, status, subject_area_id, is_public, projects)
+    SELECT a, b, st, sa, pub, p_delta FROM unnest(pair_ids) AS a, unnest(pair_ids) AS b WHERE a < b ORDER BY a, b
+    ON CONFLICT (keyword_a, keyword_b, status, subject_area_id, is_public) DO UPDATE SET projects = p.projects + EXCLUDED.projects;
+
+    -- Обнулившиеся счётчики удаляем, чтобы таблицы не разрастались
+    IF p_delta < 0 THEN
+        DELETE FROM keyword_counts
+        WHERE keyword_id = ANY(ids) AND status = st AND subject_area_id = sa AND is_public = pub AND projects <= 0;
+        DELETE FROM keyword_monthly
+        WHERE month = mon AND keyword_id = ANY(ids) AND status = st AND subject_area_id = sa AND is_public = pub AND projects <= 0;
+        DELETE FROM keyword_pairs
+        WHERE keyword_a = ANY(pair_ids) AND keyword_b = ANY(pair_ids) AND status = st AND subject_area_id = sa AND is_public = pub AND projects <= 0;
+    END IF;
+END;
+$$;
+
+
+ALTER FUNCTION public.keyword_stats_apply(p_keywords jsonb, p_status character varying, p_subject_area_id integer, p_is_public boolean, p_created_at timestamp without time zone, p_delta integer) OWNER TO postgres;
+
 --
 -- Name: update_citation_count(); Type: FUNCTION; Schema: public; Owner: postgres
 --
@@ -55,28 +135,26 @@ CREATE FUNCTION public.update_citation_count() RETURNS trigger
     LANGUAGE plpgsql
     AS $$
 BEGIN
-    -- Обновляем цитируемость для нового связанного проекта (при INSERT/UPDATE)
-    IF (TG_OP = 'INSERT' OR TG_OP = 'UPDATE') THEN
-        UPDATE projects 
-        SET citation_count = (
-            SELECT COUNT(*) 
-            FROM project_connections 
-            WHERE related_project_id = NEW.related_project_id
-        )
-        WHERE id = NEW.related_project_id;
+    -- Массовая очистка проекта пересчитывает счётчики один раз в конце
+    IF current_setting('app.skip_citation_trigger', true) = 'on' THEN
+        RETURN NULL;
     END IF;
-    
-    -- Обновляем цитируемость для старого связанного проекта (при DELETE/UPDATE)
-    IF (TG_OP = 'DELETE' OR TG_OP = 'UPDATE') AND OLD.related_project_id IS NOT NULL THEN
-        UPDATE projects 
-        SET citation_count = (
-            SELECT COUNT(*) 
-            FROM project_connections 
-            WHERE related_project_id = OLD.related_project_id
-        )
+
+    -- Счётчик меняется на единицу, без пересчёта всех входящих связей
+    -- (сверка и исправление — периодическая задача citations.verify)
+    IF TG_OP = 'INSERT' THEN
+        UPDATE projects SET citation_count = coalesce(citation_count, 0) + 1
+        WHERE id = NEW.related_project_id;
+    ELSIF TG_OP = 'DELETE' THEN
+        UPDATE projects SET citation_count = greatest(coalesce(citation_count, 0) - 1, 0)
         WHERE id = OLD.related_project_id;
+    ELSIF NEW.related_project_id IS DISTINCT FROM OLD.related_project_id THEN
+        UPDATE projects SET citation_count = greatest(coalesce(citation_count, 0) - 1, 0)
+        WHERE id = OLD.related_project_id;
+        UPDATE projects SET citation_count = coalesce(citation_count, 0) + 1
+        WHERE id = NEW.related_project_id;
     END IF;
-    
+
     RETURN NULL;
 END;
 $$;
@@ -84,10 +162,263 @@ $$;
 
 ALTER FUNCTION public.update_citation_count() OWNER TO postgres;
 
+--
+-- Name: update_keyword_stats(); Type: FUNCTION; Schema: public; Owner: postgres
+--
+
+CREATE FUNCTION public.update_keyword_stats() RETURNS trigger
+    LANGUAGE plpgsql
+    AS $$
+BEGIN
+    IF TG_OP = 'UPDATE'
+       AND NEW.keywords IS NOT DISTINCT FROM OLD.keywords
+       AND NEW.status IS NOT DISTINCT FROM OLD.status
+       AND NEW.subject_area_id IS NOT DISTINCT FROM OLD.subject_area_id
+       AND NEW.is_public IS NOT DISTINCT FROM OLD.is_public
+       AND NEW.created_at IS NOT DISTINCT FROM OLD.created_at
+       AND (NEW.deleted_at IS NULL) = (OLD.deleted_at IS NULL) THEN
+        RETURN NULL;
+    END IF;
+
+    -- Снимаем старую версию проекта (удалённые проекты уже не учитываются)
+    IF (TG_OP = 'DELETE' OR TG_OP = 'UPDATE') AND OLD.deleted_at IS NULL THEN
+        PERFORM keyword_stats_apply(OLD.keywords, OLD.status, OLD.subject_area_id, OLD.is_public, OLD.created_at, -1);
+    END IF;
+
+    -- Учитываем новую
+    IF (TG_OP = 'INSERT' OR TG_OP = 'UPDATE') AND NEW.deleted_at IS NULL THEN
+        PERFORM keyword_stats_apply(NEW.keywords, NEW.status, NEW.subject_area_id, NEW.is_public, NEW.created_at, 1);
+    END IF;
+
+    RETURN NULL;
+END;
+$$;
+
+
+ALTER FUNCTION public.update_keyword_stats() OWNER TO postgres;
+
+--
+-- Name: update_subject_area_project_stats(); Type: FUNCTION; Schema: public; Owner: postgres
+--
+
+CREATE FUNCTION public.update_subject_area_project_stats() RETURNS trigger
+    LANGUAGE plpgsql
+    AS $$
+BEGIN
+    -- Снимаем проект со старой области (удалённые проекты уже не учитываются)
+    IF (TG_OP = 'DELETE' OR TG_OP = 'UPDATE') AND OLD.subject_area_id IS NOT NULL AND OLD.deleted_at IS NULL THEN
+        UPDATE subject_area_project_stats
+        SET projects_total = projects_total - 1,
+            projects_active = projects_active - (OLD.status = 'в работе')::integer,
+            projects_paused = projects_paused - (OLD.status = 'приостановлен')::integer,
+            projects_completed = projects_completed - (OLD.status = 'завершен')::integer
+        WHERE subject_area_id = OLD.subject_area_id;
+    END IF;
+
+    -- Учитываем проект в новой области
+    IF (TG_OP = 'INSERT' OR TG_OP = 'UPDATE') AND NEW.subject_area_id IS NOT NULL AND NEW.deleted_at IS NULL THEN
+        INSERT INTO subject_area_project_stats AS s
+            (subject_area_id, projects_total, projects_active, projects_paused, projects_completed)
+        VALUES (
+            NEW.subject_area_id, 1,
+            (NEW.status = 'в работе')::integer,
+            (NEW.status = 'приостановлен')::integer,
+            (NEW.status = 'завершен')::integer
+        )
+        ON CONFLICT (subject_area_id) DO UPDATE
+        SET projects_total = s.projects_total + 1,
+            projects_active = s.projects_active + EXCLUDED.projects_active,
+            projects_paused = s.projects_paused + EXCLUDED.projects_paused,
+            projects_completed = s.projects_completed + EXCLUDED.projects_completed;
+    END IF;
+
+    RETURN NULL;
+END;
+$$;
+
+
+ALTER FUNCTION public.update_subject_area_project_stats() OWNER TO postgres;
+
 SET default_tablespace = '';
 
 SET default_table_access_method = heap;
 
+--
+-- Name: analytics_refreshes; Type: TABLE; Schema: public; Owner: postgres
+--
+
+CREATE TABLE public.analytics_refreshes (
+    view_name character varying(100) NOT NULL,
+    refreshed_at timestamp with time zone NOT NULL,
+    seconds double precision NOT NULL
+);
+
+
+ALTER TABLE public.analytics_refreshes OWNER TO postgres;
+
+--
+-- Name: file_texts; Type: TABLE; Schema: public; Owner: postgres
+--
+
+CREATE TABLE public.file_texts (
+    file_id integer NOT NULL,
+    project_id integer NOT NULL,
+    sha256 character varying(64) NOT NULL,
+    content_tsv tsvector NOT NULL,
+    excerpt text,
+    extracted_at timestamp without time zone DEFAULT CURRENT_TIMESTAMP NOT NULL
+);
+
+
+ALTER TABLE public.file_texts OWNER TO postgres;
+
+--
+-- Name: idempotency_keys; Type: TABLE; Schema: public; Owner: postgres
+--
+
+CREATE TABLE public.idempotency_keys (
+    scope character varying(320) NOT NULL,
+    key character varying(255) NOT NULL,
+    fingerprint character varying(64) NOT NULL,
+    status character varying(20) DEFAULT 'in_progress'::character varying NOT NULL,
+    response_status integer,
+    response_headers jsonb,
+    response_body bytea,
+    created_at timestamp without time zone DEFAULT CURRENT_TIMESTAMP NOT NULL,
+    expires_at timestamp without time zone NOT NULL,
+    CONSTRAINT idempotency_keys_status_check CHECK (((status)::text = ANY ((ARRAY['in_progress'::character varying, 'done'::character varying])::text[])))
+);
+
+
+ALTER TABLE public.idempotency_keys OWNER TO postgres;
+
+--
+-- Name: jobs; Type: TABLE; Schema: public; Owner: postgres
+--
+
+CREATE TABLE public.jobs (
+    id bigint NOT NULL,
+    kind character varying(100) NOT NULL,
+    payload jsonb DEFAULT '{}'::jsonb NOT NULL,
+    status character varying(20) DEFAULT 'pending'::character varying NOT NULL,
+    attempts integer DEFAULT 0 NOT NULL,
+    max_attempts integer DEFAULT 5 NOT NULL,
+    run_at timestamp without time zone DEFAULT CURRENT_TIMESTAMP NOT NULL,
+    locked_at timestamp without time zone,
+    last_error text,
+    result jsonb,
+    dedupe_key character varying(255),
+    created_at timestamp without time zone DEFAULT CURRENT_TIMESTAMP NOT NULL,
+    updated_at timestamp without time zone DEFAULT CURRENT_TIMESTAMP NOT NULL,
+    CONSTRAINT jobs_status_check CHECK (((status)::text = ANY ((ARRAY['pending'::character varying, 'running'::character varying, 'done'::character varying, 'failed'::character varying])::text[])))
+);
+
+
+ALTER TABLE public.jobs OWNER TO postgres;
+
+--
+-- Name: jobs_id_seq; Type: SEQUENCE; Schema: public; Owner: postgres
+--
+
+CREATE SEQUENCE public.jobs_id_seq
+    START WITH 1
+    INCREMENT BY 1
+    NO MINVALUE
+    NO MAXVALUE
+    CACHE 1;
+
+
+ALTER SEQUENCE public.jobs_id_seq OWNER TO postgres;
+
+--
+-- Name: jobs_id_seq; Type: SEQUENCE OWNED BY; Schema: public; Owner: postgres
+--
+
+ALTER SEQUENCE public.jobs_id_seq OWNED BY public.jobs.id;
+
+
+--
+-- Name: keyword_counts; Type: TABLE; Schema: public; Owner: postgres
+--
+
+CREATE TABLE public.keyword_counts (
+    keyword_id integer NOT NULL,
+    status smallint NOT NULL,
+    subject_area_id integer NOT NULL,
+    is_public boolean NOT NULL,
+    projects integer NOT NULL
+);
+
+
+ALTER TABLE public.keyword_counts OWNER TO postgres;
+
+--
+-- Name: keyword_monthly; Type: TABLE; Schema: public; Owner: postgres
+--
+
+CREATE TABLE public.keyword_monthly (
+    month date NOT NULL,
+    keyword_id integer NOT NULL,
+    status smallint NOT NULL,
+    subject_area_id integer NOT NULL,
+    is_public boolean NOT NULL,
+    projects integer NOT NULL
+);
+
+
+ALTER TABLE public.keyword_monthly OWNER TO postgres;
+
+--
+-- Name: keyword_pairs; Type: TABLE; Schema: public; Owner: postgres
+--
+
+CREATE TABLE public.keyword_pairs (
+    keyword_a integer NOT NULL,
+    keyword_b integer NOT NULL,
+    status smallint NOT NULL,
+    subject_area_id integer NOT NULL,
+    is_public boolean NOT NULL,
+    projects integer NOT NULL,
+    CONSTRAINT keyword_pairs_order_check CHECK ((keyword_a < keyword_b))
+);
+
+
+ALTER TABLE public.keyword_pairs OWNER TO postgres;
+
+--
+-- Name: keywords; Type: TABLE; Schema: public; Owner: postgres
+--
+
+CREATE TABLE public.keywords (
+    id integer NOT NULL,
+    keyword text NOT NULL
+);
+
+
+ALTER TABLE public.keywords OWNER TO postgres;
+
+--
+-- Name: keywords_id_seq; Type: SEQUENCE; Schema: public; Owner: postgres
+--
+
+CREATE SEQUENCE public.keywords_id_seq
+    AS integer
+    START WITH 1
+    INCREMENT BY 1
+    NO MINVALUE
+    NO MAXVALUE
+    CACHE 1;
+
+
+ALTER SEQUENCE public.keywords_id_seq OWNER TO postgres;
+
+--
+-- Name: keywords_id_seq; Type: SEQUENCE OWNED BY; Schema: public; Owner: postgres
+--
+
+ALTER SEQUENCE public.keywords_id_seq OWNED BY public.keywords.id;
+
+
 --
 -- Name: project_connections; Type: TABLE; Schema: public; Owner: postgres
 --
@@ -102,6 +433,22 @@ CREATE TABLE public.project_connections (
 
 ALTER TABLE public.project_connections OWNER TO postgres;
 
+--
+-- Name: project_duplicate_pairs; Type: TABLE; Schema: public; Owner: postgres
+--
+
+CREATE TABLE public.project_duplicate_pairs (
+    project_id integer NOT NULL,
+    duplicate_id integer NOT NULL,
+    title_similarity real NOT NULL,
+    keyword_similarity real NOT NULL,
+    found_at timestamp without time zone DEFAULT CURRENT_TIMESTAMP NOT NULL,
+    CONSTRAINT project_duplicate_pairs_order_check CHECK ((project_id < duplicate_id))
+);
+
+
+ALTER TABLE public.project_duplicate_pairs OWNER TO postgres;
+
 --
 -- Name: project_files; Type: TABLE; Schema: public; Owner: postgres
 --
@@ -111,6 +458,7 @@ CREATE TABLE public.project_files (
     project_id integer NOT NULL,
     name character varying(255) NOT NULL,
     url text NOT NULL,
+    object_key text,
     file_metadata jsonb DEFAULT '{}'::jsonb NOT NULL,
     uploaded_by integer NOT NULL,
     uploaded_at timestamp without time zone DEFAULT CURRENT_TIMESTAMP NOT NULL,
@@ -142,6 +490,33 @@ ALTER SEQUENCE public.project_files_id_seq OWNER TO postgres;
 ALTER SEQUENCE public.project_files_id_seq OWNED BY public.project_files.id;
 
 
+--
+-- Name: project_lsh_buckets; Type: TABLE; Schema: public; Owner: postgres
+--
+
+CREATE TABLE public.project_lsh_buckets (
+    band smallint NOT NULL,
+    bucket bigint NOT NULL,
+    project_id integer NOT NULL
+);
+
+
+ALTER TABLE public.project_lsh_buckets OWNER TO postgres;
+
+--
+-- Name: project_minhash; Type: TABLE; Schema: public; Owner: postgres
+--
+
+CREATE TABLE public.project_minhash (
+    project_id integer NOT NULL,
+    signature bytea NOT NULL,
+    features integer NOT NULL,
+    updated_at timestamp without time zone DEFAULT CURRENT_TIMESTAMP NOT NULL
+);
+
+
+ALTER TABLE public.project_minhash OWNER TO postgres;
+
 --
 -- Name: projects; Type: TABLE; Schema: public; Owner: postgres
 --
@@ -156,6 +531,8 @@ CREATE TABLE public.projects (
     created_at timestamp without time zone DEFAULT CURRENT_TIMESTAMP NOT NULL,
     is_public boolean DEFAULT false NOT NULL,
     citation_count integer DEFAULT 0,
+    deleted_at timestamp without time zone,
+    pagerank double precision,
     CONSTRAINT projects_status_check CHECK (((status)::text = ANY ((ARRAY['в работе'::character varying, 'приостановлен'::character varying, 'завершен'::character varying])::text[])))
 );
 
@@ -191,9 +568,15 @@ ALTER SEQUENCE public.projects_id_seq OWNED BY public.projects.id;
 CREATE TABLE public.reports (
     id integer NOT NULL,
     file_id integer NOT NULL,
-    table_data jsonb NOT NULL,
+    table_data jsonb DEFAULT '{}'::jsonb NOT NULL,
     view_options jsonb,
-    created_at timestamp without time zone DEFAULT CURRENT_TIMESTAMP NOT NULL
+    created_at timestamp without time zone DEFAULT CURRENT_TIMESTAMP NOT NULL,
+    status character varying(20) DEFAULT 'pending'::character varying NOT NULL,
+    error text,
+    row_count bigint,
+    source_sha256 character varying(64),
+    updated_at timestamp without time zone DEFAULT CURRENT_TIMESTAMP NOT NULL,
+    CONSTRAINT reports_status_check CHECK (((status)::text = ANY ((ARRAY['pending'::character varying, 'ready'::character varying, 'failed'::character varying])::text[])))
 );
 
 
@@ -221,6 +604,21 @@ ALTER SEQUENCE public.reports_id_seq OWNER TO postgres;
 ALTER SEQUENCE public.reports_id_seq OWNED BY public.reports.id;
 
 
+--
+-- Name: subject_area_project_stats; Type: TABLE; Schema: public; Owner: postgres
+--
+
+CREATE TABLE public.subject_area_project_stats (
+    subject_area_id integer NOT NULL,
+    projects_total integer DEFAULT 0 NOT NULL,
+    projects_active integer DEFAULT 0 NOT NULL,
+    projects_paused integer DEFAULT 0 NOT NULL,
+    projects_completed integer DEFAULT 0 NOT NULL
+);
+
+
+ALTER TABLE public.subject_area_project_stats OWNER TO postgres;
+
 --
 -- Name: subject_areas; Type: TABLE; Schema: public; Owner: postgres
 --
@@ -338,6 +736,73 @@ ALTER SEQUENCE public.users_id_seq OWNER TO postgres;
 ALTER SEQUENCE public.users_id_seq OWNED BY public.users.id;
 
 
+--
+-- Name: analytics_projects_weekly; Type: MATERIALIZED VIEW; Schema: public; Owner: postgres
+--
+
+CREATE MATERIALIZED VIEW public.analytics_projects_weekly AS
+ SELECT (date_trunc('week'::text, projects.created_at))::date AS week,
+    projects.status,
+    projects.subject_area_id,
+    count(*) AS projects
+   FROM public.projects
+  WHERE (projects.deleted_at IS NULL)
+  GROUP BY ((date_trunc('week'::text, projects.created_at))::date), projects.status, projects.subject_area_id
+  WITH NO DATA;
+
+
+ALTER MATERIALIZED VIEW public.analytics_projects_weekly OWNER TO postgres;
+
+--
+-- Name: analytics_team_weekly; Type: MATERIALIZED VIEW; Schema: public; Owner: postgres
+--
+
+CREATE MATERIALIZED VIEW public.analytics_team_weekly AS
+ SELECT (date_trunc('week'::text, tm.joined_at))::date AS week,
+    tm.project_id,
+    tm.role,
+    count(*) AS joined
+   FROM (public.team_members tm
+     JOIN public.projects p ON ((p.id = tm.project_id)))
+  WHERE (p.deleted_at IS NULL)
+  GROUP BY ((date_trunc('week'::text, tm.joined_at))::date), tm.project_id, tm.role
+  WITH NO DATA;
+
+
+ALTER MATERIALIZED VIEW public.analytics_team_weekly OWNER TO postgres;
+
+--
+-- Name: analytics_uploads_monthly; Type: MATERIALIZED VIEW; Schema: public; Owner: postgres
+--
+
+CREATE MATERIALIZED VIEW public.analytics_uploads_monthly AS
+ SELECT (date_trunc('month'::text, f.uploaded_at))::date AS month,
+    f.project_id,
+    count(*) AS files,
+    (sum(COALESCE(((f.file_metadata ->> 'size'::text))::bigint, (0)::bigint)))::bigint AS bytes
+   FROM (public.project_files f
+     JOIN public.projects p ON ((p.id = f.project_id)))
+  WHERE (p.deleted_at IS NULL)
+  GROUP BY ((date_trunc('month'::text, f.uploaded_at))::date), f.project_id
+  WITH NO DATA;
+
+
+ALTER MATERIALIZED VIEW public.analytics_uploads_monthly OWNER TO postgres;
+
+--
+-- Name: jobs id; Type: DEFAULT; Schema: public; Owner: postgres
+--
+
+ALTER TABLE ONLY public.jobs ALTER COLUMN id SET DEFAULT nextval('public.jobs_id_seq'::regclass);
+
+
+--
+-- Name: keywords id; Type: DEFAULT; Schema: public; Owner: postgres
+--
+
+ALTER TABLE ONLY public.keywords ALTER COLUMN id SET DEFAULT nextval('public.keywords_id_seq'::regclass);
+
+
 --
 -- Name: project_files id; Type: DEFAULT; Schema: public; Owner: postgres
 --
@@ -380,6 +845,78 @@ ALTER TABLE ONLY public.team_members ALTER COLUMN id SET DEFAULT nextval('public
 ALTER TABLE ONLY public.users ALTER COLUMN id SET DEFAULT nextval('public.users_id_seq'::regclass);
 
 
+--
+-- Name: analytics_refreshes analytics_refreshes_pkey; Type: CONSTRAINT; Schema: public; Owner: postgres
+--
+
+ALTER TABLE ONLY public.analytics_refreshes
+    ADD CONSTRAINT analytics_refreshes_pkey PRIMARY KEY (view_name);
+
+
+--
+-- Name: file_texts file_texts_pkey; Type: CONSTRAINT; Schema: public; Owner: postgres
+--
+
+ALTER TABLE ONLY public.file_texts
+    ADD CONSTRAINT file_texts_pkey PRIMARY KEY (file_id);
+
+
+--
+-- Name: idempotency_keys idempotency_keys_pkey; Type: CONSTRAINT; Schema: public; Owner: postgres
+--
+
+ALTER TABLE ONLY public.idempotency_keys
+    ADD CONSTRAINT idempotency_keys_pkey PRIMARY KEY (scope, key);
+
+
+--
+-- Name: jobs jobs_pkey; Type: CONSTRAINT; Schema: public; Owner: postgres
+--
+
+ALTER TABLE ONLY public.jobs
+    ADD CONSTRAINT jobs_pkey PRIMARY KEY (id);
+
+
+--
+-- Name: keyword_counts keyword_counts_pkey; Type: CONSTRAINT; Schema: public; Owner: postgres
+--
+
+ALTER TABLE ONLY public.keyword_counts
+    ADD CONSTRAINT keyword_counts_pkey PRIMARY KEY (keyword_id, status, subject_area_id, is_public);
+
+
+--
+-- Name: keyword_monthly keyword_monthly_pkey; Type: CONSTRAINT; Schema: public; Owner: postgres
+--
+
+ALTER TABLE ONLY public.keyword_monthly
+    ADD CONSTRAINT keyword_monthly_pkey PRIMARY KEY (month, keyword_id, status, subject_area_id, is_public);
+
+
+--
+-- Name: keyword_pairs keyword_pairs_pkey; Type: CONSTRAINT; Schema: public; Owner: postgres
+--
+
+ALTER TABLE ONLY public.keyword_pairs
+    ADD CONSTRAINT keyword_pairs_pkey PRIMARY KEY (keyword_a, keyword_b, status, subject_area_id, is_public);
+
+
+--
+-- Name: keywords keywords_keyword_key; Type: CONSTRAINT; Schema: public; Owner: postgres
+--
+
+ALTER TABLE ONLY public.keywords
+    ADD CONSTRAINT keywords_keyword_key UNIQUE (keyword);
+
+
+--
+-- Name: keywords keywords_pkey; Type: CONSTRAINT; Schema: public; Owner: postgres
+--
+
+ALTER TABLE ONLY public.keywords
+    ADD CONSTRAINT keywords_pkey PRIMARY KEY (id);
+
+
 --
 -- Name: project_connections project_connections_pkey; Type: CONSTRAINT; Schema: public; Owner: postgres
 --
@@ -388,6 +925,14 @@ ALTER TABLE ONLY public.project_connections
     ADD CONSTRAINT project_connections_pkey PRIMARY KEY (project_id, related_project_id);
 
 
+--
+-- Name: project_duplicate_pairs project_duplicate_pairs_pkey; Type: CONSTRAINT; Schema: public; Owner: postgres
+--
+
+ALTER TABLE ONLY public.project_duplicate_pairs
+    ADD CONSTRAINT project_duplicate_pairs_pkey PRIMARY KEY (project_id, duplicate_id);
+
+
 --
 -- Name: project_files project_files_pkey; Type: CONSTRAINT; Schema: public; Owner: postgres
 --
@@ -396,6 +941,22 @@ ALTER TABLE ONLY public.project_files
     ADD CONSTRAINT project_files_pkey PRIMARY KEY (id);
 
 
+--
+-- Name: project_lsh_buckets project_lsh_buckets_pkey; Type: CONSTRAINT; Schema: public; Owner: postgres
+--
+
+ALTER TABLE ONLY public.project_lsh_buckets
+    ADD CONSTRAINT project_lsh_buckets_pkey PRIMARY KEY (band, bucket, project_id);
+
+
+--
+-- Name: project_minhash project_minhash_pkey; Type: CONSTRAINT; Schema: public; Owner: postgres
+--
+
+ALTER TABLE ONLY public.project_minhash
+    ADD CONSTRAINT project_minhash_pkey PRIMARY KEY (project_id);
+
+
 --
 -- Name: projects projects_pkey; Type: CONSTRAINT; Schema: public; Owner: postgres
 --
@@ -412,6 +973,14 @@ ALTER TABLE ONLY public.reports
     ADD CONSTRAINT reports_pkey PRIMARY KEY (id);
 
 
+--
+-- Name: subject_area_project_stats subject_area_project_stats_pkey; Type: CONSTRAINT; Schema: public; Owner: postgres
+--
+
+ALTER TABLE ONLY public.subject_area_project_stats
+    ADD CONSTRAINT subject_area_project_stats_pkey PRIMARY KEY (subject_area_id);
+
+
 --
 -- Name: subject_areas subject_areas_pkey; Type: CONSTRAINT; Schema: public; Owner: postgres
 --
@@ -444,6 +1013,160 @@ ALTER TABLE ONLY public.users
     ADD CONSTRAINT users_pkey PRIMARY KEY (id);
 
 
+--
+-- Name: analytics_projects_weekly_key; Type: INDEX; Schema: public; Owner: postgres
+--
+
+CREATE UNIQUE INDEX analytics_projects_weekly_key ON public.analytics_projects_weekly USING btree (week, status, subject_area_id);
+
+
+--
+-- Name: analytics_team_weekly_key; Type: INDEX; Schema: public; Owner: postgres
+--
+
+CREATE UNIQUE INDEX analytics_team_weekly_key ON public.analytics_team_weekly USING btree (week, project_id, role);
+
+
+--
+-- Name: analytics_uploads_monthly_key; Type: INDEX; Schema: public; Owner: postgres
+--
+
+CREATE UNIQUE INDEX analytics_uploads_monthly_key ON public.analytics_uploads_monthly USING btree (month, project_id);
+
+
+--
+-- Name: file_texts_content_tsv_idx; Type: INDEX; Schema: public; Owner: postgres
+--
+
+CREATE INDEX file_texts_content_tsv_idx ON public.file_texts USING gin (content_tsv);
+
+
+--
+-- Name: file_texts_sha256_idx; Type: INDEX; Schema: public; Owner: postgres
+--
+
+CREATE INDEX file_texts_sha256_idx ON public.file_texts USING btree (sha256);
+
+
+--
+-- Name: idempotency_keys_expires_at_idx; Type: INDEX; Schema: public; Owner: postgres
+--
+
+CREATE INDEX idempotency_keys_expires_at_idx ON public.idempotency_keys USING btree (expires_at);
+
+
+--
+-- Name: jobs_dedupe_key_idx; Type: INDEX; Schema: public; Owner: postgres
+--
+
+CREATE UNIQUE INDEX jobs_dedupe_key_idx ON public.jobs USING btree (dedupe_key) WHERE ((status)::text = ANY ((ARRAY['pending'::character varying, 'running'::character varying])::text[]));
+
+
+--
+-- Name: jobs_queue_idx; Type: INDEX; Schema: public; Owner: postgres
+--
+
+CREATE INDEX jobs_queue_idx ON public.jobs USING btree (status, run_at, id) WHERE ((status)::text = ANY ((ARRAY['pending'::character varying, 'running'::character varying])::text[]));
+
+
+--
+-- Name: jobs_failed_idx; Type: INDEX; Schema: public; Owner: postgres
+--
+
+CREATE INDEX jobs_failed_idx ON public.jobs USING btree (updated_at DESC) WHERE ((status)::text = 'failed'::text);
+
+
+--
+-- Name: keyword_pairs_keyword_b_idx; Type: INDEX; Schema: public; Owner: postgres
+--
+
+CREATE INDEX keyword_pairs_keyword_b_idx ON public.keyword_pairs USING btree (keyword_b);
+
+
+--
+-- Name: project_connections_related_project_id_idx; Type: INDEX; Schema: public; Owner: postgres
+--
+
+CREATE INDEX project_connections_related_project_id_idx ON public.project_connections USING btree (related_project_id);
+
+
+--
+-- Name: project_duplicate_pairs_duplicate_id_idx; Type: INDEX; Schema: public; Owner: postgres
+--
+
+CREATE INDEX project_duplicate_pairs_duplicate_id_idx ON public.project_duplicate_pairs USING btree (duplicate_id);
+
+
+--
+-- Name: project_files_object_key_idx; Type: INDEX; Schema: public; Owner: postgres
+--
+
+CREATE UNIQUE INDEX project_files_object_key_idx ON public.project_files USING btree (object_key);
+
+
+--
+-- Name: project_files_storage_key_idx; Type: INDEX; Schema: public; Owner: postgres
+--
+
+CREATE INDEX project_files_storage_key_idx ON public.project_files USING btree (COALESCE(object_key, (name)::text) COLLATE "C");
+
+
+--
+-- Name: project_lsh_buckets_project_id_idx; Type: INDEX; Schema: public; Owner: postgres
+--
+
+CREATE INDEX project_lsh_buckets_project_id_idx ON public.project_lsh_buckets USING btree (project_id);
+
+
+--
+-- Name: projects_citation_count_idx; Type: INDEX; Schema: public; Owner: postgres
+--
+
+CREATE INDEX projects_citation_count_idx ON public.projects USING btree (citation_count DESC NULLS LAST, id) WHERE (deleted_at IS NULL);
+
+
+--
+-- Name: projects_lower_title_trgm_idx; Type: INDEX; Schema: public; Owner: postgres
+--
+
+CREATE INDEX projects_lower_title_trgm_idx ON public.projects USING gist (lower((title)::text) public.gist_trgm_ops) WHERE (deleted_at IS NULL);
+
+
+--
+-- Name: projects_pagerank_idx; Type: INDEX; Schema: public; Owner: postgres
+--
+
+CREATE INDEX projects_pagerank_idx ON public.projects USING btree (pagerank DESC NULLS LAST, id) WHERE (deleted_at IS NULL);
+
+
+--
+-- Name: reports_file_id_idx; Type: INDEX; Schema: public; Owner: postgres
+--
+
+CREATE INDEX reports_file_id_idx ON public.reports USING btree (file_id);
+
+
+--
+-- Name: subject_areas_parent_id_idx; Type: INDEX; Schema: public; Owner: postgres
+--
+
+CREATE INDEX subject_areas_parent_id_idx ON public.subject_areas USING btree (parent_id);
+
+
+--
+-- Name: subject_areas_path_gist_idx; Type: INDEX; Schema: public; Owner: postgres
+--
+
+CREATE INDEX subject_areas_path_gist_idx ON public.subject_areas USING gist (path);
+
+
+--
+-- Name: subject_areas_path_idx; Type: INDEX; Schema: public; Owner: postgres
+--
+
+CREATE INDEX subject_areas_path_idx ON public.subject_areas USING btree (path);
+
+
 --
 -- Name: projects trg_init_citation_count; Type: TRIGGER; Schema: public; Owner: postgres
 --
@@ -458,6 +1181,28 @@ CREATE TRIGGER trg_init_citation_count BEFORE INSERT ON public.projects FOR EACH
 CREATE TRIGGER trg_update_citation_count AFTER INSERT OR DELETE OR UPDATE ON public.project_connections FOR EACH ROW EXECUTE FUNCTION public.update_citation_count();
 
 
+--
+-- Name: projects trg_keyword_stats; Type: TRIGGER; Schema: public; Owner: postgres
+--
+
+CREATE TRIGGER trg_keyword_stats AFTER INSERT OR DELETE OR UPDATE OF keywords, status, subject_area_id, is_public, created_at, deleted_at ON public.projects FOR EACH ROW EXECUTE FUNCTION public.update_keyword_stats();
+
+
+--
+-- Name: projects trg_subject_area_project_stats; Type: TRIGGER; Schema: public; Owner: postgres
+--
+
+CREATE TRIGGER trg_subject_area_project_stats AFTER INSERT OR DELETE OR UPDATE OF subject_area_id, status, deleted_at ON public.projects FOR EACH ROW EXECUTE FUNCTION public.update_subject_area_project_stats();
+
+
+--
+-- Name: file_texts file_texts_file_id_fkey; Type: FK CONSTRAINT; Schema: public; Owner: postgres
+--
+
+ALTER TABLE ONLY public.file_texts
+    ADD CONSTRAINT file_texts_file_id_fkey FOREIGN KEY (file_id) REFERENCES public.project_files(id) ON DELETE CASCADE;
+
+
 --
 -- Name: project_connections project_connections_project_id_fkey; Type: FK CONSTRAINT; Schema: public; Owner: postgres
 --
@@ -474,6 +1219,22 @@ ALTER TABLE ONLY public.project_connections
     ADD CONSTRAINT project_connections_related_project_id_fkey FOREIGN KEY (related_project_id) REFERENCES public.projects(id);
 
 
+--
+-- Name: project_duplicate_pairs project_duplicate_pairs_duplicate_id_fkey; Type: FK CONSTRAINT; Schema: public; Owner: postgres
+--
+
+ALTER TABLE ONLY public.project_duplicate_pairs
+    ADD CONSTRAINT project_duplicate_pairs_duplicate_id_fkey FOREIGN KEY (duplicate_id) REFERENCES public.projects(id) ON DELETE CASCADE;
+
+
+--
+-- Name: project_duplicate_pairs project_duplicate_pairs_project_id_fkey; Type: FK CONSTRAINT; Schema: public; Owner: postgres
+--
+
+ALTER TABLE ONLY public.project_duplicate_pairs
+    ADD CONSTRAINT project_duplicate_pairs_project_id_fkey FOREIGN KEY (project_id) REFERENCES public.projects(id) ON DELETE CASCADE;
+
+
 --
 -- Name: project_files project_files_project_id_fkey; Type: FK CONSTRAINT; Schema: public; Owner: postgres
 --
@@ -490,6 +1251,22 @@ ALTER TABLE ONLY public.project_files
     ADD CONSTRAINT project_files_uploaded_by_fkey FOREIGN KEY (uploaded_by) REFERENCES public.users(id);
 
 
+--
+-- Name: project_lsh_buckets project_lsh_buckets_project_id_fkey; Type: FK CONSTRAINT; Schema: public; Owner: postgres
+--
+
+ALTER TABLE ONLY public.project_lsh_buckets
+    ADD CONSTRAINT project_lsh_buckets_project_id_fkey FOREIGN KEY (project_id) REFERENCES public.projects(id) ON DELETE CASCADE;
+
+
+--
+-- Name: project_minhash project_minhash_project_id_fkey; Type: FK CONSTRAINT; Schema: public; Owner: postgres
+--
+
+ALTER TABLE ONLY public.project_minhash
+    ADD CONSTRAINT project_minhash_project_id_fkey FOREIGN KEY (project_id) REFERENCES public.projects(id) ON DELETE CASCADE;
+
+
 --
 -- Name: projects projects_subject_area_id_fkey; Type: FK CONSTRAINT; Schema: public; Owner: postgres
 --
@@ -503,7 +1280,15 @@ ALTER TABLE ONLY public.projects
 --
 
 ALTER TABLE ONLY public.reports
-    ADD CONSTRAINT reports_file_id_fkey FOREIGN KEY (file_id) REFERENCES public.project_files(id);
+    ADD CONSTRAINT reports_file_id_fkey FOREIGN KEY (file_id) REFERENCES public.project_files(id) ON DELETE CASCADE;
+
+
+--
+-- Name: subject_area_project_stats subject_area_project_stats_subject_area_id_fkey; Type: FK CONSTRAINT; Schema: public; Owner: postgres
+--
+
+ALTER TABLE ONLY public.subject_area_project_stats
+    ADD CONSTRAINT subject_area_project_stats_subject_area_id_fkey FOREIGN KEY (subject_area_id) REFERENCES public.subject_areas(id) ON DELETE CASCADE;
 
 
 --
@@ -538,6 +1323,27 @@ ALTER TABLE ONLY public.team_members
     ADD CONSTRAINT team_members_user_id_fkey FOREIGN KEY (user_id) REFERENCES public.users(id) ON DELETE CASCADE;
 
 
+--
+-- Name: analytics_projects_weekly; Type: MATERIALIZED VIEW DATA; Schema: public; Owner: postgres
+--
+
+REFRESH MATERIALIZED VIEW public.analytics_projects_weekly;
+
+
+--
+-- Name: analytics_team_weekly; Type: MATERIALIZED VIEW DATA; Schema: public; Owner: postgres
+--
+
+REFRESH MATERIALIZED VIEW public.analytics_team_weekly;
+
+
+--
+-- Name: analytics_uploads_monthly; Type: MATERIALIZED VIEW DATA; Schema: public; Owner: postgres
+--
+
+REFRESH MATERIALIZED VIEW public.analytics_uploads_monthly;
+
+
 --
 -- PostgreSQL database dump complete
 --
\ No newline at end of file
@@ -0,0 +1,3 @@
+from .analytics import (
+    refresh_analytics, analytics_refreshes, projects_weekly, uploads_monthly, team_growth, ANALYTICS_VIEWS
+)
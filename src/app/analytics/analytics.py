@@ -0,0 +1,158 @@
+import datetime
+import time
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+# Материализованные представления аналитики (init.sql). У каждого есть
+# уникальный индекс — без него REFRESH ... CONCURRENTLY невозможен
+ANALYTICS_VIEWS = (
+    "analytics_projects_weekly",
+    "analytics_uploads_monthly",
+    "analytics_team_weekly",
+)
+
+_SUBTREE_SQL = """
+    subject_area_id IN (
+        SELECT id FROM subject_areas
+        WHERE path <@ (SELECT path FROM subject_areas WHERE id = :subject_area_id)
+    )
+"""
+
+
+def refresh_analytics(db: Session) -> Dict[str, Any]:
+    """
+    Обновляет представления аналитики по одному, каждое в своей транзакции.
+    CONCURRENTLY не блокирует чтение дашбордами; ещё не заполненное
+    представление (сразу после создания) обновляется обычным REFRESH.
+    """
+    seconds: Dict[str, float] = {}
+    for view in ANALYTICS_VIEWS:
+        started = time.monotonic()
+        populated = db.execute(
+            text("SELECT relispopulated FROM pg_class WHERE oid = CAST(:view AS regclass)"),
+            {"view": f"public.{view}"}
+        ).scalar()
+        concurrently = "CONCURRENTLY " if populated else ""
+        db.execute(text(f"REFRESH MATERIALIZED VIEW {concurrently}public.{view}"))
+        elapsed = round(time.monotonic() - started, 3)
+        db.execute(text("""
+            INSERT INTO analytics_refreshes (view_name, refreshed_at, seconds)
+            VALUES (:view, now(), :seconds)
+            ON CONFLICT (view_name) DO UPDATE SET refreshed_at = EXCLUDED.refreshed_at, seconds = EXCLUDED.seconds
+        """), {"view": view, "seconds": elapsed})
+        db.commit()
+        seconds[view] = elapsed
+    return {"seconds": seconds}
+
+
+def analytics_refreshes(db: Session) -> List[Dict[str, Any]]:
+    """Когда и за сколько секунд последний раз обновлялось каждое представление"""
+    return [dict(row) for row in db.execute(
+        text("SELECT view_name, refreshed_at, seconds FROM analytics_refreshes ORDER BY view_name")
+    ).mappings()]
+
+
+def _period_filter(column: str, date_from: Optional[datetime.date], date_to: Optional[datetime.date],
+                   conditions: List[str], params: Dict[str, Any]) -> None:
+    if date_from is not None:
+        conditions.append(f"{column} >= :date_from")
+        params["date_from"] = date_from
+    if date_to is not None:
+        conditions.append(f"{column} <= :date_to")
+        params["date_to"] = date_to
+
+
+def _where(conditions: List[str]) -> str:
+    return ("WHERE " + " AND ".join(conditions)) if conditions else ""
+
+
+def projects_weekly(
+        db: Session,
+        date_from: Optional[datetime.date] = None,
+        date_to: Optional[datetime.date] = None,
+        status: Optional[str] = None,
+        subject_area_id: Optional[int] = None,
+        include_subtree: bool = True,
+        by_subject_area: bool = False
+) -> List[Dict[str, Any]]:
+    """
+    Число созданных проектов по неделям и статусам; by_subject_area —
+    с разбивкой по предметным областям. Удалённые проекты не учитываются.
+    """
+    conditions: List[str] = []
+    params: Dict[str, Any] = {}
+    _period_filter("week", date_from, date_to, conditions, params)
+    if status:
+        conditions.append("status = :status")
+        params["status"] = status
+    if subject_area_id is not None:
+        conditions.append(_SUBTREE_SQL if include_subtree else "subject_area_id = :subject_area_id")
+        params["subject_area_id"] = subject_area_id
+    keys = "week, status, subject_area_id" if by_subject_area else "week, status"
+    return [dict(row) for row in db.execute(text(f"""
+        SELECT {keys}, sum(projects)::bigint AS projects
+        FROM analytics_projects_weekly
+        {_where(conditions)}
+        GROUP BY {keys}
+        ORDER BY {keys}
+    """), params).mappings()]
+
+
+def uploads_monthly(
+        db: Session,
+        date_from: Optional[datetime.date] = None,
+        date_to: Optional[datetime.date] = None,
+        project_id: Optional[int] = None,
+        skip: int = 0,
+        limit: int = 500
+) -> List[Dict[str, Any]]:
+    """Загруженные файлы и байты по проектам и месяцам"""
+    conditions: List[str] = []
+    params: Dict[str, Any] = {"skip": skip, "limit": limit}
+    _period_filter("month", date_from, date_to, conditions, params)
+    if project_id is not None:
+        conditions.append("project_id = :project_id")
+        params["project_id"] = project_id
+    return [dict(row) for row in db.execute(text(f"""
+        SELECT month, project_id, files, bytes
+        FROM analytics_uploads_monthly
+        {_where(conditions)}
+        ORDER BY month, project_id
+        OFFSET :skip LIMIT :limit
+    """), params).mappings()]
+
+
+def team_growth(
+        db: Session,
+        date_from: Optional[datetime.date] = None,
+        date_to: Optional[datetime.date] = None,
+        project_id: Optional[int] = None,
+        role: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """
+    Пришедшие в команды участники по неделям и накопленный итог.
+    Итог считается с начала истории, даже если date_from отсекает ранние недели.
+    """
+    conditions: List[str] = []
+    params: Dict[str, Any] = {}
+    if project_id is not None:
+        conditions.append("project_id = :project_id")
+        params["project_id"] = project_id
+    if role:
+        conditions.append("role = :role")
+        params["role"] = role
+    outer: List[str] = []
+    _period_filter("week", date_from, date_to, outer, params)
+    return [dict(row) for row in db.execute(text(f"""
+        SELECT week, joined, total FROM (
+            SELECT week, sum(joined)::bigint AS joined,
+                   sum(sum(joined)) OVER (ORDER BY week)::bigint AS total
+            FROM analytics_team_weekly
+            {_where(conditions)}
+            GROUP BY week
+        ) w
+        {_where(outer)}
+        ORDER BY week
+    """), params).mappings()]
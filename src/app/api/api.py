@@ -1,40 +1,70 @@
-from typing import List
+import datetime
+from typing import Dict, List
 from app.auth import RoleChecker
 from sqlalchemy import exists
 
 from typing import Optional
-from fastapi.responses import StreamingResponse
+from fastapi.responses import StreamingResponse, FileResponse, Response
+from starlette.background import BackgroundTask
 from urllib.parse import quote
 
 
-from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, status
+from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Header, status
 from sqlalchemy.orm import Session
-from app.minio_client import upload_file, download_file, update_file_with_rename
+from app.minio_client import (
+    upload_file, upload_files, download_file, open_file, new_object_key, local_file_path, iter_file_chunks,
+    get_file_etag, cached_file_path, release_cached_file, download_cache_stats, open_local_decoded
+)
+from app.archive import ZipEntry, stream_zip
+from app.storage.compression import accepts_encoding
+from app.previews import preview_kind, preview_key
 from app.database import get_db
 from sqlalchemy import func
 from app.auth import get_current_user
 
 from app.models import User, Project, ProjectFile, TeamMember
-# Report
-# ReportCreate, ReportRead
 from app.schemas import (
     UserCreate, UserRead,
-    ProjectCreate, SubjectAreaCreate, SubjectAreaRead,
+    ProjectCreate, SubjectAreaCreate, SubjectAreaRead, SubjectAreaNode,
     ProjectConnectionCreate, ProjectConnectionRead,
+    GraphNode, GraphNeighbourhood, GraphPath, GraphComponent,
     TeamMemberCreate, TeamMemberRead,
-    ProjectFileCreate, ProjectFileRead
+    ProjectFileCreate, ProjectFileRead, ProjectFileUpdate,
+    JobRead, JobQueueStats, FileSearchResult, SimilarProject,
+    DuplicateCandidate, DuplicateCheck, ProjectCreateResult, DuplicateCluster,
+    ReportCreate, ReportRead, ReportDetail, ReportRows,
+    ProjectsWeeklyRow, UploadsMonthlyRow, TeamGrowthRow, AnalyticsRefresh,
+    KeywordCount, KeywordTrend
+)
+from app.jobs import get_queue_stats, retry_job, get_job, JobNotRetryable, job_in_progress
+from app.analytics import projects_weekly, uploads_monthly, team_growth, analytics_refreshes
+from app.dedup import find_duplicate_candidates, duplicate_clusters
+from app.fulltext import search_files
+from app.keywords import top_keywords, trending_keywords, related_keywords, rebuild_keyword_stats
+from app.reports import report_summary, report_rows, ReportError, REPORT_SORT_DIRECTIONS
+from app.similarity import similar_projects
+from app.graph import (
+    get_graph_index, neighbourhood as graph_neighbourhood, shortest_path as graph_shortest_path,
+    connected_component as graph_connected_component, DIRECTIONS as GRAPH_DIRECTIONS, GRAPH_MAX_NODES
+)
+from app.taxonomy import (
+    get_subject_tree, SubtreeNotFound, attach_subject_area_stats, rebuild_subject_area_stats,
+    invalidate_subject_tree, import_taxonomy, parse_nested_json, parse_parent_csv, TaxonomyImportError
 )
-# get_report, get_reports, create_report, delete_report
 from app.crud import (
     get_user, get_users, create_user, delete_user,
     get_project, get_projects, create_project, update_project, delete_project,
+    get_report, get_reports, create_report, delete_report,
     get_subject_area, get_subject_areas, create_subject_area, update_subject_area, delete_subject_area,
     get_project_connections, create_project_connection, delete_project_connection,
     get_team_member, get_team_members, create_team_member, update_team_member, delete_team_member,
-    get_project_file, get_project_files, create_project_file, delete_project_file
+    get_project_file, get_project_files, create_project_file, create_project_files,
+    update_project_file, delete_project_file, enqueue_file_processing, storage_key_shared
 )
+from app.jobs import enqueue_job
 
 MAX_PROJECT_SIZE_BYTES = 1 * 1024 * 1024 * 1024  # 1 ГБ
+MAX_BATCH_UPLOAD_FILES = 500
 router = APIRouter()
 
 
@@ -79,7 +109,7 @@ def remove_user(user_id: int, db: Session = Depends(get_db)):
 from fastapi import Depends, Query
 from typing import Optional, List
 from sqlalchemy.orm import Session
-from app.crud import get_projects_filtered
+from app.crud import get_projects_filtered, top_cited_projects_query
 from app.schemas import ProjectRead
 from sqlalchemy import or_, and_
 from sqlalchemy.sql import func
@@ -96,6 +126,29 @@ def filter_projects_for_user(query, current_user, db):
     return query
 
 
+@router.get("/projects/top_cited", response_model=List[ProjectRead])
+def read_top_cited_projects(
+        subject_area_id: Optional[int] = Query(None, description="ID предметной области"),
+        include_subtree: bool = Query(True, description="Учитывать подобласти предметной области"),
+        status: Optional[str] = Query(None, description="Статус проекта"),
+        skip: int = Query(0, ge=0, description="Пропустить N записей"),
+        limit: int = Query(20, ge=1, le=200, description="Максимум записей"),
+        current_user: User = Depends(get_current_user),
+        db: Session = Depends(get_db)
+):
+    """Самые цитируемые проекты (по числу входящих связей)"""
+    query = top_cited_projects_query(db, subject_area_id, include_subtree, status)
+    return filter_projects_for_user(query, current_user, db).offset(skip).limit(limit).all()
+
+
+# Порядок выдачи search_by_all; pagerank и citations идут по частичным индексам
+# (… DESC NULLS LAST, id) WHERE deleted_at IS NULL
+PROJECT_SORT_ORDERS = {
+    "created_at": (Project.created_at.desc(),),
+    "pagerank": (Project.pagerank.desc().nulls_last(), Project.id),
+    "citations": (Project.citation_count.desc().nulls_last(), Project.id),
+}
+
 @router.get("/projects/search_by_all", response_model=List[ProjectRead])
 def read_projects_search_by_all(
         search: Optional[str] = Query(None, description="Поиск по названию и описанию"),
@@ -106,11 +159,14 @@ def read_projects_search_by_all(
         is_public: Optional[bool] = Query(None, description="Публичный проект"),
         skip: int = Query(0, ge=0, description="Пропустить N записей"),
         limit: int = Query(100, ge=1, le=1000, description="Максимум записей"),
+        sort: str = Query("created_at", description="created_at — новые сверху, pagerank — по важности в графе связей, citations — по цитируемости"),
         current_user: User = Depends(get_current_user),
         db: Session = Depends(get_db)
 ):
+    if sort not in PROJECT_SORT_ORDERS:
+        raise HTTPException(status_code=400, detail="sort: created_at, pagerank или citations")
     try:
-        query = db.query(Project)
+        query = db.query(Project).filter(Project.deleted_at.is_(None))
 
         # Поиск по названию и описанию
         if search:
@@ -172,8 +228,8 @@ def read_projects_search_by_all(
                 (Project.id.in_(subquery))
             )
 
-        # Сортировка по дате создания (самые новые сверху)
-        query = query.order_by(Project.created_at.desc())
+        # Сортировка: по умолчанию по дате создания (самые новые сверху)
+        query = query.order_by(*PROJECT_SORT_ORDERS[sort])
 
         # Пагинация
         query = query.offset(skip).limit(limit)
@@ -188,13 +244,31 @@ def read_projects_search_by_all(
             detail=f"Ошибка при поиске проектов: {str(e)}"
         )
 
-@router.post("/projects/", response_model=ProjectRead, status_code=status.HTTP_201_CREATED)
+@router.post("/projects/", response_model=ProjectCreateResult, status_code=status.HTTP_201_CREATED)
 def create_new_project(
     project: ProjectCreate,
     db: Session = Depends(get_db),
     current_user: User = Depends(RoleChecker(["админ"]))  # Разрешено только admin
 ):
-    return create_project(db, project)
+    # Проверка на дубли ограничена по времени и создание не блокирует:
+    # найденные кандидаты возвращаются предупреждением в ответе
+    candidates, complete = find_duplicate_candidates(db, project.title, project.keywords)
+    db_project = create_project(db, project)
+    result = ProjectCreateResult.model_validate(db_project)
+    result.duplicate_candidates = [DuplicateCandidate(**c) for c in candidates]
+    result.duplicate_check_complete = complete
+    return result
+
+@router.post("/projects/check_duplicates", response_model=DuplicateCheck)
+def check_project_duplicates(
+    project: ProjectCreate,
+    exclude_id: Optional[int] = Query(None, description="ID проекта, который не считать дублем (при редактировании)"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(RoleChecker(["админ"]))
+):
+    """Вероятные дубли проекта без его создания"""
+    candidates, complete = find_duplicate_candidates(db, project.title, project.keywords, exclude_id)
+    return DuplicateCheck(candidates=candidates, complete=complete)
 
 @router.get("/projects/", response_model=List[ProjectRead])
 def read_projects(
@@ -203,7 +277,7 @@ def read_projects(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    query = db.query(Project)
+    query = db.query(Project).filter(Project.deleted_at.is_(None))
 
     if current_user.role != "админ":
         # Пользователь - не админ, фильтруем только публичные проекты или проекты, в которых он есть
@@ -249,26 +323,81 @@ def remove_project(project_id: int, db: Session = Depends(get_db)):
     return None
 
 # --- Отчеты ---
-#
-# @router.post("/reports/", response_model=ReportRead, status_code=status.HTTP_201_CREATED)
-# def create_new_report(report: ReportCreate, db: Session = Depends(get_db)):
-#     return create_report(db, report)
-#
-# @router.get("/reports/", response_model=List[ReportRead])
-# def read_reports(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-#     return get_reports(db, skip=skip, limit=limit)
-#
-# @router.get("/reports/{report_id}", response_model=ReportRead)
-# def read_report(report_id: int, db: Session = Depends(get_db)):
-#     report = get_report(db, report_id)
-#     if not report:
-#         raise HTTPException(status_code=404, detail="Отчет не найден")
-#     return report
-#
-# @router.delete("/reports/{report_id}", status_code=status.HTTP_204_NO_CONTENT)
-# def remove_report(report_id: int, db: Session = Depends(get_db)):
-#     delete_report(db, report_id)
-#     return None
+
+def get_visible_report(db: Session, report_id: int, current_user: User):
+    report = get_report(db, report_id)
+    if not report or not has_file_access(db, report.file_id, current_user):
+        raise HTTPException(status_code=404, detail="Отчет не найден")
+    return report
+
+@router.post("/reports/", response_model=ReportRead, status_code=status.HTTP_202_ACCEPTED)
+def create_new_report(
+        report: ReportCreate,
+        current_user: User = Depends(get_current_user),
+        db: Session = Depends(get_db)
+):
+    """Ставит сборку отчёта по CSV/TSV/XLSX-файлу; готовность — по полю status"""
+    if not has_file_access(db, report.file_id, current_user):
+        raise HTTPException(status_code=404, detail="Файл проекта не найден")
+    return create_report(db, report)
+
+@router.get("/reports/", response_model=List[ReportRead])
+def read_reports(
+        file_id: Optional[int] = Query(None, description="Только отчёты по файлу"),
+        skip: int = Query(0, ge=0, description="Пропустить N записей"),
+        limit: int = Query(100, ge=1, le=1000, description="Максимум записей"),
+        current_user: User = Depends(get_current_user),
+        db: Session = Depends(get_db)
+):
+    return get_reports(
+        db, skip=skip, limit=limit, file_id=file_id,
+        visibility_filter=file_visibility_filter(db, current_user)
+    )
+
+@router.get("/reports/{report_id}", response_model=ReportDetail)
+def read_report(
+        report_id: int,
+        current_user: User = Depends(get_current_user),
+        db: Session = Depends(get_db)
+):
+    report = get_visible_report(db, report_id, current_user)
+    result = ReportDetail.model_validate(report)
+    result.summary = report_summary(db, report_id) if report.status == "ready" else None
+    return result
+
+@router.get("/reports/{report_id}/rows", response_model=ReportRows)
+def read_report_rows(
+        report_id: int,
+        offset: int = Query(0, ge=0, description="Номер первой строки"),
+        limit: int = Query(100, ge=1, le=1000, description="Максимум строк"),
+        sort: Optional[str] = Query(None, description="Столбец для сортировки"),
+        order: str = Query("asc", description="asc или desc"),
+        current_user: User = Depends(get_current_user),
+        db: Session = Depends(get_db)
+):
+    """Страница строк таблицы отчёта с необязательной сортировкой по столбцу"""
+    if order not in REPORT_SORT_DIRECTIONS:
+        raise HTTPException(status_code=400, detail="order: asc или desc")
+    report = get_visible_report(db, report_id, current_user)
+    if report.status != "ready":
+        raise HTTPException(status_code=409, detail="Отчет еще не готов")
+    try:
+        return report_rows(db, report_id, offset, limit, sort, order)
+    except ReportError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.delete("/reports/{report_id}", status_code=status.HTTP_204_NO_CONTENT)
+def remove_report(
+        report_id: int,
+        current_user: User = Depends(get_current_user),
+        db: Session = Depends(get_db)
+):
+    report = get_visible_report(db, report_id, current_user)
+    # Видеть отчёт по публичному файлу может любой, удалять — только те, кто может менять файл
+    if not can_modify_file(db, report.file_id, current_user):
+        raise HTTPException(status_code=403, detail="Недостаточно прав для удаления отчета")
+    delete_report(db, report_id)
+    return None
 
 # --- Предметные области ---
 
@@ -276,15 +405,73 @@ def remove_project(project_id: int, db: Session = Depends(get_db)):
 def create_new_subject_area(subject_area: SubjectAreaCreate, db: Session = Depends(get_db)):
     return create_subject_area(db, subject_area)
 
+@router.post("/subject_areas/import", status_code=status.HTTP_201_CREATED)
+def import_subject_areas(
+        file: UploadFile = File(...),
+        parent_id: Optional[int] = Query(None, description="Существующая область, под которую встанут корни импорта"),
+        db: Session = Depends(get_db),
+        current_user: User = Depends(RoleChecker(["админ"]))
+):
+    """
+    Массовый импорт классификатора одной транзакцией: вложенный JSON
+    ({"name", "description", "children"}) или CSV со столбцами ref, parent_ref, name, description.
+    Возвращает соответствие ссылок из файла созданным ID.
+    """
+    data = file.file.read()
+    is_csv = (file.filename or "").lower().endswith(".csv") or (file.content_type or "").startswith("text/csv")
+    try:
+        nodes = parse_parent_csv(data) if is_csv else parse_nested_json(data)
+        result = import_taxonomy(db, nodes, current_user.id, parent_id)
+    except TaxonomyImportError as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=e.errors)
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=f"Ошибка операции: {str(e)}") from e
+    invalidate_subject_tree()
+    return result
+
 @router.get("/subject_areas/", response_model=List[SubjectAreaRead])
-def read_subject_areas(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return get_subject_areas(db, skip=skip, limit=limit)
+def read_subject_areas(
+        skip: int = 0,
+        limit: int = 100,
+        with_stats: bool = Query(False, description="Добавить счётчики проектов (свои и по поддереву)"),
+        db: Session = Depends(get_db)
+):
+    subject_areas = get_subject_areas(db, skip=skip, limit=limit)
+    if with_stats:
+        attach_subject_area_stats(db, subject_areas)
+    return subject_areas
+
+@router.get("/subject_areas/tree", response_model=List[SubjectAreaNode])
+def read_subject_area_tree(
+        root_id: Optional[int] = Query(None, description="Корень поддерева (по умолчанию — весь лес)"),
+        depth: Optional[int] = Query(None, ge=0, description="Глубина относительно корня (0 — только корень)"),
+        with_stats: bool = Query(False, description="Добавить счётчики проектов (свои и по поддереву)"),
+        if_none_match: Optional[str] = Header(None),
+        db: Session = Depends(get_db)
+):
+    """Всё дерево предметных областей (или поддерево) вложенным JSON одним запросом"""
+    try:
+        etag, body = get_subject_tree(db, root_id, depth, with_stats)
+    except SubtreeNotFound:
+        raise HTTPException(status_code=404, detail="Предметная область не найдена")
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if if_none_match and etag in [t.strip() for t in if_none_match.split(",")]:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
 
 @router.get("/subject_areas/{subject_area_id}", response_model=SubjectAreaRead)
-def read_subject_area(subject_area_id: int, db: Session = Depends(get_db)):
+def read_subject_area(
+        subject_area_id: int,
+        with_stats: bool = Query(False, description="Добавить счётчики проектов (свои и по поддереву)"),
+        db: Session = Depends(get_db)
+):
     subject_area = get_subject_area(db, subject_area_id)
     if not subject_area:
         raise HTTPException(status_code=404, detail="Предметная область не найдена")
+    if with_stats:
+        attach_subject_area_stats(db, [subject_area])
     return subject_area
 
 @router.put("/subject_areas/{subject_area_id}", response_model=SubjectAreaRead)
@@ -292,6 +479,14 @@ def update_existing_subject_area(subject_area_id: int, subject_area_data: Subjec
     subject_area = update_subject_area(db, subject_area_id, subject_area_data.dict(exclude_unset=True))
     return subject_area
 
+@router.post("/admin/subject_areas/stats/rebuild")
+def rebuild_subject_area_project_stats(
+        db: Session = Depends(get_db),
+        current_user: User = Depends(RoleChecker(["админ"]))
+):
+    """Пересчёт счётчиков проектов по предметным областям с нуля"""
+    return {"subject_areas": rebuild_subject_area_stats(db)}
+
 @router.delete("/subject_areas/{subject_area_id}", status_code=status.HTTP_204_NO_CONTENT)
 def remove_subject_area(subject_area_id: int, db: Session = Depends(get_db)):
     delete_subject_area(db, subject_area_id)
@@ -309,7 +504,7 @@ def read_project_connections(db: Session = Depends(get_db)):
     return connections
 
 @router.get("/project_connections/{project_id}", response_model=List[ProjectConnectionRead])
-def read_project_connections(project_id: int, db: Session = Depends(get_db)):
+def read_project_connections_of_project(project_id: int, db: Session = Depends(get_db)):
     return get_project_connections(db, project_id)
 
 @router.delete("/project_connections/{project_id}/{related_project_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -317,6 +512,138 @@ def remove_project_connection(project_id: int, related_project_id: int, db: Sess
     delete_project_connection(db, project_id, related_project_id)
     return None
 
+# --- Граф связей ---
+
+def visible_graph_nodes(db: Session, ids, current_user: User) -> Dict[int, Project]:
+    """Проекты из ids, которые пользователь может видеть (правила read_projects)"""
+    if not ids:
+        return {}
+    query = db.query(Project).filter(Project.id.in_(list(ids)), Project.deleted_at.is_(None))
+    return {p.id: p for p in filter_projects_for_user(query, current_user, db).all()}
+
+
+def visible_node_filter(db: Session, current_user: User):
+    """Отбор вершин для обхода графа: только живые проекты, видимые пользователю"""
+    def allowed(ids):
+        query = db.query(Project.id).filter(Project.id.in_(ids), Project.deleted_at.is_(None))
+        return {pid for (pid,) in filter_projects_for_user(query, current_user, db).all()}
+    return allowed
+
+
+def require_visible_project(db: Session, project_id: int, current_user: User) -> None:
+    if project_id not in visible_graph_nodes(db, [project_id], current_user):
+        raise HTTPException(status_code=404, detail="Проект не найден")
+
+
+def check_direction(direction: str) -> str:
+    if direction not in GRAPH_DIRECTIONS:
+        raise HTTPException(status_code=400, detail="direction: out, in или both")
+    return direction
+
+
+@router.get("/graph/projects/{project_id}/neighbourhood", response_model=GraphNeighbourhood)
+def read_project_neighbourhood(
+        project_id: int,
+        depth: int = Query(1, ge=1, le=6, description="Число шагов по связям"),
+        direction: str = Query("both", description="out — на кого ссылается, in — кто ссылается, both — оба"),
+        limit: int = Query(GRAPH_MAX_NODES, ge=1, le=GRAPH_MAX_NODES, description="Максимум проектов в обходе"),
+        current_user: User = Depends(get_current_user),
+        db: Session = Depends(get_db)
+):
+    """Проекты в пределах depth связей от проекта и связи между ними"""
+    check_direction(direction)
+    require_visible_project(db, project_id, current_user)
+    index = get_graph_index(db)
+    distances, truncated = graph_neighbourhood(
+        index, project_id, depth, direction, limit, allowed=visible_node_filter(db, current_user)
+    )
+    visible = visible_graph_nodes(db, distances.keys(), current_user)
+
+    nodes = []
+    for node_id, project in visible.items():
+        node = GraphNode.model_validate(project)
+        node.distance = distances[node_id]
+        nodes.append(node)
+    nodes.sort(key=lambda n: (n.distance, n.id))
+
+    edges = sorted({
+        (src, dst) for src in visible for dst in index.neighbours(src, "out") if dst in visible
+    })
+    return GraphNeighbourhood(root_id=project_id, nodes=nodes, edges=[list(e) for e in edges], truncated=truncated)
+
+
+@router.get("/graph/path", response_model=GraphPath)
+def read_shortest_project_path(
+        source_id: int,
+        target_id: int,
+        direction: str = Query("out", description="out — по направлению ссылок, in — против, both — без учёта"),
+        current_user: User = Depends(get_current_user),
+        db: Session = Depends(get_db)
+):
+    """Кратчайшая цепочка связей между двумя проектами"""
+    check_direction(direction)
+    require_visible_project(db, source_id, current_user)
+    require_visible_project(db, target_id, current_user)
+    path = graph_shortest_path(
+        get_graph_index(db), source_id, target_id, direction, allowed=visible_node_filter(db, current_user)
+    )
+    if path is None:
+        raise HTTPException(status_code=404, detail="Путь между проектами не найден")
+    visible = visible_graph_nodes(db, path, current_user)
+    return GraphPath(
+        source_id=source_id,
+        target_id=target_id,
+        length=len(path) - 1,
+        path=[GraphNode.model_validate(visible[p]) if p in visible else None for p in path]
+    )
+
+
+@router.get("/graph/projects/{project_id}/component", response_model=GraphComponent)
+def read_project_component(
+        project_id: int,
+        limit: int = Query(GRAPH_MAX_NODES, ge=1, le=GRAPH_MAX_NODES, description="Максимум проектов в обходе"),
+        current_user: User = Depends(get_current_user),
+        db: Session = Depends(get_db)
+):
+    """Компонента связности проекта (связи без учёта направления)"""
+    require_visible_project(db, project_id, current_user)
+    members, truncated = graph_connected_component(
+        get_graph_index(db), project_id, limit, allowed=visible_node_filter(db, current_user)
+    )
+    visible = visible_graph_nodes(db, members, current_user)
+    nodes = sorted((GraphNode.model_validate(p) for p in visible.values()), key=lambda n: n.id)
+    # Размер — по видимым вершинам: скрытые и удалённые проекты не раскрываются даже счётчиком
+    return GraphComponent(root_id=project_id, size=len(nodes), nodes=nodes, truncated=truncated)
+
+# --- Похожие проекты ---
+
+@router.get("/projects/{project_id}/similar", response_model=List[SimilarProject])
+def read_similar_projects(
+        project_id: int,
+        min_similarity: float = Query(0.2, ge=0, le=1, description="Минимальная оценка сходства"),
+        exclude_connected: bool = Query(True, description="Не предлагать уже связанные проекты"),
+        limit: int = Query(20, ge=1, le=100, description="Максимум записей"),
+        current_user: User = Depends(get_current_user),
+        db: Session = Depends(get_db)
+):
+    """Проекты, похожие по ключевым словам, названию и описанию (MinHash/LSH)"""
+    require_visible_project(db, project_id, current_user)
+    candidates = similar_projects(db, project_id, min_similarity, exclude_connected)
+    visible = visible_graph_nodes(db, [c["project_id"] for c in candidates], current_user)
+    result = []
+    for candidate in candidates:
+        project = visible.get(candidate["project_id"])
+        if project is None:
+            continue
+        result.append(SimilarProject(
+            project=ProjectRead.model_validate(project),
+            similarity=candidate["similarity"],
+            shared_bands=candidate["shared_bands"],
+        ))
+        if len(result) == limit:
+            break
+    return result
+
 # --- Участники команд ---
 
 # Иерархия ролей в команде (от высшей к низшей)
@@ -537,6 +864,7 @@ def read_project_files(
         else:
             # Для обычных пользователей получаем файлы из доступных проектов
             accessible_projects_query = db.query(Project.id).filter(
+                Project.deleted_at.is_(None),
                 or_(
                     Project.is_public == True,
                     exists().where(
@@ -572,7 +900,15 @@ def read_project_files(
             return filtered_files
 
     # Если project_id указан - проверяем доступ к конкретному проекту
-    project = db.query(Project).filter(Project.id == project_id).first()
+    return project_files_query_for_user(db, project_id, current_user).all()
+
+
+def project_files_query_for_user(db: Session, project_id: int, current_user: User):
+    """
+    Запрос файлов проекта, доступных пользователю (правила read_project_files).
+    Бросает 404, если проекта нет, и 403, если проект приватный и пользователь не в команде.
+    """
+    project = get_project(db, project_id)
     if not project:
         raise HTTPException(status_code=404, detail="Проект не найден")
 
@@ -606,7 +942,7 @@ def read_project_files(
             detail="Доступ к файлам проекта запрещен"
         )
 
-    return query.all()
+    return query
 
 
 # Вспомогательная функция для проверки доступа к файлу
@@ -626,7 +962,7 @@ def has_file_access(db: Session, file_id: int, user: User) -> bool:
         return True
 
     # Получаем проект файла
-    project = db.query(Project).filter(Project.id == file.project_id).first()
+    project = get_project(db, file.project_id)
     if not project:
         return False
 
@@ -646,6 +982,52 @@ def has_file_access(db: Session, file_id: int, user: User) -> bool:
 
     return False
 
+
+def can_modify_file(db: Session, file_id: int, user: User) -> bool:
+    """Изменять файл и производные от него данные могут админ, загрузивший и команда проекта"""
+    file = db.query(ProjectFile).filter(ProjectFile.id == file_id).first()
+    if not file:
+        return False
+    if user.role == "админ" or file.uploaded_by == user.id:
+        return True
+    return db.query(TeamMember).filter(
+        TeamMember.project_id == file.project_id,
+        TeamMember.user_id == user.id
+    ).first() is not None
+
+
+def file_visibility_filter(db: Session, current_user: User):
+    """
+    Условие на ProjectFile/Project с теми же правилами, что и has_file_access,
+    для запросов по файлам сразу многих проектов. Для админа — None (без фильтра).
+    """
+    if current_user.role == "админ":
+        return None
+    member_projects = db.query(TeamMember.project_id).filter(TeamMember.user_id == current_user.id)
+    return or_(
+        ProjectFile.uploaded_by == current_user.id,
+        ProjectFile.project_id.in_(member_projects),
+        and_(Project.is_public == True, ProjectFile.is_public == True)
+    )
+
+def file_search_visibility_filter(db: Session, current_user: User):
+    """
+    Условие для поиска по файлам с правилами списка файлов проекта
+    (project_files_query_for_user): команда видит все файлы своих проектов,
+    остальные — только в публичных проектах, публичные или загруженные ими.
+    В отличие от has_file_access, свои файлы в чужих приватных проектах не видны.
+    """
+    if current_user.role == "админ":
+        return None
+    member_projects = db.query(TeamMember.project_id).filter(TeamMember.user_id == current_user.id)
+    return or_(
+        ProjectFile.project_id.in_(member_projects),
+        and_(
+            Project.is_public == True,
+            or_(ProjectFile.is_public == True, ProjectFile.uploaded_by == current_user.id)
+        )
+    )
+
 @router.get("/project_files/{file_id}", response_model=ProjectFileRead)
 def read_project_file(file_id: int, db: Session = Depends(get_db)):
     pf = get_project_file(db, file_id)
@@ -653,19 +1035,50 @@ def read_project_file(file_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Файл проекта не найден")
     return pf
 
+@router.patch("/project_files/{file_id}", response_model=ProjectFileRead)
+def update_project_file_metadata(
+    file_id: int,
+    data: ProjectFileUpdate,
+    db: Session = Depends(get_db)
+):
+    """
+    Изменение только метаданных файла (имя, публичность).
+    Хранилище не затрагивается: ключ объекта не зависит от имени файла.
+    """
+    pf = get_project_file(db, file_id)
+    if not pf:
+        raise HTTPException(status_code=404, detail="Файл проекта не найден")
+
+    changes = data.dict(exclude_unset=True, exclude_none=True)
+    if "name" in changes and changes["name"] != pf.name and pf.object_key is None:
+        # У старых записей объект лежит под именем файла — фиксируем этот ключ,
+        # чтобы после переименования запись продолжала указывать на тот же объект
+        changes["object_key"] = pf.name
+
+    if not changes:
+        return pf
+    return update_project_file(db, file_id, changes)
+
+
 @router.put("/project_files/{file_id}", response_model=ProjectFileRead)
-async def update_existing_project_file(
+def update_existing_project_file(
     file_id: int,
     file: UploadFile = File(...),
     is_public: Optional[bool] = None,
     db: Session = Depends(get_db)
 ):
+    """
+    Замена содержимого файла. Новая версия загружается под новым ключом,
+    затем запись переключается на неё одной транзакцией, а старый объект
+    удаляется воркером очереди — файл ни в какой момент не пропадает.
+    """
     # Получаем файл из базы
     pf = get_project_file(db, file_id)
     if not pf:
         raise HTTPException(status_code=404, detail="Файл проекта не найден")
 
-    old_file_name = pf.name
+    old_object_key = pf.storage_key
+    old_shared = storage_key_shared(db, pf)
     old_file_size = pf.file_metadata.get("size", 0)
 
     # Получаем размер нового загружаемого файла
@@ -687,32 +1100,37 @@ async def update_existing_project_file(
             detail="Превышен общий размер файлов проекта: допустимо не более 1 ГБ"
         )
 
-    # Обновляем файл в MinIO
+    # Загружаем новую версию рядом со старой
+    new_key = new_object_key(pf.project_id, file.filename)
     try:
-        pf.url = update_file_with_rename(
-            new_file_data=file.file,
-            old_file_name=old_file_name,
-            new_file_name=file.filename,
+        uploaded = upload_file(
+            file_data=file.file,
+            file_name=new_key,
             content_type=file.content_type
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Ошибка при обновлении файла в хранилище: {e}")
 
-    # Обновляем запись в базе
+    # Переключаем запись на новый объект
     pf.name = file.filename
-    pf.file_metadata = {
-        "content_type": file.content_type,
-        "size": new_file_size
-    }
+    pf.url = uploaded.url
+    pf.object_key = new_key
+    pf.file_metadata = uploaded.metadata(file.content_type)
     if is_public is not None:
         pf.is_public = is_public
 
     try:
         db.add(pf)
+        # Объект старой записи, адресованной именем, может принадлежать и другим записям
+        if not old_shared:
+            enqueue_job(db, "storage.delete", {"object_name": old_object_key})
+        enqueue_file_processing(db, pf)
         db.commit()
         db.refresh(pf)
     except Exception as e:
         db.rollback()
+        enqueue_job(db, "storage.delete", {"object_name": new_key})
+        db.commit()
         raise HTTPException(status_code=500, detail=f"Ошибка при обновлении записи в БД: {e}")
 
     return pf
@@ -750,64 +1168,225 @@ async def upload_project_file(
         )
 
     # Если всё поднялось — загружаем файл
+    object_key = new_object_key(project_id, file.filename)
     try:
-        file_url = upload_file(
+        uploaded = upload_file(
             file_data=file.file,
-            file_name=file.filename,
+            file_name=object_key,
             content_type=file.content_type
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Ошибка загрузки файла: {e}")
 
     # Формируем метаданные с размером и content_type
-    file_metadata = {
-        "content_type": file.content_type,
-        "size": new_file_size
-    }
+    file_metadata = uploaded.metadata(file.content_type)
 
     # Создаём запись в БД
     pf_in = ProjectFileCreate(
         project_id=project_id,
         name=file.filename,
-        url=file_url,
+        url=uploaded.url,
         file_metadata=file_metadata,
         uploaded_by=uploaded_by,
         is_public=is_public
     )
     try:
-        pf = create_project_file(db, pf_in)
+        pf = create_project_file(db, pf_in, object_key=object_key)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Ошибка записи в БД: {e}")
 
     return pf
 
 
+@router.post("/project_files/upload_batch", response_model=List[ProjectFileRead], status_code=status.HTTP_201_CREATED)
+def upload_project_files_batch(
+    project_id: int,
+    uploaded_by: int,
+    is_public: Optional[bool] = False,
+    files: List[UploadFile] = File(...),
+    db: Session = Depends(get_db)
+):
+    """
+    Загрузка нескольких файлов одним запросом.
+    Квота проверяется один раз на весь пакет, объекты пишутся в MinIO параллельно,
+    записи создаются в одной транзакции. При любой ошибке не остаётся ни записей,
+    ни загруженных объектов.
+    """
+    if not files:
+        raise HTTPException(status_code=400, detail="Не переданы файлы")
+    if len(files) > MAX_BATCH_UPLOAD_FILES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"За один запрос можно загрузить не более {MAX_BATCH_UPLOAD_FILES} файлов"
+        )
+
+    # Размеры всех файлов пакета
+    sizes = []
+    for f in files:
+        f.file.seek(0, 2)
+        sizes.append(f.file.tell())
+        f.file.seek(0)
+
+    total_size = (
+        db.query(func.coalesce(func.sum(ProjectFile.file_metadata['size'].as_integer()), 0))
+        .filter(ProjectFile.project_id == project_id)
+        .scalar() or 0
+    )
+    if total_size + sum(sizes) > MAX_PROJECT_SIZE_BYTES:
+        raise HTTPException(
+            status_code=400,
+            detail="Превышен общий размер файлов проекта: допустимо не более 1 ГБ"
+        )
+
+    keys = [new_object_key(project_id, f.filename) for f in files]
+    try:
+        results = upload_files([(f.file, key, f.content_type) for f, key in zip(files, keys)])
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Ошибка загрузки файлов: {e}")
+
+    items = [
+        ProjectFileCreate(
+            project_id=project_id,
+            name=f.filename,
+            url=result.url,
+            file_metadata=result.metadata(f.content_type),
+            uploaded_by=uploaded_by,
+            is_public=is_public
+        )
+        for f, result in zip(files, results)
+    ]
+    try:
+        return create_project_files(db, items, keys)
+    except HTTPException:
+        # Записи не создались — загруженные объекты удаляет воркер очереди
+        for key in keys:
+            enqueue_job(db, "storage.delete", {"object_name": key})
+        db.commit()
+        raise
+
+
 def get_project_file(db: Session, file_id: int):
     return db.query(ProjectFile).filter(ProjectFile.id == file_id).first()
 
 
+@router.get("/project_files/download_zip/{project_id}", status_code=status.HTTP_200_OK)
+def download_project_files_zip(
+        project_id: int,
+        db: Session = Depends(get_db),
+        current_user: User = Depends(get_current_user)
+):
+    """
+    Скачать одним ZIP-архивом все доступные пользователю файлы проекта.
+    Архив собирается на лету из потоков MinIO, без временных файлов.
+    """
+    files = project_files_query_for_user(db, project_id, current_user) \
+        .order_by(ProjectFile.id).all()
+
+    entries = [
+        ZipEntry(
+            arcname=pf.name,
+            object_name=pf.storage_key,
+            size=(pf.file_metadata or {}).get("size"),
+            modified_at=pf.uploaded_at
+        )
+        for pf in files
+    ]
+    # Сжатые в хранилище файлы кладём в архив в исходном виде
+    codecs = {pf.storage_key: (pf.file_metadata or {}).get("codec") for pf in files}
+
+    return StreamingResponse(
+        stream_zip(entries, lambda key: open_file(key, codecs.get(key))),
+        media_type="application/zip",
+        headers={
+            "Content-Disposition": f'attachment; filename="project_{project_id}.zip"'
+        }
+    )
+
+
 @router.get("/project_files/download_by_id/{file_id}", status_code=status.HTTP_200_OK)
-def download_project_file_by_id(file_id: int, db: Session = Depends(get_db)):
+def download_project_file_by_id(
+        file_id: int,
+        if_none_match: Optional[str] = Header(None),
+        accept_encoding: Optional[str] = Header(None),
+        db: Session = Depends(get_db)
+):
     try:
         # Получаем запись файла из базы по id
         pf = get_project_file(db, file_id)
         if not pf:
             raise HTTPException(status_code=404, detail="Файл не найден")
 
+        # Кодируем имя файла для корректной передачи в заголовке
+        encoded_filename = quote(pf.name.encode('utf-8'))
+        headers = {
+            "Content-Disposition": f'attachment; filename*=UTF-8\'\'{encoded_filename}'
+        }
+
+        metadata = dict(pf.file_metadata or {})
+
+        # Сжатый в хранилище файл отдаём как есть, если клиент понимает кодек,
+        # иначе распаковываем на лету
+        codec = metadata.get("codec")
+        passthrough = codec is not None and accepts_encoding(accept_encoding, codec)
+        if codec:
+            headers["Vary"] = "Accept-Encoding"
+        if passthrough:
+            headers["Content-Encoding"] = codec
+
+        def file_response(path: str, cached: bool = False):
+            if codec and not passthrough:
+                file_obj = open_local_decoded(path, codec)
+                if cached:
+                    # Открытый файл дочитывается и без ссылки
+                    release_cached_file(path)
+                return StreamingResponse(
+                    iter_file_chunks(file_obj),
+                    media_type="application/octet-stream",
+                    headers=headers
+                )
+            # Ссылка на копию в кэше удаляется после отдачи ответа
+            background = BackgroundTask(release_cached_file, path) if cached else None
+            return FileResponse(path, media_type="application/octet-stream", headers=headers, background=background)
+
+        # ETag берём из метаданных записи, чтобы не обращаться к хранилищу.
+        # У старых записей его нет — узнаём один раз и сохраняем
+        etag = metadata.get("etag")
+        if not etag:
+            try:
+                etag = get_file_etag(pf.storage_key)
+            except Exception as e:
+                raise HTTPException(status_code=404, detail=f"Ошибка при скачивании файла: {e}")
+            if etag:
+                metadata["etag"] = etag
+                pf.file_metadata = metadata
+                db.commit()
+
+        if etag:
+            # Для сжатой и распакованной версий ETag должен различаться
+            headers["ETag"] = f'"{etag}-{codec}"' if passthrough else f'"{etag}"'
+            if if_none_match and headers["ETag"] in [t.strip() for t in if_none_match.split(",")]:
+                return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": headers["ETag"]})
+
+        # Локальное хранилище: файл отдаётся напрямую с диска (sendfile, Range);
+        # ETag и 304 выше — общие для обоих хранилищ
+        path = local_file_path(pf.storage_key)
+        if path:
+            return file_response(path)
+
+        # Популярные файлы отдаются из локального дискового кэша
+        cached_path = cached_file_path(pf.storage_key, etag, metadata.get("stored_size", metadata.get("size")))
+        if cached_path:
+            return file_response(cached_path, cached=True)
+
         try:
-            file_obj = download_file(pf.name)
+            file_obj = download_file(pf.storage_key) if passthrough else open_file(pf.storage_key, codec)
         except Exception as e:
             raise HTTPException(status_code=404, detail=f"Ошибка при скачивании файла: {e}")
 
-        # Кодируем имя файла для корректной передачи в заголовке
-        encoded_filename = quote(pf.name.encode('utf-8'))
-
         response = StreamingResponse(
-            file_obj,
+            iter_file_chunks(file_obj),
             media_type="application/octet-stream",
-            headers={
-                "Content-Disposition": f'attachment; filename*=UTF-8\'\'{encoded_filename}'
-            }
+            headers=headers
         )
         return response
 
@@ -818,3 +1397,338 @@ def download_project_file_by_id(file_id: int, db: Session = Depends(get_db)):
             status_code=500,
             detail=f"Ошибка при скачивании файла: {str(e)}"
         )
+
+
+@router.get("/project_files/{file_id}/preview", status_code=status.HTTP_200_OK)
+def read_project_file_preview(
+        file_id: int,
+        if_none_match: Optional[str] = Header(None),
+        db: Session = Depends(get_db),
+        current_user: User = Depends(get_current_user)
+):
+    """
+    Превью файла: миниатюра изображения или первой страницы PDF (PNG),
+    первые строки CSV (JSON). Превью строится в фоне после загрузки.
+    """
+    pf = get_project_file(db, file_id)
+    if not pf:
+        raise HTTPException(status_code=404, detail="Файл не найден")
+    if not has_file_access(db, file_id, current_user):
+        raise HTTPException(status_code=403, detail="Доступ к файлу запрещен")
+
+    metadata = pf.file_metadata or {}
+    sha256 = metadata.get("sha256")
+    kind = preview_kind(metadata.get("detected_type"), pf.name)
+    if not sha256 or not kind:
+        raise HTTPException(status_code=404, detail="Для этого файла превью не строится")
+
+    key, media_type = preview_key(sha256, kind)
+    # Превью адресуется хэшем содержимого, поэтому хэш годится как ETag
+    headers = {"ETag": f'"{sha256}"', "Cache-Control": "private, max-age=3600"}
+    if if_none_match and headers["ETag"] in [t.strip() for t in if_none_match.split(",")]:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    try:
+        path = local_file_path(key)
+        if path:
+            return FileResponse(path, media_type=media_type, headers=headers)
+        path = cached_file_path(key, sha256)
+        if path:
+            return FileResponse(path, media_type=media_type, headers=headers,
+                                background=BackgroundTask(release_cached_file, path))
+        file_obj = download_file(key)
+    except Exception:
+        raise HTTPException(status_code=404, detail="Превью ещё не готово")
+
+    return StreamingResponse(iter_file_chunks(file_obj), media_type=media_type, headers=headers)
+
+
+# --- Поиск по содержимому файлов ---
+
+@router.get("/search/files", response_model=FileSearchResult)
+def search_project_files(
+        q: str = Query(..., min_length=1, description="Запрос (синтаксис websearch: слова, \"фраза\", -исключение, or)"),
+        project_id: Optional[int] = Query(None, description="Искать только в файлах проекта"),
+        skip: int = Query(0, ge=0, description="Пропустить N записей"),
+        limit: int = Query(50, ge=1, le=200, description="Максимум файлов"),
+        db: Session = Depends(get_db),
+        current_user: User = Depends(get_current_user)
+):
+    """
+    Полнотекстовый поиск по извлечённому тексту файлов (TXT, CSV, JSON, DOCX, PDF).
+    Возвращает файлы по убыванию релевантности и проекты, в которых они найдены.
+    """
+    return search_files(
+        db, q.strip(),
+        visibility_filter=file_search_visibility_filter(db, current_user),
+        project_id=project_id, skip=skip, limit=limit
+    )
+
+
+@router.post("/admin/search/reindex", status_code=status.HTTP_202_ACCEPTED)
+def reindex_file_texts(
+        db: Session = Depends(get_db),
+        current_user: User = Depends(RoleChecker(["админ"]))
+):
+    """Ставит индексацию файлов, у которых нет актуального извлечённого текста"""
+    job_id = enqueue_job(db, "text.backfill", {"after_id": 0}, dedupe_key="text.backfill:0")
+    db.commit()
+    if job_id is None:
+        raise HTTPException(status_code=409, detail="Переиндексация уже запущена")
+    return {"job_id": job_id}
+
+
+@router.post("/admin/graph/pagerank", status_code=status.HTTP_202_ACCEPTED)
+def recompute_pagerank(
+        db: Session = Depends(get_db),
+        current_user: User = Depends(RoleChecker(["админ"]))
+):
+    """Внеочередной пересчёт PageRank; ход и метрики — в GET /admin/jobs/{job_id}"""
+    job_id = enqueue_job(db, "graph.pagerank", {}, dedupe_key="graph.pagerank:manual")
+    db.commit()
+    if job_id is None:
+        raise HTTPException(status_code=409, detail="Пересчёт PageRank уже запущен")
+    return {"job_id": job_id}
+
+
+@router.post("/admin/similarity/reindex", status_code=status.HTTP_202_ACCEPTED)
+def reindex_similarity(
+        db: Session = Depends(get_db),
+        current_user: User = Depends(RoleChecker(["админ"]))
+):
+    """Пересчёт сигнатур похожести всех проектов (после смены параметров или для старых проектов)"""
+    # Параллельные цепочки переиндексации писали бы в project_minhash одни и те же строки
+    if job_in_progress(db, "similarity.reindex"):
+        raise HTTPException(status_code=409, detail="Пересчёт уже запущен")
+    job_id = enqueue_job(db, "similarity.reindex", {"after_id": 0}, dedupe_key="similarity.reindex:0")
+    db.commit()
+    if job_id is None:
+        raise HTTPException(status_code=409, detail="Пересчёт уже запущен")
+    return {"job_id": job_id}
+
+
+@router.post("/admin/projects/duplicates/scan", status_code=status.HTTP_202_ACCEPTED)
+def scan_project_duplicates(
+        db: Session = Depends(get_db),
+        current_user: User = Depends(RoleChecker(["админ"]))
+):
+    """Пакетный поиск дублей по всем проектам; итог — в GET /admin/projects/duplicates"""
+    # Продолжения ставятся под другими ключами: второй запуск посреди прохода
+    # очистил бы project_duplicate_pairs под ногами у первого
+    if job_in_progress(db, "projects.duplicates.scan"):
+        raise HTTPException(status_code=409, detail="Поиск дублей уже запущен")
+    job_id = enqueue_job(db, "projects.duplicates.scan", {"after_id": 0}, dedupe_key="projects.duplicates.scan:0")
+    db.commit()
+    if job_id is None:
+        raise HTTPException(status_code=409, detail="Поиск дублей уже запущен")
+    return {"job_id": job_id}
+
+
+@router.get("/admin/projects/duplicates", response_model=List[DuplicateCluster])
+def read_project_duplicate_clusters(
+        skip: int = Query(0, ge=0, description="Пропустить N кластеров"),
+        limit: int = Query(100, ge=1, le=1000, description="Максимум кластеров"),
+        db: Session = Depends(get_db),
+        current_user: User = Depends(RoleChecker(["админ"]))
+):
+    """Кластеры вероятных дублей по результатам последнего пакетного поиска, крупные первыми"""
+    return duplicate_clusters(db)[skip:skip + limit]
+
+
+# --- Аналитика ---
+# Ответы читаются из материализованных представлений, которые задача
+# analytics.refresh обновляет раз в ANALYTICS_REFRESH_INTERVAL секунд
+
+@router.get("/analytics/projects/weekly", response_model=List[ProjectsWeeklyRow])
+def read_projects_weekly(
+        date_from: Optional[datetime.date] = Query(None, description="С недели, начинающейся не раньше этой даты"),
+        date_to: Optional[datetime.date] = Query(None, description="По неделю, начинающуюся не позже этой даты"),
+        status: Optional[str] = Query(None, description="Статус проекта"),
+        subject_area_id: Optional[int] = Query(None, description="ID предметной области"),
+        include_subtree: bool = Query(True, description="Учитывать подобласти предметной области"),
+        by_subject_area: bool = Query(False, description="Разбивка по предметным областям"),
+        db: Session = Depends(get_db),
+        current_user: User = Depends(RoleChecker(["админ"]))
+):
+    """Созданные проекты по неделям и статусам"""
+    return projects_weekly(db, date_from, date_to, status, subject_area_id, include_subtree, by_subject_area)
+
+@router.get("/analytics/uploads/monthly", response_model=List[UploadsMonthlyRow])
+def read_uploads_monthly(
+        date_from: Optional[datetime.date] = Query(None, description="С месяца, начинающегося не раньше этой даты"),
+        date_to: Optional[datetime.date] = Query(None, description="По месяц, начинающийся не позже этой даты"),
+        project_id: Optional[int] = Query(None, description="ID проекта"),
+        skip: int = Query(0, ge=0, description="Пропустить N записей"),
+        limit: int = Query(500, ge=1, le=5000, description="Максимум записей"),
+        db: Session = Depends(get_db),
+        current_user: User = Depends(RoleChecker(["админ"]))
+):
+    """Число и объём загруженных файлов по проектам и месяцам"""
+    return uploads_monthly(db, date_from, date_to, project_id, skip, limit)
+
+@router.get("/analytics/teams/growth", response_model=List[TeamGrowthRow])
+def read_team_growth(
+        date_from: Optional[datetime.date] = Query(None, description="С недели, начинающейся не раньше этой даты"),
+        date_to: Optional[datetime.date] = Query(None, description="По неделю, начинающуюся не позже этой даты"),
+        project_id: Optional[int] = Query(None, description="ID проекта"),
+        role: Optional[str] = Query(None, description="Роль в команде"),
+        db: Session = Depends(get_db),
+        current_user: User = Depends(RoleChecker(["админ"]))
+):
+    """Рост команд по неделям: пришедшие участники и накопленный итог"""
+    return team_growth(db, date_from, date_to, project_id, role)
+
+@router.get("/analytics/refreshes", response_model=List[AnalyticsRefresh])
+def read_analytics_refreshes(
+        db: Session = Depends(get_db),
+        current_user: User = Depends(RoleChecker(["админ"]))
+):
+    """Время последнего обновления каждого представления аналитики"""
+    return analytics_refreshes(db)
+
+@router.post("/admin/analytics/refresh", status_code=status.HTTP_202_ACCEPTED)
+def refresh_analytics_now(
+        db: Session = Depends(get_db),
+        current_user: User = Depends(RoleChecker(["админ"]))
+):
+    """Внеочередное обновление представлений аналитики"""
+    job_id = enqueue_job(db, "analytics.refresh", {}, dedupe_key="analytics.refresh:manual")
+    db.commit()
+    if job_id is None:
+        raise HTTPException(status_code=409, detail="Обновление уже запущено")
+    return {"job_id": job_id}
+
+
+
+# --- Ключевые слова ---
+# Счётчики ведутся триггером при записи проектов; пользователям, кроме
+# админов, статистика считается только по публичным проектам
+
+@router.get("/keywords/top", response_model=List[KeywordCount])
+def read_top_keywords(
+        status: Optional[str] = Query(None, description="Статус проекта"),
+        subject_area_id: Optional[int] = Query(None, description="ID предметной области"),
+        include_subtree: bool = Query(True, description="Учитывать подобласти предметной области"),
+        skip: int = Query(0, ge=0, description="Пропустить N записей"),
+        limit: int = Query(50, ge=1, le=500, description="Максимум записей"),
+        current_user: User = Depends(get_current_user),
+        db: Session = Depends(get_db)
+):
+    """Самые частые ключевые слова проектов"""
+    return top_keywords(db, status, subject_area_id, include_subtree, current_user.role != "админ", skip, limit)
+
+@router.get("/keywords/trending", response_model=List[KeywordTrend])
+def read_trending_keywords(
+        month: Optional[datetime.date] = Query(None, description="Любая дата месяца; по умолчанию текущий"),
+        status: Optional[str] = Query(None, description="Статус проекта"),
+        subject_area_id: Optional[int] = Query(None, description="ID предметной области"),
+        include_subtree: bool = Query(True, description="Учитывать подобласти предметной области"),
+        skip: int = Query(0, ge=0, description="Пропустить N записей"),
+        limit: int = Query(50, ge=1, le=500, description="Максимум записей"),
+        current_user: User = Depends(get_current_user),
+        db: Session = Depends(get_db)
+):
+    """Ключевые слова проектов, созданных за месяц, в сравнении с предыдущим месяцем"""
+    return trending_keywords(
+        db, month, status, subject_area_id, include_subtree, current_user.role != "админ", skip, limit
+    )
+
+@router.get("/keywords/{keyword}/related", response_model=List[KeywordCount])
+def read_related_keywords(
+        keyword: str,
+        status: Optional[str] = Query(None, description="Статус проекта"),
+        subject_area_id: Optional[int] = Query(None, description="ID предметной области"),
+        include_subtree: bool = Query(True, description="Учитывать подобласти предметной области"),
+        skip: int = Query(0, ge=0, description="Пропустить N записей"),
+        limit: int = Query(50, ge=1, le=500, description="Максимум записей"),
+        current_user: User = Depends(get_current_user),
+        db: Session = Depends(get_db)
+):
+    """Ключевые слова, чаще всего встречающиеся в одних проектах с keyword"""
+    related = related_keywords(
+        db, keyword, status, subject_area_id, include_subtree, current_user.role != "админ", skip, limit
+    )
+    if related is None:
+        raise HTTPException(status_code=404, detail="Ключевое слово не найдено")
+    return related
+
+@router.post("/admin/keywords/rebuild")
+def rebuild_keyword_statistics(
+        db: Session = Depends(get_db),
+        current_user: User = Depends(RoleChecker(["админ"]))
+):
+    """Пересчёт статистики ключевых слов с нуля"""
+    return {"keyword_counts": rebuild_keyword_stats(db)}
+
+# --- Фоновая очередь задач ---
+
+@router.get("/admin/jobs/stats", response_model=JobQueueStats)
+def read_job_queue_stats(
+        failures_limit: int = Query(20, ge=1, le=200, description="Сколько последних ошибок вернуть"),
+        db: Session = Depends(get_db),
+        current_user: User = Depends(RoleChecker(["админ"]))
+):
+    return get_queue_stats(db, failures_limit=failures_limit)
+
+
+@router.get("/admin/jobs/{job_id}", response_model=JobRead)
+def read_job(
+        job_id: int,
+        db: Session = Depends(get_db),
+        current_user: User = Depends(RoleChecker(["админ"]))
+):
+    job = get_job(db, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Задача не найдена")
+    return job
+
+
+@router.post("/admin/jobs/{job_id}/retry", response_model=JobRead)
+def retry_failed_job(
+        job_id: int,
+        db: Session = Depends(get_db),
+        current_user: User = Depends(RoleChecker(["админ"]))
+):
+    try:
+        job = retry_job(db, job_id)
+    except JobNotRetryable as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if not job:
+        raise HTTPException(status_code=404, detail="Задача не найдена")
+    return job
+
+
+# --- Хранилище ---
+
+@router.get("/admin/storage/cache")
+def read_download_cache_stats(current_user: User = Depends(RoleChecker(["админ"]))):
+    """Статистика дискового кэша скачиваний: попадания, промахи, доля попаданий, занятый объём"""
+    stats = download_cache_stats()
+    if stats is None:
+        return {"enabled": False}
+    return {"enabled": True, **stats}
+
+
+@router.post("/admin/storage/reconcile", status_code=status.HTTP_202_ACCEPTED)
+def start_storage_reconcile(
+        dry_run: bool = Query(True, description="Только отчёт, без удаления"),
+        prefix: str = Query("", description="Проверять только ключи с этим префиксом"),
+        db: Session = Depends(get_db),
+        current_user: User = Depends(RoleChecker(["админ"]))
+):
+    """
+    Ставит сверку бакета с таблицей project_files: лишние объекты и записи без объектов.
+    Отчёт — в результате задачи (GET /admin/jobs/{job_id}); большой бакет
+    сверяется цепочкой задач, итог — в результате последней из них.
+    """
+    # Продолжения ставятся без общего ключа — второй проход параллельно первому не запускаем
+    if job_in_progress(db, "storage.reconcile"):
+        raise HTTPException(status_code=409, detail="Сверка уже выполняется")
+    job_id = enqueue_job(
+        db, "storage.reconcile", {"dry_run": dry_run, "prefix": prefix},
+        max_attempts=1, dedupe_key="storage.reconcile"
+    )
+    db.commit()
+    if job_id is None:
+        raise HTTPException(status_code=409, detail="Сверка уже выполняется")
+    return {"job_id": job_id}
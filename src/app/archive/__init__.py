@@ -0,0 +1 @@
+from .archive import ZipEntry, stream_zip
@@ -0,0 +1,152 @@
+import datetime
+import os
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Deque, Iterable, Iterator, List, NamedTuple, Optional
+
+ZIP_CHUNK_SIZE = int(os.getenv("ZIP_CHUNK_SIZE", str(256 * 1024)))
+ZIP_PREFETCH = int(os.getenv("ZIP_PREFETCH", "4"))  # сколько объектов открываем заранее
+
+
+class ZipEntry(NamedTuple):
+    arcname: str
+    object_name: str
+    size: Optional[int]
+    modified_at: Optional[datetime.datetime]
+
+
+class _ChunkSink:
+    """Приёмник без seek() для ZipFile: накапливает записанные байты до выдачи клиенту"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self.buffered = 0
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self.buffered += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        self.buffered = 0
+        return data
+
+
+def _unique_arcname(name: str, used: set) -> str:
+    # В проекте может быть несколько файлов с одинаковым именем
+    if name not in used:
+        used.add(name)
+        return name
+    base, ext = os.path.splitext(name)
+    n = 1
+    while f"{base} ({n}){ext}" in used:
+        n += 1
+    unique = f"{base} ({n}){ext}"
+    used.add(unique)
+    return unique
+
+
+def _read_chunks(obj) -> Iterator[bytes]:
+    if hasattr(obj, "stream"):
+        yield from obj.stream(ZIP_CHUNK_SIZE)
+        return
+    while True:
+        chunk = obj.read(ZIP_CHUNK_SIZE)
+        if not chunk:
+            return
+        yield chunk
+
+
+def _close(obj) -> None:
+    try:
+        obj.close()
+        if hasattr(obj, "release_conn"):
+            obj.release_conn()
+    except Exception:
+        pass
+
+
+def stream_zip(
+        entries: Iterable[ZipEntry],
+        opener: Callable[[str], object],
+        prefetch: int = ZIP_PREFETCH
+) -> Iterator[bytes]:
+    """
+    Отдаёт ZIP-архив по частям, не создавая временных файлов.
+
+    opener(object_name) должен вернуть поток с read()/stream() (например, ответ
+    client.get_object). Следующие prefetch объектов открываются параллельно,
+    пока текущий переписывается в архив, — так задержка хранилища не суммируется
+    по файлам, а память ограничена prefetch открытыми соединениями и одним блоком.
+    Файлы пишутся без сжатия (ZIP_STORED), ZIP64 включается автоматически.
+    Объекты, которые не удалось прочитать, перечисляются в _errors.txt в конце архива.
+    """
+    sink = _ChunkSink()
+    used_names: set = set()
+    errors: List[str] = []
+    pending: Deque = deque()
+    entries = iter(entries)
+
+    pool = ThreadPoolExecutor(max_workers=max(prefetch, 1))
+    try:
+        def schedule():
+            while len(pending) < max(prefetch, 1):
+                entry = next(entries, None)
+                if entry is None:
+                    return
+                pending.append((entry, pool.submit(opener, entry.object_name)))
+
+        zf = zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_STORED, allowZip64=True)
+        try:
+            schedule()
+            while pending:
+                entry, future = pending.popleft()
+                schedule()
+                try:
+                    obj = future.result()
+                except Exception as e:
+                    errors.append(f"{entry.arcname}: {e}")
+                    continue
+
+                modified = entry.modified_at or datetime.datetime.utcnow()
+                info = zipfile.ZipInfo(
+                    _unique_arcname(entry.arcname, used_names),
+                    date_time=modified.timetuple()[:6]
+                )
+                info.compress_type = zipfile.ZIP_STORED
+                if entry.size is not None:
+                    info.file_size = entry.size
+                force_zip64 = entry.size is None or entry.size >= zipfile.ZIP64_LIMIT
+                try:
+                    with zf.open(info, mode="w", force_zip64=force_zip64) as dst:
+                        for chunk in _read_chunks(obj):
+                            dst.write(chunk)
+                            if sink.buffered >= ZIP_CHUNK_SIZE:
+                                yield sink.drain()
+                finally:
+                    _close(obj)
+                if sink.buffered:
+                    yield sink.drain()
+
+            if errors:
+                zf.writestr("_errors.txt", "\n".join(errors))
+        finally:
+            zf.close()
+    finally:
+        for _, future in pending:
+            future.cancel()
+        pool.shutdown(wait=True)
+        # Незабранные заранее открытые потоки тоже закрываем
+        for _, future in pending:
+            if not future.cancelled() and future.exception() is None:
+                _close(future.result())
+
+    tail = sink.drain()
+    if tail:
+        yield tail
@@ -1,9 +1,11 @@
-from .crud import create_project_file, get_projects_filtered, get_user_by_email
+from .crud import create_project_file, get_projects_filtered, get_user_by_email, top_cited_projects_query
 from .crud import (
     get_user, get_users, create_user, delete_user,
     get_project, get_projects, create_project, update_project, delete_project,
+    get_report, get_reports, create_report, delete_report,
     get_subject_area, get_subject_areas, create_subject_area, update_subject_area, delete_subject_area,
     get_project_connection, get_project_connections, create_project_connection, delete_project_connection,
     get_team_member, get_team_members, create_team_member, update_team_member, delete_team_member,
-    get_project_file, get_project_files, create_project_file, update_project_file, delete_project_file
+    get_project_file, get_project_files, create_project_file, create_project_files,
+    update_project_file, delete_project_file, enqueue_file_processing, storage_key_shared
 )
\ No newline at end of file
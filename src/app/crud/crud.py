@@ -1,16 +1,21 @@
+import datetime
 from sqlalchemy_utils import Ltree
-from sqlalchemy import text
-from app.minio_client import delete_file
+from sqlalchemy import func, text
+from sqlalchemy.exc import IntegrityError
+from app.jobs import enqueue_job
+from app.graph import record_edge_added, record_edge_removed
+from app.similarity import index_project
+from app.taxonomy import (
+    invalidate_subject_tree, relocate_subject_area, RelocationError, RelocationInProgress
+)
 
 
 from app.models import (
     Project, SubjectArea, ProjectConnection,
-    TeamMember, ProjectFile
+    TeamMember, ProjectFile, Report
 )
-# Report
-# ReportCreate
 from app.schemas import (
-    ProjectCreate, SubjectAreaCreate,
+    ProjectCreate, SubjectAreaCreate, ReportCreate,
     ProjectConnectionCreate, TeamMemberCreate, ProjectFileCreate
 )
 
@@ -167,7 +172,7 @@ def update_user(db: Session, user_id: int, user_data: dict) -> User:
 
 def get_project(db: Session, project_id: int) -> Optional[Project]:
     try:
-        return db.query(Project).filter(Project.id == project_id).first()
+        return db.query(Project).filter(Project.id == project_id, Project.deleted_at.is_(None)).first()
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -177,7 +182,7 @@ def get_project(db: Session, project_id: int) -> Optional[Project]:
 
 def get_projects(db: Session, skip: int = 0, limit: int = 100) -> List[Project]:
     try:
-        return db.query(Project).offset(skip).limit(limit).all()
+        return db.query(Project).filter(Project.deleted_at.is_(None)).offset(skip).limit(limit).all()
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -197,6 +202,9 @@ def create_project(db: Session, project: ProjectCreate) -> Project:
         )
 
         db.add(db_project)
+        db.flush()
+        # Сигнатура для похожих проектов пишется в той же транзакции
+        index_project(db, db_project)
         db.commit()
         db.refresh(db_project)
         return db_project
@@ -209,6 +217,10 @@ def create_project(db: Session, project: ProjectCreate) -> Project:
         ) from e
 
 
+# Поля проекта, из которых строится сигнатура похожести
+SIMILARITY_FIELDS = {"title", "description", "keywords"}
+
+
 def update_project(db: Session, project_id: int, project_data: dict) -> Project:
     try:
         project = get_project(db, project_id)
@@ -222,6 +234,8 @@ def update_project(db: Session, project_id: int, project_data: dict) -> Project:
             if hasattr(project, key):
                 setattr(project, key, value)
 
+        if SIMILARITY_FIELDS.intersection(project_data):
+            index_project(db, project)
         db.commit()
         db.refresh(project)
         return project
@@ -246,7 +260,10 @@ def delete_project(db: Session, project_id: int) -> None:
                 detail="Проект не найден"
             )
 
-        db.delete(project)
+        # Помечаем проект удалённым и сразу возвращаемся: связи, участники,
+        # файлы и отчёты удаляет воркер порциями (задача project.purge)
+        project.deleted_at = datetime.datetime.utcnow()
+        enqueue_job(db, "project.purge", {"project_id": project.id}, dedupe_key=f"project.purge:{project.id}")
         db.commit()
 
     except HTTPException:
@@ -261,30 +278,60 @@ def delete_project(db: Session, project_id: int) -> None:
 
 
 # --- Report CRUD ---
-#
-# def get_report(db: Session, report_id: int) -> Optional[Report]:
-#     return db.query(Report).filter(Report.id == report_id).first()
-#
-# def get_reports(db: Session, skip: int = 0, limit: int = 100) -> List[Report]:
-#     return db.query(Report).offset(skip).limit(limit).all()
-#
-# def create_report(db: Session, report: ReportCreate) -> Report:
-#     db_report = Report(
-#         file_id=report.file_id,
-#         table_data=report.table_data,
-#         view_options=report.view_options
-#     )
-#     db.add(db_report)
-#     db.commit()
-#     db.refresh(db_report)
-#     return db_report
-#
-# def delete_report(db: Session, report_id: int) -> None:
-#     report = get_report(db, report_id)
-#     if not report:
-#         raise HTTPException(status_code=404, detail="Отчет не найден")
-#     db.delete(report)
-#     db.commit()
+
+def get_report(db: Session, report_id: int) -> Optional[Report]:
+    return db.query(Report).filter(Report.id == report_id).first()
+
+def get_reports(
+        db: Session,
+        skip: int = 0,
+        limit: int = 100,
+        file_id: Optional[int] = None,
+        visibility_filter=None
+) -> List[Report]:
+    query = (
+        db.query(Report)
+        .join(ProjectFile, ProjectFile.id == Report.file_id)
+        .join(Project, Project.id == ProjectFile.project_id)
+        .filter(Project.deleted_at.is_(None))
+    )
+    if file_id is not None:
+        query = query.filter(Report.file_id == file_id)
+    if visibility_filter is not None:
+        query = query.filter(visibility_filter)
+    return query.order_by(Report.id.desc()).offset(skip).limit(limit).all()
+
+def create_report(db: Session, report: ReportCreate) -> Report:
+    try:
+        if get_project_file(db, report.file_id) is None:
+            raise HTTPException(status_code=404, detail="Файл проекта не найден")
+        db_report = Report(
+            file_id=report.file_id,
+            table_data={},
+            view_options=report.view_options,
+            status="pending"
+        )
+        db.add(db_report)
+        db.flush()
+        # Таблица разбирается воркером очереди: файлы бывают большими
+        enqueue_job(db, "report.build", {"report_id": db_report.id}, max_attempts=3,
+                    dedupe_key=f"report:{db_report.id}")
+        db.commit()
+        db.refresh(db_report)
+        return db_report
+    except HTTPException:
+        db.rollback()
+        raise
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=f"Ошибка создания отчета: {str(e)}") from e
+
+def delete_report(db: Session, report_id: int) -> None:
+    report = get_report(db, report_id)
+    if not report:
+        raise HTTPException(status_code=404, detail="Отчет не найден")
+    db.delete(report)
+    db.commit()
 
 # --- SubjectArea CRUD ---
 
@@ -316,6 +363,7 @@ def create_subject_area(db: Session, subject_area: SubjectAreaCreate) -> Subject
             parent_id = None
 
         # Проверяем что parent_id существует (если не None)
+        parent = None
         if parent_id is not None:
             parent = db.query(SubjectArea).filter(SubjectArea.id == parent_id).first()
             if parent is None:
@@ -324,29 +372,30 @@ def create_subject_area(db: Session, subject_area: SubjectAreaCreate) -> Subject
                     detail=f"Родительская категория с ID {parent_id} не найдена"
                 )
 
+        # ID берём из последовательности заранее, чтобы путь записать той же вставкой
+        new_id = db.execute(text("SELECT nextval('subject_areas_id_seq')")).scalar()
+        if parent is not None and parent.path is not None:
+            path = parent.path + Ltree(str(new_id))
+        else:
+            path = Ltree(str(new_id))
+
         db_subject_area = SubjectArea(
+            id=new_id,
             name=subject_area.name,
             description=subject_area.description,
             user_id=subject_area.user_id,
-            parent_id=parent_id  # используем исправленное значение
+            parent_id=parent_id,  # используем исправленное значение
+            path=path
         )
 
         db.add(db_subject_area)
         db.commit()
         db.refresh(db_subject_area)
-
-        # Обновляем путь после получения ID
-        if db_subject_area.parent_id is None:
-            db_subject_area.path = Ltree(str(db_subject_area.id))
-        else:
-            parent = db.query(SubjectArea).filter(SubjectArea.id == db_subject_area.parent_id).first()
-            db_subject_area.path = parent.path + Ltree(str(db_subject_area.id))
-
-        db.commit()
-        db.refresh(db_subject_area)
+        invalidate_subject_tree()
         return db_subject_area
 
     except HTTPException:
+        db.rollback()
         raise
     except Exception as e:
         db.rollback()
@@ -365,70 +414,31 @@ def update_subject_area(db: Session, subject_area_id: int, data: dict) -> Subjec
                 detail="Предметная область не найдена"
             )
 
-        # Проверка циклических ссылок
-        if 'parent_id' in data and data['parent_id']:
-            if data['parent_id'] == subject_area.id:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="Нельзя сделать элемент родителем самого себя"
-                )
-
-            new_parent = db.query(SubjectArea).filter(SubjectArea.id == data['parent_id']).first()
-            if not new_parent:
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND,
-                    detail="Родительская область не найдена"
-                )
-
-        # Сохраняем старые значения
-        old_path = subject_area.path
-        old_parent_id = subject_area.parent_id
-
         # Обновляем простые поля
         for key, value in data.items():
-            if hasattr(subject_area, key) and key not in ['parent_id', 'path']:
+            if hasattr(subject_area, key) and key not in ['id', 'parent_id', 'path']:
                 setattr(subject_area, key, value)
 
-        # Обрабатываем изменение parent_id
+        # Перенос в другое место дерева: проверка цикла и перезапись путей
+        # поддерева (большие поддеревья переносятся фоновой задачей)
         if 'parent_id' in data:
-            new_parent_id = data['parent_id']
-            subject_area.parent_id = new_parent_id
-
-            # Вычисляем новый путь
-            if new_parent_id is None:
-                subject_area.path = Ltree(str(subject_area.id))
-            else:
-                new_parent = db.query(SubjectArea).filter(SubjectArea.id == new_parent_id).first()
-                if not new_parent:
+            new_parent_id = data['parent_id'] or None
+            if new_parent_id != subject_area.parent_id:
+                try:
+                    relocate_subject_area(db, subject_area, new_parent_id)
+                except LookupError:
                     raise HTTPException(
                         status_code=status.HTTP_404_NOT_FOUND,
-                        detail="Новый родитель не найден"
+                        detail="Родительская область не найдена"
                     )
-                subject_area.path = Ltree(
-                    f"{new_parent.path}.{subject_area.id}" if new_parent.path else str(subject_area.id)
-                )
-
-            db.flush()
-
-            # Обновляем пути всех потомков, если изменился parent_id
-            if old_path and subject_area.path != old_path:
-                update_query = text("""
-                    UPDATE subject_areas 
-                    SET path = CAST(:new_root AS ltree) || subpath(path, nlevel(CAST(:old_root AS ltree)))
-                    WHERE path <@ CAST(:old_root AS ltree) AND id != :exclude_id
-                """)
-
-                db.execute(
-                    update_query,
-                    {
-                        "new_root": str(subject_area.path),
-                        "old_root": str(old_path),
-                        "exclude_id": subject_area.id
-                    }
-                )
+                except RelocationError as e:
+                    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+                except RelocationInProgress as e:
+                    raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
 
         db.commit()
         db.refresh(subject_area)
+        invalidate_subject_tree()
         return subject_area
 
     except HTTPException:
@@ -469,6 +479,7 @@ def delete_subject_area(db: Session, subject_area_id: int) -> None:
 
         db.delete(subject_area)
         db.commit()
+        invalidate_subject_tree()
 
     except HTTPException:
         db.rollback()
@@ -495,16 +506,13 @@ def get_project_connection(db: Session, project_id: int, related_project_id: int
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Ошибка операции: {str(e)}") from e
 
-def get_project_connections(db: Session) -> List[ProjectConnection]:
+def get_project_connections(db: Session, project_id: Optional[int] = None) -> List[ProjectConnection]:
+    """Исходящие связи проекта или, без project_id, все связи"""
     try:
-        return db.query(ProjectConnection).all()
-    except Exception as e:
-        db.rollback()
-        raise HTTPException(status_code=500, detail=f"Ошибка операции: {str(e)}") from e
-
-def get_project_connections(db: Session, project_id: int) -> List[ProjectConnection]:
-    try:
-        return db.query(ProjectConnection).filter(ProjectConnection.project_id == project_id).all()
+        query = db.query(ProjectConnection)
+        if project_id is not None:
+            query = query.filter(ProjectConnection.project_id == project_id)
+        return query.all()
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Ошибка получения связей проекта: {str(e)}") from e
@@ -523,6 +531,7 @@ def create_project_connection(db: Session, pc: ProjectConnectionCreate) -> Proje
         db.add(db_pc)
         db.commit()
         db.refresh(db_pc)
+        record_edge_added(db_pc.project_id, db_pc.related_project_id)
         return db_pc
     except HTTPException:
         db.rollback()
@@ -538,6 +547,7 @@ def delete_project_connection(db: Session, project_id: int, related_project_id:
             raise HTTPException(status_code=404, detail="Связь проекта не найдена")
         db.delete(pc)
         db.commit()
+        record_edge_removed(project_id, related_project_id)
     except HTTPException:
         db.rollback()
         raise
@@ -645,17 +655,37 @@ def get_project_files(db: Session, project_id: Optional[int] = None) -> List[Pro
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Ошибка операции: {str(e)}") from e
 
-def create_project_file(db: Session, pf: ProjectFileCreate) -> ProjectFile:
+def enqueue_file_processing(db: Session, pf: ProjectFile) -> None:
+    """
+    Ставит фоновую обработку нового содержимого файла (превью, индексация текста, отчёты).
+    Превью дедуплицируется по хэшу содержимого: одинаковые файлы обрабатываются один раз.
+    Вызывается до коммита, чтобы задачи появились вместе с записью.
+    """
+    sha256 = (pf.file_metadata or {}).get("sha256")
+    if not sha256:
+        return
+    enqueue_job(db, "preview.generate", {"file_id": pf.id}, max_attempts=3, dedupe_key=f"preview:{sha256}")
+    enqueue_job(db, "text.extract", {"file_id": pf.id}, max_attempts=3, dedupe_key=f"text:{pf.id}:{sha256}")
+    # Отчёты по файлу пересобираются по новому содержимому
+    for (report_id,) in db.query(Report.id).filter(Report.file_id == pf.id):
+        enqueue_job(db, "report.build", {"report_id": report_id}, max_attempts=3,
+                    dedupe_key=f"report:{report_id}:{sha256}")
+
+def create_project_file(db: Session, pf: ProjectFileCreate, object_key: Optional[str] = None) -> ProjectFile:
+    """object_key задаёт только сервер (путь загрузки), клиенту он недоступен"""
     try:
         db_pf = ProjectFile(
             project_id=pf.project_id,
             name=pf.name,
             url=pf.url,
+            object_key=object_key,
             file_metadata=pf.file_metadata,
             uploaded_by=pf.uploaded_by,
             is_public=pf.is_public
         )
         db.add(db_pf)
+        db.flush()
+        enqueue_file_processing(db, db_pf)
         db.commit()
         db.refresh(db_pf)
         return db_pf
@@ -666,6 +696,50 @@ def create_project_file(db: Session, pf: ProjectFileCreate) -> ProjectFile:
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Ошибка операции: {str(e)}") from e
 
+def create_project_files(db: Session, items: List[ProjectFileCreate], object_keys: List[str]) -> List[ProjectFile]:
+    """
+    Создаёт несколько записей файлов в одной транзакции: либо все, либо ни одной.
+    object_keys — ключи объектов, выданные сервером, по одному на запись.
+    """
+    try:
+        db_files = [
+            ProjectFile(
+                project_id=pf.project_id,
+                name=pf.name,
+                url=pf.url,
+                object_key=key,
+                file_metadata=pf.file_metadata,
+                uploaded_by=pf.uploaded_by,
+                is_public=pf.is_public
+            )
+            for pf, key in zip(items, object_keys)
+        ]
+        db.add_all(db_files)
+        db.flush()
+        for db_pf in db_files:
+            enqueue_file_processing(db, db_pf)
+        ids = [db_pf.id for db_pf in db_files]
+        db.commit()
+        # Один запрос вместо refresh() на каждую запись
+        return db.query(ProjectFile).filter(ProjectFile.id.in_(ids)).order_by(ProjectFile.id).all()
+    except HTTPException:
+        db.rollback()
+        raise
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=f"Ошибка операции: {str(e)}") from e
+
+def storage_key_shared(db: Session, pf: ProjectFile) -> bool:
+    """
+    Ссылаются ли на объект файла другие записи. Старые файлы адресуются
+    именем, и под одним именем могут лежать записи других проектов —
+    такой объект удалять нельзя (см. также app.purge).
+    """
+    return db.query(ProjectFile.id).filter(
+        func.coalesce(ProjectFile.object_key, ProjectFile.name) == pf.storage_key,
+        ProjectFile.id != pf.id
+    ).first() is not None
+
 def update_project_file(db: Session, file_id: int, data: dict) -> ProjectFile:
     try:
         pf = get_project_file(db, file_id)
@@ -679,6 +753,10 @@ def update_project_file(db: Session, file_id: int, data: dict) -> ProjectFile:
     except HTTPException:
         db.rollback()
         raise
+    except IntegrityError as e:
+        # Старая запись фиксирует ключ по имени файла, а этот ключ уже занят другой записью
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Ключ объекта файла уже используется другой записью") from e
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Ошибка операции: {str(e)}") from e
@@ -689,10 +767,10 @@ def delete_project_file(db: Session, file_id: int) -> None:
         if not pf:
             raise HTTPException(status_code=404, detail="Файл проекта не найден")
 
-        try:
-            delete_file(file_name=pf.name)  # Ваша функция удаления из MinIO
-        except Exception as e:
-            print(f"Ошибка удаления из MinIO: {e}")
+        # Объект удаляется из MinIO воркером очереди — с повторами при сбоях.
+        # Задача фиксируется в той же транзакции, что и удаление записи.
+        if not storage_key_shared(db, pf):
+            enqueue_job(db, "storage.delete", {"object_name": pf.storage_key})
 
         db.delete(pf)
         db.commit()
@@ -709,6 +787,29 @@ from sqlalchemy import or_
 from app.models import Project
 
 
+def top_cited_projects_query(
+        db: Session,
+        subject_area_id: Optional[int] = None,
+        include_subtree: bool = True,
+        status: Optional[str] = None
+):
+    """
+    Запрос проектов по убыванию цитируемости (индекс projects_citation_count_idx).
+    subject_area_id с include_subtree учитывает всё поддерево области.
+    """
+    query = db.query(Project).filter(Project.deleted_at.is_(None))
+    if subject_area_id is not None:
+        if include_subtree:
+            root_path = db.query(SubjectArea.path).filter(SubjectArea.id == subject_area_id).scalar_subquery()
+            subtree_ids = db.query(SubjectArea.id).filter(SubjectArea.path.op("<@")(root_path))
+            query = query.filter(Project.subject_area_id.in_(subtree_ids))
+        else:
+            query = query.filter(Project.subject_area_id == subject_area_id)
+    if status:
+        query = query.filter(Project.status == status)
+    return query.order_by(Project.citation_count.desc().nulls_last(), Project.id)
+
+
 def get_projects_filtered(
         db: Session,
         search: Optional[str] = None,
@@ -719,7 +820,7 @@ def get_projects_filtered(
         limit: int = 100
 ) -> List[Project]:
     try:
-        query = db.query(Project)
+        query = db.query(Project).filter(Project.deleted_at.is_(None))
 
         if search:
             search_pattern = f"%{search}%"
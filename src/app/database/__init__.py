@@ -1,2 +1,2 @@
 from .database import Base
-from .database import get_db
\ No newline at end of file
+from .database import get_db, SessionLocal
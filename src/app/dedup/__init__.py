@@ -0,0 +1 @@
+from .dedup import find_duplicate_candidates, scan_duplicates, duplicate_clusters, keyword_similarity
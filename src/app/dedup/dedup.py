@@ -0,0 +1,216 @@
+import os
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from app.jobs.jobs import enqueue_job
+
+# Проект считается вероятным дублем, если названия похожи по триграммам
+# не меньше DEDUP_TITLE_THRESHOLD, либо похожи слабее (от DEDUP_TITLE_MIN),
+# но совпадает заметная доля ключевых слов (от DEDUP_KEYWORD_THRESHOLD)
+DEDUP_TITLE_THRESHOLD = float(os.getenv("DEDUP_TITLE_THRESHOLD", "0.6"))
+DEDUP_TITLE_MIN = float(os.getenv("DEDUP_TITLE_MIN", "0.35"))
+DEDUP_KEYWORD_THRESHOLD = float(os.getenv("DEDUP_KEYWORD_THRESHOLD", "0.5"))
+# Сколько ближайших по названию проектов проверяем (поиск k ближайших по GiST-индексу)
+DEDUP_NEIGHBOURS = int(os.getenv("DEDUP_NEIGHBOURS", "10"))
+# Бюджет проверки при создании проекта: по истечении создание идёт без неё
+DEDUP_CHECK_TIMEOUT_MS = int(os.getenv("DEDUP_CHECK_TIMEOUT_MS", "25"))
+DEDUP_SCAN_BATCH = int(os.getenv("DEDUP_SCAN_BATCH", "500"))
+DEDUP_SCAN_RUN_SECONDS = float(os.getenv("DEDUP_SCAN_RUN_SECONDS", "30"))
+
+_QUERY_CANCELED = "57014"
+
+_NEIGHBOURS_SQL = text("""
+    SELECT id, title, status, keywords, similarity(lower(title), lower(:title)) AS title_similarity
+    FROM projects
+    WHERE deleted_at IS NULL AND id <> :exclude_id
+    ORDER BY lower(title) <-> lower(:title)
+    LIMIT :neighbours
+""")
+
+_SCAN_SQL = text("""
+    SELECT p.id, p.keywords, c.id AS other_id, c.keywords AS other_keywords,
+           similarity(lower(p.title), lower(c.title)) AS title_similarity
+    FROM projects p
+    CROSS JOIN LATERAL (
+        SELECT q.id, q.title, q.keywords FROM projects q
+        WHERE q.deleted_at IS NULL AND q.id <> p.id
+        ORDER BY lower(q.title) <-> lower(p.title)
+        LIMIT :neighbours
+    ) c
+    WHERE p.id = ANY(:ids)
+""")
+
+
+def _keyword_set(keywords: Optional[Iterable[Any]]) -> set:
+    return {str(k).strip().lower() for k in keywords or [] if str(k).strip()}
+
+
+def keyword_similarity(a: Optional[Iterable[Any]], b: Optional[Iterable[Any]]) -> float:
+    """Коэффициент Жаккара по ключевым словам без учёта регистра; 0, если у одного из проектов их нет"""
+    a, b = _keyword_set(a), _keyword_set(b)
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def is_duplicate(title_similarity: float, keywords_similarity: float) -> bool:
+    if title_similarity >= DEDUP_TITLE_THRESHOLD:
+        return True
+    return title_similarity >= DEDUP_TITLE_MIN and keywords_similarity >= DEDUP_KEYWORD_THRESHOLD
+
+
+def find_duplicate_candidates(
+        db: Session,
+        title: str,
+        keywords: Optional[Iterable[Any]],
+        exclude_id: Optional[int] = None,
+        timeout_ms: int = DEDUP_CHECK_TIMEOUT_MS
+) -> Tuple[List[Dict[str, Any]], bool]:
+    """
+    Вероятные дубли проекта с таким названием и ключевыми словами среди живых
+    проектов. Запрос ограничен statement_timeout = timeout_ms и выполняется
+    в точке сохранения, так что отмена по таймауту не ломает транзакцию
+    вызывающего. Возвращает (кандидаты по убыванию сходства, проверка завершена).
+    """
+    previous = db.execute(text("SELECT current_setting('statement_timeout')")).scalar()
+    savepoint = db.begin_nested()
+    try:
+        db.execute(text("SELECT set_config('statement_timeout', :ms, true)"), {"ms": str(timeout_ms)})
+        rows = db.execute(_NEIGHBOURS_SQL, {
+            "title": title,
+            "exclude_id": exclude_id if exclude_id is not None else 0,
+            "neighbours": DEDUP_NEIGHBOURS,
+        }).mappings().all()
+        savepoint.commit()
+    except OperationalError as e:
+        savepoint.rollback()
+        if getattr(e.orig, "pgcode", None) != _QUERY_CANCELED:
+            raise
+        return [], False
+    finally:
+        db.execute(text("SELECT set_config('statement_timeout', :ms, true)"), {"ms": previous})
+
+    candidates = []
+    for row in rows:
+        kw_similarity = keyword_similarity(keywords, row["keywords"])
+        if is_duplicate(row["title_similarity"], kw_similarity):
+            candidates.append({
+                "id": row["id"],
+                "title": row["title"],
+                "status": row["status"],
+                "title_similarity": round(float(row["title_similarity"]), 4),
+                "keyword_similarity": round(kw_similarity, 4),
+            })
+    candidates.sort(key=lambda c: (-c["title_similarity"], -c["keyword_similarity"], c["id"]))
+    return candidates, True
+
+
+def scan_duplicates(db: Session, after_id: int) -> Dict[str, Any]:
+    """
+    Пакетный поиск дублей по всей таблице: для живых проектов с id > after_id
+    порциями по DEDUP_SCAN_BATCH ищет ближайших по названию соседей и пишет
+    найденные пары в project_duplicate_pairs. Новый проход (after_id = 0)
+    начинается с очистки таблицы. Через DEDUP_SCAN_RUN_SECONDS задача ставит
+    продолжение; после последней порции результат — сводка по кластерам.
+    """
+    if after_id == 0:
+        db.execute(text("DELETE FROM project_duplicate_pairs"))
+        db.commit()
+
+    deadline = time.monotonic() + DEDUP_SCAN_RUN_SECONDS
+    scanned = pairs = 0
+    while True:
+        ids = [pid for (pid,) in db.execute(text("""
+            SELECT id FROM projects WHERE deleted_at IS NULL AND id > :after_id ORDER BY id LIMIT :batch
+        """), {"after_id": after_id, "batch": DEDUP_SCAN_BATCH}).all()]
+        if not ids:
+            break
+        found = []
+        for row in db.execute(_SCAN_SQL, {"ids": ids, "neighbours": DEDUP_NEIGHBOURS}).mappings():
+            kw_similarity = keyword_similarity(row["keywords"], row["other_keywords"])
+            if is_duplicate(row["title_similarity"], kw_similarity):
+                found.append({
+                    "project_id": min(row["id"], row["other_id"]),
+                    "duplicate_id": max(row["id"], row["other_id"]),
+                    "title_similarity": float(row["title_similarity"]),
+                    "keyword_similarity": kw_similarity,
+                })
+        if found:
+            db.execute(text("""
+                INSERT INTO project_duplicate_pairs (project_id, duplicate_id, title_similarity, keyword_similarity)
+                VALUES (:project_id, :duplicate_id, :title_similarity, :keyword_similarity)
+                ON CONFLICT (project_id, duplicate_id) DO NOTHING
+            """), found)
+        db.commit()
+        scanned += len(ids)
+        pairs += len(found)
+        after_id = ids[-1]
+        if len(ids) < DEDUP_SCAN_BATCH:
+            break
+        if time.monotonic() > deadline:
+            enqueue_job(db, "projects.duplicates.scan", {"after_id": after_id})
+            return {"scanned": scanned, "pairs": pairs, "after_id": after_id, "continued": True}
+
+    clusters = duplicate_clusters(db)
+    return {
+        "scanned": scanned,
+        "pairs": pairs,
+        "done": True,
+        "clusters": len(clusters),
+        "projects_in_clusters": sum(c["size"] for c in clusters),
+    }
+
+
+def duplicate_clusters(db: Session) -> List[Dict[str, Any]]:
+    """
+    Кластеры дублей из последнего прохода: компоненты связности графа пар
+    (объединение множеств), по убыванию размера. Удалённые с тех пор проекты не учитываются.
+    """
+    rows = db.execute(text("""
+        SELECT d.project_id, d.duplicate_id, d.title_similarity
+        FROM project_duplicate_pairs d
+        JOIN projects a ON a.id = d.project_id AND a.deleted_at IS NULL
+        JOIN projects b ON b.id = d.duplicate_id AND b.deleted_at IS NULL
+    """)).all()
+
+    parent: Dict[int, int] = {}
+
+    def find(x: int) -> int:
+        parent.setdefault(x, x)
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for a, b, _ in rows:
+        ra, rb = find(a), find(b)
+        if ra != rb:
+            parent[max(ra, rb)] = min(ra, rb)
+
+    members: Dict[int, List[int]] = {}
+    best: Dict[int, float] = {}
+    for x in parent:
+        members.setdefault(find(x), []).append(x)
+    for a, _, similarity in rows:
+        root = find(a)
+        best[root] = max(best.get(root, 0.0), float(similarity))
+
+    titles = {}
+    if parent:
+        titles = dict(db.execute(
+            text("SELECT id, title FROM projects WHERE id = ANY(:ids)"), {"ids": list(parent)}
+        ).all())
+    clusters = [
+        {
+            "size": len(ids),
+            "max_title_similarity": round(best[root], 4),
+            "projects": [{"id": pid, "title": titles.get(pid)} for pid in sorted(ids)],
+        }
+        for root, ids in members.items()
+    ]
+    clusters.sort(key=lambda c: (-c["size"], -c["max_title_similarity"], c["projects"][0]["id"]))
+    return clusters
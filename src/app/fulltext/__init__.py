@@ -0,0 +1 @@
+from .fulltext import extract_text, index_file_text, search_files, stale_text_file_ids, text_kind
@@ -0,0 +1,206 @@
+import io
+import json
+import os
+import zipfile
+from typing import Any, Dict, List, Optional, Tuple
+from xml.etree import ElementTree
+
+from sqlalchemy import func, or_, text
+from sqlalchemy.orm import Session
+
+from app.models import FileText, Project, ProjectFile
+
+# Конфигурация полнотекстового поиска PostgreSQL (russian стеммит кириллицу,
+# латиница индексируется как есть)
+FTS_CONFIG = os.getenv("FTS_CONFIG", "russian")
+# tsvector ограничен 1 МБ — индексируем начало длинных документов
+FTS_MAX_CHARS = int(os.getenv("FTS_MAX_CHARS", str(400_000)))
+FTS_MAX_SOURCE_BYTES = int(os.getenv("FTS_MAX_SOURCE_BYTES", str(50 * 1024 * 1024)))
+FTS_EXCERPT_CHARS = 300
+# Сколько проектов (с наибольшей релевантностью) возвращает поиск вместе со страницей файлов
+FTS_MAX_PROJECTS = int(os.getenv("FTS_MAX_PROJECTS", "100"))
+
+_TEXT_TYPES = {
+    "text/plain", "text/csv", "text/tab-separated-values", "text/markdown", "text/html",
+    "application/json", "application/xml",
+}
+_DOCX_TYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+_W_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+
+def text_kind(detected_type: Optional[str]) -> Optional[str]:
+    """Способ извлечения текста для типа файла: text, json, docx, pdf или None"""
+    if detected_type == "application/json":
+        return "json"
+    if detected_type in _TEXT_TYPES:
+        return "text"
+    if detected_type == _DOCX_TYPE:
+        return "docx"
+    if detected_type == "application/pdf":
+        return "pdf"
+    return None
+
+
+def _json_strings(value, out: List[str]) -> None:
+    # Из JSON индексируем ключи и строковые значения, без синтаксиса
+    if isinstance(value, dict):
+        for k, v in value.items():
+            out.append(str(k))
+            _json_strings(v, out)
+    elif isinstance(value, list):
+        for v in value:
+            _json_strings(v, out)
+    elif isinstance(value, (str, int, float)) and not isinstance(value, bool):
+        out.append(str(value))
+
+
+def _docx_text(data: bytes) -> str:
+    parts: List[str] = []
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        with zf.open("word/document.xml") as xml:
+            for _, elem in ElementTree.iterparse(xml, events=("end",)):
+                if elem.tag == _W_NS + "t" and elem.text:
+                    parts.append(elem.text)
+                elif elem.tag == _W_NS + "p":
+                    parts.append("\n")
+                    elem.clear()
+    return "".join(parts)
+
+
+def _pdf_text(data: bytes) -> str:
+    from pypdf import PdfReader  # необязательная зависимость
+
+    reader = PdfReader(io.BytesIO(data))
+    parts: List[str] = []
+    total = 0
+    for page in reader.pages:
+        chunk = page.extract_text() or ""
+        parts.append(chunk)
+        total += len(chunk)
+        if total >= FTS_MAX_CHARS:
+            break
+    return "\n".join(parts)
+
+
+def extract_text(kind: str, data: bytes) -> str:
+    """Текст документа для индексации (обрезается до FTS_MAX_CHARS)"""
+    if kind == "text":
+        result = data.decode("utf-8-sig", errors="replace")
+    elif kind == "json":
+        try:
+            strings: List[str] = []
+            _json_strings(json.loads(data.decode("utf-8-sig")), strings)
+            result = " ".join(strings)
+        except ValueError:
+            result = data.decode("utf-8-sig", errors="replace")
+    elif kind == "docx":
+        result = _docx_text(data)
+    elif kind == "pdf":
+        result = _pdf_text(data)
+    else:
+        raise ValueError(f"Неизвестный тип документа: {kind}")
+    return result[:FTS_MAX_CHARS].replace("\x00", " ")
+
+
+def index_file_text(db: Session, pf: ProjectFile, read_source) -> Dict[str, Any]:
+    """
+    Обновляет запись file_texts для файла. Индексирует только новое или
+    изменившееся содержимое: если хэш не изменился — ничего не делает,
+    если такое содержимое уже проиндексировано у другого файла — копирует tsvector.
+    read_source(limit) должен вернуть не более limit байт исходного содержимого.
+    """
+    metadata = pf.file_metadata or {}
+    sha256 = metadata.get("sha256")
+    kind = text_kind(metadata.get("detected_type"))
+    existing = db.query(FileText).filter(FileText.file_id == pf.id).first()
+
+    if not sha256 or not kind:
+        if existing:
+            db.delete(existing)
+        return {"skipped": "unsupported"}
+    if existing and existing.sha256 == sha256:
+        if existing.project_id != pf.project_id:
+            existing.project_id = pf.project_id
+        return {"skipped": "unchanged"}
+
+    twin = db.query(FileText).filter(FileText.sha256 == sha256, FileText.file_id != pf.id).first()
+    if twin is not None:
+        tsv, excerpt = twin.content_tsv, twin.excerpt
+        tsv_expr = None
+    else:
+        data = read_source(FTS_MAX_SOURCE_BYTES + 1)
+        if len(data) > FTS_MAX_SOURCE_BYTES and kind in ("docx", "pdf"):
+            return {"skipped": "too large"}
+        content = extract_text(kind, data[:FTS_MAX_SOURCE_BYTES])
+        excerpt = " ".join(content[:FTS_EXCERPT_CHARS * 2].split())[:FTS_EXCERPT_CHARS]
+        tsv_expr = func.to_tsvector(text(f"'{FTS_CONFIG}'::regconfig"), content)
+        tsv = None
+
+    if existing is None:
+        existing = FileText(file_id=pf.id)
+        db.add(existing)
+    existing.project_id = pf.project_id
+    existing.sha256 = sha256
+    existing.content_tsv = tsv_expr if tsv_expr is not None else tsv
+    existing.excerpt = excerpt
+    existing.extracted_at = func.now()
+    return {"indexed": pf.id, "reused": twin is not None}
+
+
+def stale_text_file_ids(db: Session, after_id: int = 0, limit: int = 1000) -> List[Tuple[int, str]]:
+    """Файлы (id, sha256), у которых нет записи в file_texts или она устарела"""
+    file_sha = ProjectFile.file_metadata['sha256'].astext
+    rows = db.query(ProjectFile.id, file_sha).outerjoin(FileText, FileText.file_id == ProjectFile.id).filter(
+        ProjectFile.id > after_id,
+        file_sha.isnot(None),
+        or_(FileText.file_id.is_(None), FileText.sha256 != file_sha)
+    ).order_by(ProjectFile.id).limit(limit).all()
+    return [(file_id, sha256) for file_id, sha256 in rows]
+
+
+def search_files(
+        db: Session,
+        query_text: str,
+        visibility_filter=None,
+        project_id: Optional[int] = None,
+        skip: int = 0,
+        limit: int = 50
+) -> Dict[str, Any]:
+    """
+    Поиск по содержимому файлов. Возвращает страницу найденных файлов
+    (по убыванию релевантности) и проекты со всеми совпадениями — сводка
+    по проектам считается отдельным запросом по всей выборке, а не по странице.
+    visibility_filter — условие на ProjectFile/Project с правилами доступа пользователя.
+    """
+    tsquery = func.websearch_to_tsquery(text(f"'{FTS_CONFIG}'::regconfig"), query_text)
+    rank = func.ts_rank_cd(FileText.content_tsv, tsquery)
+
+    def matching(query):
+        query = query.join(FileText, FileText.file_id == ProjectFile.id) \
+            .join(Project, Project.id == ProjectFile.project_id) \
+            .filter(FileText.content_tsv.op("@@")(tsquery), Project.deleted_at.is_(None))
+        if project_id is not None:
+            query = query.filter(ProjectFile.project_id == project_id)
+        if visibility_filter is not None:
+            query = query.filter(visibility_filter)
+        return query
+
+    file_rank = rank.label("rank")
+    rows = matching(db.query(ProjectFile, Project.title, FileText.excerpt, file_rank)) \
+        .order_by(file_rank.desc(), ProjectFile.id).offset(skip).limit(limit).all()
+    files = [
+        {"file": pf, "project_title": project_title, "excerpt": excerpt, "rank": float(r)}
+        for pf, project_title, excerpt, r in rows
+    ]
+
+    best_rank = func.max(rank).label("best_rank")
+    project_rows = matching(db.query(
+        ProjectFile.project_id, Project.title, func.count(ProjectFile.id), best_rank
+    )).group_by(ProjectFile.project_id, Project.title) \
+        .order_by(best_rank.desc(), ProjectFile.project_id).limit(FTS_MAX_PROJECTS).all()
+    projects = [
+        {"project_id": pid, "title": title, "matched_files": matched, "best_rank": float(best)}
+        for pid, title, matched, best in project_rows
+    ]
+
+    return {"files": files, "projects": projects}
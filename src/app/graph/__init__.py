@@ -0,0 +1,6 @@
+from .graph import (
+    get_graph_index, record_edge_added, record_edge_removed,
+    neighbourhood, shortest_path, connected_component, DIRECTIONS, GRAPH_MAX_NODES
+)
+from .citations import verify_citation_counts
+from .pagerank import compute_pagerank
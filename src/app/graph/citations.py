@@ -0,0 +1,53 @@
+import os
+from typing import Any, Dict, List
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+CITATION_VERIFY_BATCH = int(os.getenv("CITATION_VERIFY_BATCH", "10000"))
+CITATION_VERIFY_SAMPLE = 50
+
+_DRIFT_SQL = """
+    SELECT p.id, coalesce(p.citation_count, 0) AS stored, coalesce(c.cnt, 0) AS actual
+    FROM projects p
+    LEFT JOIN (
+        SELECT related_project_id, count(*) AS cnt FROM project_connections
+        WHERE related_project_id BETWEEN :lo AND :hi
+        GROUP BY related_project_id
+    ) c ON c.related_project_id = p.id
+    WHERE p.id BETWEEN :lo AND :hi
+      AND coalesce(p.citation_count, 0) <> coalesce(c.cnt, 0)
+"""
+
+
+def verify_citation_counts(db: Session, repair: bool = True) -> Dict[str, Any]:
+    """
+    Сверяет projects.citation_count с числом входящих связей диапазонами id
+    по CITATION_VERIFY_BATCH (каждый — короткая транзакция, по индексу
+    related_project_id) и при repair исправляет расхождения.
+
+    Исправление — сдвиг на найденную разницу, а не запись посчитанного числа:
+    UPDATE видит последнюю версию строки, и прибавки триггера от связей,
+    закоммиченных после снимка подсчёта, не теряются.
+    """
+    max_id = db.execute(text("SELECT coalesce(max(id), 0) FROM projects")).scalar()
+    drifted = 0
+    sample: List[Dict[str, int]] = []
+    lo = 1
+    while lo <= max_id:
+        params = {"lo": lo, "hi": lo + CITATION_VERIFY_BATCH - 1}
+        if repair:
+            rows = db.execute(text(f"""
+                WITH drift AS ({_DRIFT_SQL})
+                UPDATE projects p SET citation_count = coalesce(p.citation_count, 0) + (drift.actual - drift.stored)
+                FROM drift WHERE p.id = drift.id
+                RETURNING drift.id, drift.stored, drift.actual
+            """), params).mappings().all()
+        else:
+            rows = db.execute(text(_DRIFT_SQL), params).mappings().all()
+        db.commit()
+        drifted += len(rows)
+        for row in rows[:CITATION_VERIFY_SAMPLE - len(sample)]:
+            sample.append(dict(row))
+        lo += CITATION_VERIFY_BATCH
+    return {"checked_up_to_id": max_id, "drifted": drifted, "repaired": repair, "sample": sample}
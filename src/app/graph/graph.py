@@ -0,0 +1,254 @@
+import os
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import deque
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+# Индекс пересобирается не реже, чем раз в GRAPH_INDEX_TTL секунд (изменения из
+# других процессов), и когда накопилось много изменений поверх CSR
+GRAPH_INDEX_TTL = float(os.getenv("GRAPH_INDEX_TTL", "300"))
+GRAPH_DELTA_LIMIT = int(os.getenv("GRAPH_DELTA_LIMIT", "10000"))
+GRAPH_MAX_NODES = int(os.getenv("GRAPH_MAX_NODES", "5000"))
+GRAPH_FETCH_BATCH = 50000
+
+DIRECTIONS = ("out", "in", "both")
+
+# Отбор вершин, через которые можно идти: получает новые id уровня обхода,
+# возвращает допустимые (живые и видимые пользователю). Один вызов на уровень
+NodeFilter = Callable[[List[int]], Set[int]]
+
+
+class _CSR:
+    """
+    Неизменяемый снимок графа в форме CSR: отсортированные id вершин,
+    смещения и плоские массивы соседей для исходящих и входящих рёбер.
+    Соседи хранятся как номера вершин в ids, а не как id проектов.
+    """
+
+    def __init__(self, edges: Iterable[Tuple[int, int]]):
+        src = array("i")
+        dst = array("i")
+        for a, b in edges:
+            src.append(a)
+            dst.append(b)
+        self.ids = array("i", sorted(set(src) | set(dst)))
+        n = len(self.ids)
+        src_idx = array("i", (self._index(a) for a in src))
+        dst_idx = array("i", (self._index(b) for b in dst))
+        self.out_offsets, self.out_targets = self._pack(n, src_idx, dst_idx)
+        self.in_offsets, self.in_targets = self._pack(n, dst_idx, src_idx)
+        self.edges = len(src)
+
+    def _index(self, project_id: int) -> int:
+        return bisect_left(self.ids, project_id)
+
+    def index(self, project_id: int) -> Optional[int]:
+        i = bisect_left(self.ids, project_id)
+        if i < len(self.ids) and self.ids[i] == project_id:
+            return i
+        return None
+
+    @staticmethod
+    def _pack(n: int, keys: array, values: array) -> Tuple[array, array]:
+        # Подсчёт степеней, префиксные суммы и раскладка — O(V + E)
+        offsets = array("i", [0]) * (n + 1)
+        for k in keys:
+            offsets[k + 1] += 1
+        for i in range(n):
+            offsets[i + 1] += offsets[i]
+        cursor = array("i", offsets)
+        packed = array("i", [0]) * len(values)
+        for k, v in zip(keys, values):
+            packed[cursor[k]] = v
+            cursor[k] += 1
+        return offsets, packed
+
+    def neighbours(self, project_id: int, outgoing: bool) -> List[int]:
+        i = self.index(project_id)
+        if i is None:
+            return []
+        offsets, targets = (self.out_offsets, self.out_targets) if outgoing else (self.in_offsets, self.in_targets)
+        return [self.ids[j] for j in targets[offsets[i]:offsets[i + 1]]]
+
+
+class GraphIndex:
+    """
+    Индекс графа связей проектов в памяти процесса. Записи связей через
+    crud сразу попадают в дельту поверх CSR (add_edge/remove_edge), а сам
+    CSR периодически пересобирается из project_connections.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._csr: Optional[_CSR] = None
+        self._built_at = 0.0
+        self._added_out: Dict[int, Set[int]] = {}
+        self._added_in: Dict[int, Set[int]] = {}
+        self._removed: Set[Tuple[int, int]] = set()
+        self._delta = 0
+
+    def _stale(self) -> bool:
+        return (self._csr is None or time.monotonic() - self._built_at > GRAPH_INDEX_TTL
+                or self._delta > GRAPH_DELTA_LIMIT)
+
+    def ensure_fresh(self, db: Session) -> None:
+        with self._lock:
+            if not self._stale():
+                return
+            # Изменения, пришедшие во время пересборки, уже будут в выборке
+            self._added_out, self._added_in, self._removed, self._delta = {}, {}, set(), 0
+            self._csr = _CSR(self._load_edges(db))
+            self._built_at = time.monotonic()
+
+    @staticmethod
+    def _load_edges(db: Session):
+        last = (0, 0)
+        while True:
+            rows = db.execute(text("""
+                SELECT project_id, related_project_id FROM project_connections
+                WHERE (project_id, related_project_id) > (:a, :b)
+                ORDER BY project_id, related_project_id
+                LIMIT :batch
+            """), {"a": last[0], "b": last[1], "batch": GRAPH_FETCH_BATCH}).all()
+            for row in rows:
+                yield row[0], row[1]
+            if len(rows) < GRAPH_FETCH_BATCH:
+                return
+            last = (rows[-1][0], rows[-1][1])
+
+    def add_edge(self, project_id: int, related_project_id: int) -> None:
+        with self._lock:
+            self._removed.discard((project_id, related_project_id))
+            self._added_out.setdefault(project_id, set()).add(related_project_id)
+            self._added_in.setdefault(related_project_id, set()).add(project_id)
+            self._delta += 1
+
+    def remove_edge(self, project_id: int, related_project_id: int) -> None:
+        with self._lock:
+            self._added_out.get(project_id, set()).discard(related_project_id)
+            self._added_in.get(related_project_id, set()).discard(project_id)
+            self._removed.add((project_id, related_project_id))
+            self._delta += 1
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._csr = None
+
+    def neighbours(self, project_id: int, direction: str) -> List[int]:
+        # Дельта меняется из других потоков (add_edge/remove_edge) — читаем под блокировкой
+        with self._lock:
+            csr = self._csr
+            result: List[int] = []
+            if direction in ("out", "both"):
+                for n in csr.neighbours(project_id, True):
+                    if (project_id, n) not in self._removed:
+                        result.append(n)
+                result.extend(self._added_out.get(project_id, ()))
+            if direction in ("in", "both"):
+                for n in csr.neighbours(project_id, False):
+                    if (n, project_id) not in self._removed:
+                        result.append(n)
+                result.extend(self._added_in.get(project_id, ()))
+            return result
+
+    def stats(self) -> Dict[str, float]:
+        csr = self._csr
+        return {
+            "nodes": len(csr.ids) if csr else 0,
+            "edges": csr.edges if csr else 0,
+            "pending_changes": self._delta,
+            "age_seconds": round(time.monotonic() - self._built_at, 1) if csr else None,
+        }
+
+
+_index = GraphIndex()
+
+
+def get_graph_index(db: Session) -> GraphIndex:
+    _index.ensure_fresh(db)
+    return _index
+
+
+def record_edge_added(project_id: int, related_project_id: int) -> None:
+    _index.add_edge(project_id, related_project_id)
+
+
+def record_edge_removed(project_id: int, related_project_id: int) -> None:
+    _index.remove_edge(project_id, related_project_id)
+
+
+def _expand(index: GraphIndex, frontier: List[int], direction: str, seen, rejected: Set[int],
+            allowed: Optional[NodeFilter]) -> Dict[int, int]:
+    # Следующий уровень обхода: {новая вершина: из какой пришли}. Недопустимые
+    # вершины запоминаются в rejected и через них обход не идёт
+    found: Dict[int, int] = {}
+    for node in frontier:
+        for n in index.neighbours(node, direction):
+            if n not in seen and n not in rejected and n not in found:
+                found[n] = node
+    if allowed is not None and found:
+        permitted = allowed(list(found))
+        for n in [n for n in found if n not in permitted]:
+            rejected.add(n)
+            del found[n]
+    return found
+
+
+def neighbourhood(index: GraphIndex, start: int, depth: int, direction: str,
+                  max_nodes: int = GRAPH_MAX_NODES, allowed: Optional[NodeFilter] = None) -> Tuple[Dict[int, int], bool]:
+    """
+    Вершины в пределах depth шагов от start: {id: расстояние}, и флаг обрезки по max_nodes.
+    allowed — отбор вершин, через которые можно идти (удалённые и скрытые пропускаются).
+    """
+    distances = {start: 0}
+    rejected: Set[int] = set()
+    frontier = [start]
+    level = 0
+    while frontier and level < depth:
+        level += 1
+        found = _expand(index, frontier, direction, distances, rejected, allowed)
+        frontier = []
+        for n in found:
+            if len(distances) >= max_nodes:
+                return distances, True
+            distances[n] = level
+            frontier.append(n)
+    return distances, False
+
+
+def shortest_path(index: GraphIndex, source: int, target: int, direction: str,
+                  max_nodes: int = GRAPH_MAX_NODES * 20, allowed: Optional[NodeFilter] = None) -> Optional[List[int]]:
+    """
+    Кратчайший путь (по числу рёбер) поиском в ширину только через вершины,
+    пропущенные allowed; None — пути нет или он за пределом обхода
+    """
+    if source == target:
+        return [source]
+    parents: Dict[int, int] = {source: source}
+    rejected: Set[int] = set()
+    frontier = [source]
+    while frontier:
+        found = _expand(index, frontier, direction, parents, rejected, allowed)
+        parents.update(found)
+        if target in found:
+            path = [target]
+            while path[-1] != source:
+                path.append(parents[path[-1]])
+            return path[::-1]
+        if len(parents) >= max_nodes:
+            return None
+        frontier = list(found)
+    return None
+
+
+def connected_component(index: GraphIndex, start: int, max_nodes: int = GRAPH_MAX_NODES,
+                        allowed: Optional[NodeFilter] = None) -> Tuple[Set[int], bool]:
+    """Компонента слабой связности вершины (направление рёбер не учитывается) по допустимым вершинам"""
+    distances, truncated = neighbourhood(index, start, depth=1 << 30, direction="both",
+                                         max_nodes=max_nodes, allowed=allowed)
+    return set(distances), truncated
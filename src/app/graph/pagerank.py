@@ -0,0 +1,143 @@
+import os
+import time
+from typing import Any, Dict, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:  # PageRank необязателен: без пакетов задача пропускается
+    np = None
+    sparse = None
+
+PAGERANK_DAMPING = float(os.getenv("PAGERANK_DAMPING", "0.85"))
+PAGERANK_TOL = float(os.getenv("PAGERANK_TOL", "1e-9"))
+PAGERANK_MAX_ITER = int(os.getenv("PAGERANK_MAX_ITER", "100"))
+PAGERANK_FETCH_BATCH = int(os.getenv("PAGERANK_FETCH_BATCH", "200000"))
+PAGERANK_WRITE_BATCH = int(os.getenv("PAGERANK_WRITE_BATCH", "10000"))
+
+_WRITE_SQL = text("""
+    UPDATE projects p SET pagerank = v.score
+    FROM unnest(CAST(:ids AS integer[]), CAST(:scores AS double precision[])) AS v(id, score)
+    WHERE p.id = v.id AND p.pagerank IS DISTINCT FROM v.score
+""")
+
+
+def _fetch_int_columns(db: Session, name: str, sql: str, width: int) -> "np.ndarray":
+    # Серверный курсор: строки приходят порциями, каждая порция сразу
+    # превращается в массив int32 — списки кортежей не копятся в памяти
+    cursor = db.connection().connection.cursor(name=name)
+    chunks = []
+    try:
+        cursor.itersize = PAGERANK_FETCH_BATCH
+        cursor.execute(sql)
+        while True:
+            rows = cursor.fetchmany(PAGERANK_FETCH_BATCH)
+            if not rows:
+                break
+            chunks.append(np.array(rows, dtype=np.int32).reshape(-1, width))
+    finally:
+        cursor.close()
+    if not chunks:
+        return np.empty((0, width), dtype=np.int32)
+    return np.concatenate(chunks)
+
+
+def _load_graph(db: Session) -> Tuple["np.ndarray", "np.ndarray", "np.ndarray"]:
+    """Упорядоченные id живых проектов и рёбра (источник, цель) в виде индексов в этом массиве"""
+    ids = _fetch_int_columns(
+        db, "pagerank_projects",
+        "SELECT id FROM projects WHERE deleted_at IS NULL ORDER BY id", 1
+    )[:, 0]
+    edges = _fetch_int_columns(
+        db, "pagerank_edges",
+        "SELECT project_id, related_project_id FROM project_connections", 2
+    )
+    if not len(ids):
+        empty = np.empty(0, dtype=np.intp)
+        return ids, empty, empty
+    last = len(ids) - 1
+    src = np.minimum(np.searchsorted(ids, edges[:, 0]), last)
+    dst = np.minimum(np.searchsorted(ids, edges[:, 1]), last)
+    # Связи с удалёнными проектами и петли в расчёт не идут
+    keep = (ids[src] == edges[:, 0]) & (ids[dst] == edges[:, 1]) & (src != dst)
+    return ids, src[keep], dst[keep]
+
+
+def _power_iteration(n: int, src: "np.ndarray", dst: "np.ndarray") -> Tuple["np.ndarray", Dict[str, Any]]:
+    # Вес ребра project_id -> related_project_id — 1 / число исходящих связей источника;
+    # матрица хранится транспонированной (строка — цель), чтобы шаг был одним M @ r
+    out_degree = np.bincount(src, minlength=n).astype(np.float64)
+    weights = 1.0 / out_degree[src]
+    matrix = sparse.csr_matrix((weights, (dst, src)), shape=(n, n))
+    dangling = out_degree == 0
+
+    damping = PAGERANK_DAMPING
+    rank = np.full(n, 1.0 / n)
+    residual = float("inf")
+    iterations = 0
+    while iterations < PAGERANK_MAX_ITER:
+        iterations += 1
+        # Вес проектов без исходящих связей распределяется равномерно по всем
+        base = (damping * rank[dangling].sum() + (1.0 - damping)) / n
+        new_rank = damping * (matrix @ rank) + base
+        residual = float(np.abs(new_rank - rank).sum())
+        rank = new_rank
+        if residual < PAGERANK_TOL:
+            break
+    metrics = {
+        "iterations": iterations,
+        "residual": residual,
+        "converged": residual < PAGERANK_TOL,
+        "dangling": int(dangling.sum()),
+    }
+    return rank, metrics
+
+
+def _write_scores(db: Session, ids: "np.ndarray", rank: "np.ndarray") -> int:
+    updated = 0
+    for start in range(0, len(ids), PAGERANK_WRITE_BATCH):
+        result = db.execute(_WRITE_SQL, {
+            "ids": ids[start:start + PAGERANK_WRITE_BATCH].tolist(),
+            "scores": rank[start:start + PAGERANK_WRITE_BATCH].tolist(),
+        })
+        db.commit()
+        updated += result.rowcount
+    return updated
+
+
+def compute_pagerank(db: Session) -> Dict[str, Any]:
+    """
+    Пересчитывает projects.pagerank по графу project_connections: рёбра
+    загружаются в разреженную матрицу, ранги считаются степенным методом
+    (демпфирование PAGERANK_DAMPING, до сходимости по L1 к PAGERANK_TOL
+    или PAGERANK_MAX_ITER шагов). Сумма рангов живых проектов равна 1.
+    Записываются только изменившиеся значения, порциями по PAGERANK_WRITE_BATCH.
+    """
+    if np is None or sparse is None:
+        return {"skipped": "для расчёта PageRank нужны пакеты numpy и scipy"}
+
+    started = time.monotonic()
+    ids, src, dst = _load_graph(db)
+    # Снимок графа прочитан — не держим транзакцию на время расчёта
+    db.commit()
+    loaded = time.monotonic()
+    if not len(ids):
+        return {"nodes": 0, "edges": 0, "updated": 0}
+
+    rank, metrics = _power_iteration(len(ids), src, dst)
+    computed = time.monotonic()
+    updated = _write_scores(db, ids, rank)
+    finished = time.monotonic()
+
+    return {
+        "nodes": int(len(ids)),
+        "edges": int(len(src)),
+        **metrics,
+        "updated": updated,
+        "load_seconds": round(loaded - started, 3),
+        "compute_seconds": round(computed - loaded, 3),
+        "write_seconds": round(finished - computed, 3),
+    }
@@ -0,0 +1 @@
+from .idempotency import IdempotencyMiddleware, cleanup_expired_keys
@@ -0,0 +1,328 @@
+import asyncio
+import datetime
+import hashlib
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+from jose import JWTError, jwt
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse, Response
+
+from app.database import SessionLocal
+from app.models import IdempotencyKey
+
+# Пути (POST), для которых учитывается заголовок Idempotency-Key
+IDEMPOTENCY_PATHS = set(filter(None, os.getenv(
+    "IDEMPOTENCY_PATHS",
+    "/api/project_files/upload,/api/project_files/upload_batch,/api/projects/,/auth/auth/register"
+).split(",")))
+IDEMPOTENCY_TTL = int(os.getenv("IDEMPOTENCY_TTL", str(24 * 3600)))
+# Сколько ждать завершения такого же запроса, который ещё выполняется
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "60"))
+# Запрос "в работе" дольше этого времени считаем оборвавшимся (упал процесс)
+IDEMPOTENCY_LOCK_TIMEOUT = int(os.getenv("IDEMPOTENCY_LOCK_TIMEOUT", "900"))
+IDEMPOTENCY_MAX_BODY = int(os.getenv("IDEMPOTENCY_MAX_BODY", str(1024 * 1024)))
+IDEMPOTENCY_CLEANUP_BATCH = 5000
+
+# Ответы, которые не сохраняем: повтор должен выполнить запрос заново
+_NOT_STORED_STATUSES = {401, 403, 408, 409, 425, 429}
+_REPLAY_HEADERS = ("content-type", "location", "etag")
+
+
+def _scope(headers: Dict[str, str], client: Optional[Tuple[str, int]]) -> Optional[str]:
+    """
+    Владелец ключа: пользователь из токена, иначе адрес клиента. Общей анонимной
+    области нет — иначе чужие запросы с тем же ключом получали бы наш ответ.
+    None — владельца определить нельзя, ключ не учитывается.
+    """
+    from app.auth.auth import SECRET_KEY, ALGORITHM
+
+    auth = headers.get("authorization", "")
+    if auth.lower().startswith("bearer "):
+        try:
+            subject = jwt.decode(auth[7:], SECRET_KEY, algorithms=[ALGORITHM]).get("sub")
+            if subject:
+                return f"user:{subject}"
+        except JWTError:
+            pass
+    if client:
+        return f"anon:{client[0]}"
+    return None
+
+
+def _claim(scope: str, key: str, fingerprint: str) -> Tuple[str, Optional[IdempotencyKey]]:
+    """
+    Пытается занять ключ. Возвращает ("claimed", None), если запрос выполняем мы,
+    или ("exists", запись), если ключ уже занят.
+    """
+    now = datetime.datetime.utcnow()
+    db = SessionLocal()
+    try:
+        inserted = db.execute(
+            insert(IdempotencyKey).values(
+                scope=scope, key=key, fingerprint=fingerprint, status="in_progress",
+                created_at=now, expires_at=now + datetime.timedelta(seconds=IDEMPOTENCY_TTL)
+            ).on_conflict_do_nothing(index_elements=["scope", "key"]).returning(IdempotencyKey.key)
+        ).scalar()
+        if inserted is None:
+            # Просроченную запись или оборвавшийся запрос перехватываем
+            inserted = db.execute(text("""
+                UPDATE idempotency_keys
+                SET fingerprint = :fp, status = 'in_progress', response_status = NULL,
+                    response_headers = NULL, response_body = NULL,
+                    created_at = :now, expires_at = :expires
+                WHERE scope = :scope AND key = :key
+                  AND (expires_at < :now OR (status = 'in_progress' AND created_at < :stale))
+                RETURNING key
+            """), {
+                "fp": fingerprint, "now": now, "scope": scope, "key": key,
+                "expires": now + datetime.timedelta(seconds=IDEMPOTENCY_TTL),
+                "stale": now - datetime.timedelta(seconds=IDEMPOTENCY_LOCK_TIMEOUT),
+            }).scalar()
+        db.commit()
+        if inserted is not None:
+            return "claimed", None
+        record = db.query(IdempotencyKey).filter(
+            IdempotencyKey.scope == scope, IdempotencyKey.key == key
+        ).first()
+        if record is not None:
+            db.expunge(record)
+        return "exists", record
+    finally:
+        db.close()
+
+
+def _load(scope: str, key: str) -> Optional[IdempotencyKey]:
+    db = SessionLocal()
+    try:
+        record = db.query(IdempotencyKey).filter(
+            IdempotencyKey.scope == scope, IdempotencyKey.key == key
+        ).first()
+        if record is not None:
+            db.expunge(record)
+        return record
+    finally:
+        db.close()
+
+
+def _complete(scope: str, key: str, status_code: int, headers: Dict[str, str], body: bytes) -> None:
+    db = SessionLocal()
+    try:
+        db.query(IdempotencyKey).filter(
+            IdempotencyKey.scope == scope, IdempotencyKey.key == key
+        ).update({
+            "status": "done",
+            "response_status": status_code,
+            "response_headers": headers,
+            "response_body": body,
+        }, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+def _release(scope: str, key: str) -> None:
+    # Ответ не сохраняется — освобождаем ключ, чтобы повтор выполнил запрос
+    db = SessionLocal()
+    try:
+        db.query(IdempotencyKey).filter(
+            IdempotencyKey.scope == scope, IdempotencyKey.key == key,
+            IdempotencyKey.status == "in_progress"
+        ).delete(synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+def cleanup_expired_keys(db) -> int:
+    """Удаляет просроченные ключи порциями, возвращает число удалённых"""
+    total = 0
+    while True:
+        deleted = db.execute(text("""
+            DELETE FROM idempotency_keys WHERE ctid IN (
+                SELECT ctid FROM idempotency_keys WHERE expires_at < now() AT TIME ZONE 'utc' LIMIT :batch
+            )
+        """), {"batch": IDEMPOTENCY_CLEANUP_BATCH}).rowcount
+        db.commit()
+        total += deleted
+        if deleted < IDEMPOTENCY_CLEANUP_BATCH:
+            return total
+
+
+def _replay(record: IdempotencyKey) -> Response:
+    headers = dict(record.response_headers or {})
+    headers["Idempotent-Replayed"] = "true"
+    return Response(content=record.response_body or b"", status_code=record.response_status, headers=headers)
+
+
+def _multipart_boundary(content_type: str) -> Optional[bytes]:
+    if not content_type.lower().startswith("multipart/"):
+        return None
+    for param in content_type.split(";")[1:]:
+        name, _, value = param.strip().partition("=")
+        if name.lower() == "boundary" and value:
+            return value.strip('"').encode("latin-1")
+    return None
+
+
+class _BoundaryNormalizer:
+    """Потоковая замена разделителя частей multipart на постоянную строку"""
+
+    def __init__(self, boundary: Optional[bytes]):
+        self.delimiter = b"--" + boundary if boundary is not None else None
+        self._tail = b""
+
+    def feed(self, chunk: bytes, final: bool) -> bytes:
+        if self.delimiter is None:
+            return chunk
+        buf = self._tail + chunk
+        out = []
+        pos = 0
+        while True:
+            found = buf.find(self.delimiter, pos)
+            if found < 0:
+                break
+            out.append(buf[pos:found])
+            out.append(b"--boundary")
+            pos = found + len(self.delimiter)
+        # Хвост, с которого может начинаться разделитель, ждёт следующего куска
+        keep = 0 if final else min(len(self.delimiter) - 1, len(buf) - pos)
+        out.append(buf[pos:len(buf) - keep])
+        self._tail = buf[len(buf) - keep:]
+        return b"".join(out)
+
+
+class IdempotencyMiddleware:
+    """
+    Повтор запроса с тем же Idempotency-Key (тот же пользователь или адрес, путь и тело)
+    получает сохранённый ответ без повторного выполнения. Если первый запрос
+    ещё выполняется, повтор ждёт его завершения, а не выполняется параллельно.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in IDEMPOTENCY_PATHS:
+            await self.app(scope, receive, send)
+            return
+        headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope["headers"]}
+        key = headers.get("idempotency-key", "").strip()
+        if not key:
+            await self.app(scope, receive, send)
+            return
+        if len(key) > 255:
+            await JSONResponse({"detail": "Idempotency-Key длиннее 255 символов"}, status_code=400)(scope, receive, send)
+            return
+
+        owner = _scope(headers, scope.get("client"))
+        if owner is None:
+            await self.app(scope, receive, send)
+            return
+        receive, fingerprint = await self._fingerprint(scope, headers, receive)
+
+        status, record = await run_in_threadpool(_claim, owner, key, fingerprint)
+        waited = 0.0
+        delay = 0.1
+        while status == "exists":
+            if record is None:
+                # Запись удалили между попытками (первый запрос не сохранил ответ)
+                status, record = await run_in_threadpool(_claim, owner, key, fingerprint)
+                continue
+            if record.fingerprint != fingerprint:
+                await JSONResponse(
+                    {"detail": "Idempotency-Key уже использован для другого запроса"}, status_code=422
+                )(scope, receive, send)
+                return
+            if record.status == "done":
+                await _replay(record)(scope, receive, send)
+                return
+            if waited >= IDEMPOTENCY_WAIT_SECONDS:
+                await JSONResponse(
+                    {"detail": "Запрос с этим Idempotency-Key ещё выполняется"},
+                    status_code=409, headers={"Retry-After": "5"}
+                )(scope, receive, send)
+                return
+            await asyncio.sleep(delay)
+            waited += delay
+            delay = min(delay * 2, 1.0)
+            record = await run_in_threadpool(_load, owner, key)
+            if record is not None and record.status == "in_progress" and \
+                    record.created_at < datetime.datetime.utcnow() - datetime.timedelta(seconds=IDEMPOTENCY_LOCK_TIMEOUT):
+                status, record = await run_in_threadpool(_claim, owner, key, fingerprint)
+
+        await self._run_and_store(scope, receive, send, owner, key)
+
+    async def _fingerprint(self, scope, headers, receive):
+        """
+        Отпечаток запроса: метод, путь, query и хэш первых IDEMPOTENCY_MAX_BODY
+        байт тела. У multipart-загрузок клиент при повторе меняет boundary —
+        он заменяется в теле на постоянную строку, а в отпечаток добавляется
+        Content-Length: так различаются загрузки с другими полями, именами
+        файлов или содержимым.
+        """
+        digest = hashlib.sha256()
+        digest.update(f"{scope['method']} {scope['path']}?{scope.get('query_string', b'').decode('latin-1')}".encode())
+        boundary = _multipart_boundary(headers.get("content-type", ""))
+        if boundary is not None:
+            digest.update(f"\ncontent-length: {headers.get('content-length', '')}\n".encode())
+
+        # Хэшируется ровно IDEMPOTENCY_MAX_BODY байт (после замены boundary),
+        # чтобы отпечаток не зависел от того, какими кусками пришло тело
+        normalizer = _BoundaryNormalizer(boundary)
+        messages: List[Dict[str, Any]] = []
+        hashed = 0
+        while hashed < IDEMPOTENCY_MAX_BODY:
+            message = await receive()
+            messages.append(message)
+            if message["type"] != "http.request":
+                break
+            final = not message.get("more_body")
+            data = normalizer.feed(message.get("body", b""), final)[:IDEMPOTENCY_MAX_BODY - hashed]
+            digest.update(data)
+            hashed += len(data)
+            if final:
+                break
+
+        async def replay_receive():
+            if messages:
+                return messages.pop(0)
+            return await receive()
+
+        return replay_receive, digest.hexdigest()
+
+    async def _run_and_store(self, scope, receive, send, owner: str, key: str):
+        captured: Dict[str, Any] = {"status": None, "headers": {}, "body": [], "size": 0, "too_big": False}
+
+        async def capture_send(message):
+            if message["type"] == "http.response.start":
+                captured["status"] = message["status"]
+                for name, value in message.get("headers", []):
+                    name = name.decode("latin-1").lower()
+                    if name in _REPLAY_HEADERS:
+                        captured["headers"][name] = value.decode("latin-1")
+            elif message["type"] == "http.response.body" and not captured["too_big"]:
+                body = message.get("body", b"")
+                captured["size"] += len(body)
+                if captured["size"] > IDEMPOTENCY_MAX_BODY:
+                    captured["too_big"] = True
+                    captured["body"] = []
+                else:
+                    captured["body"].append(body)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, capture_send)
+        except BaseException:
+            await run_in_threadpool(_release, owner, key)
+            raise
+
+        status_code = captured["status"]
+        if status_code is None or status_code >= 500 or status_code in _NOT_STORED_STATUSES or captured["too_big"]:
+            await run_in_threadpool(_release, owner, key)
+        else:
+            await run_in_threadpool(
+                _complete, owner, key, status_code, captured["headers"], b"".join(captured["body"])
+            )
@@ -0,0 +1 @@
+from .jobs import enqueue_job, job_handler, periodic_job, run_worker, retry_job, get_job, get_queue_stats, JobNotRetryable, job_in_progress
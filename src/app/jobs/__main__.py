@@ -0,0 +1,6 @@
+# Запуск воркера очереди: python -m app.jobs
+from app.jobs import run_worker
+import app.jobs.tasks  # noqa: F401 — регистрирует обработчики задач
+
+if __name__ == "__main__":
+    run_worker()
@@ -0,0 +1,314 @@
+import datetime
+import os
+import random
+import signal
+import threading
+import time
+import traceback
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import func, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal
+from app.models import Job
+
+# Настройки очереди
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1.0"))
+JOB_LOCK_TIMEOUT = int(os.getenv("JOB_LOCK_TIMEOUT", "600"))  # секунд до повторной выдачи "зависшей" задачи
+# Как часто выполняющаяся задача продлевает аренду (locked_at), чтобы её не выдали повторно
+JOB_HEARTBEAT_INTERVAL = float(os.getenv("JOB_HEARTBEAT_INTERVAL", str(max(JOB_LOCK_TIMEOUT / 4, 1))))
+JOB_BACKOFF_BASE = float(os.getenv("JOB_BACKOFF_BASE", "5"))
+JOB_BACKOFF_MAX = float(os.getenv("JOB_BACKOFF_MAX", "3600"))
+JOB_DEFAULT_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "8"))
+
+# Реестр обработчиков: kind -> handler(db, payload) -> Optional[dict]
+_HANDLERS: Dict[str, Callable[[Session, Dict[str, Any]], Optional[Dict[str, Any]]]] = {}
+
+
+# Периодические задачи: kind -> интервал между запусками в секундах
+_PERIODIC: Dict[str, float] = {}
+
+
+class JobNotRetryable(Exception):
+    """Задачу нельзя вернуть в очередь: она не упала или её дубль уже ждёт выполнения"""
+
+
+def job_handler(kind: str):
+    """Декоратор регистрации обработчика задач указанного типа"""
+    def decorator(func_):
+        _HANDLERS[kind] = func_
+        return func_
+    return decorator
+
+
+def periodic_job(kind: str, interval: float):
+    """
+    Декоратор обработчика задачи, которая повторяется раз в interval секунд.
+    Следующий запуск ставится после завершения предыдущего, а dedupe_key
+    не даёт нескольким воркерам запланировать её дважды.
+    """
+    def decorator(func_):
+        _HANDLERS[kind] = func_
+        _PERIODIC[kind] = interval
+        return func_
+    return decorator
+
+
+def schedule_periodic_jobs(db: Session) -> None:
+    """Ставит в очередь периодические задачи, которых там ещё нет (при старте воркера)"""
+    for kind in _PERIODIC:
+        enqueue_job(db, kind, dedupe_key=f"periodic:{kind}")
+    db.commit()
+
+
+def enqueue_job(
+        db: Session,
+        kind: str,
+        payload: Optional[Dict[str, Any]] = None,
+        delay: float = 0,
+        max_attempts: int = JOB_DEFAULT_MAX_ATTEMPTS,
+        dedupe_key: Optional[str] = None
+) -> Optional[int]:
+    """
+    Ставит задачу в очередь в рамках текущей транзакции и возвращает её id.
+    Коммит выполняет вызывающий код — задача появится в очереди
+    только вместе с изменениями, которые её породили.
+    Задача с dedupe_key не дублируется, пока предыдущая такая же не завершена
+    (в этом случае возвращается None).
+    """
+    stmt = insert(Job).values(
+        kind=kind,
+        payload=payload or {},
+        status="pending",
+        attempts=0,
+        max_attempts=max_attempts,
+        run_at=datetime.datetime.utcnow() + datetime.timedelta(seconds=delay),
+        dedupe_key=dedupe_key,
+        created_at=datetime.datetime.utcnow(),
+        updated_at=datetime.datetime.utcnow()
+    )
+    if dedupe_key is not None:
+        stmt = stmt.on_conflict_do_nothing(
+            index_elements=["dedupe_key"],
+            index_where=Job.status.in_(["pending", "running"])
+        )
+    return db.execute(stmt.returning(Job.id)).scalar()
+
+
+def claim_next_job(db: Session) -> Optional[Job]:
+    """
+    Забирает одну готовую к выполнению задачу (FOR UPDATE SKIP LOCKED).
+    Задачи, "зависшие" в статусе running дольше JOB_LOCK_TIMEOUT, выдаются повторно.
+    Время в таблице хранится в UTC без часового пояса (как пишет utcnow()),
+    поэтому и сравнивается с now() AT TIME ZONE 'utc', а не с локальным now().
+    """
+    row = db.execute(
+        text("""
+            UPDATE jobs
+            SET status = 'running', locked_at = now() AT TIME ZONE 'utc', attempts = attempts + 1,
+                updated_at = now() AT TIME ZONE 'utc'
+            WHERE id = (
+                SELECT id FROM jobs
+                WHERE (status = 'pending' AND run_at <= now() AT TIME ZONE 'utc')
+                   OR (status = 'running'
+                       AND locked_at < now() AT TIME ZONE 'utc' - make_interval(secs => :lock_timeout))
+                ORDER BY run_at, id
+                FOR UPDATE SKIP LOCKED
+                LIMIT 1
+            )
+            RETURNING id
+        """),
+        {"lock_timeout": JOB_LOCK_TIMEOUT}
+    ).first()
+    db.commit()
+    if row is None:
+        return None
+    return db.query(Job).filter(Job.id == row.id).first()
+
+
+def _backoff_seconds(attempts: int) -> float:
+    # Экспоненциальная задержка с "джиттером", чтобы повторы не шли синхронно
+    delay = min(JOB_BACKOFF_BASE * (2 ** max(attempts - 1, 0)), JOB_BACKOFF_MAX)
+    return delay * random.uniform(0.5, 1.0)
+
+
+class _LeaseHeartbeat(threading.Thread):
+    """
+    Продлевает аренду задачи, пока работает обработчик: раз в JOB_HEARTBEAT_INTERVAL
+    обновляет locked_at в отдельной сессии. Без этого обработчик дольше
+    JOB_LOCK_TIMEOUT считался бы зависшим и выполнялся бы параллельно вторым воркером.
+    Условие по attempts не даёт продлить аренду, если задачу уже перехватили.
+    """
+
+    def __init__(self, job_id: int, attempts: int):
+        super().__init__(name=f"job-heartbeat-{job_id}", daemon=True)
+        self.job_id = job_id
+        self.attempts = attempts
+        self._stopped = threading.Event()
+
+    def run(self) -> None:
+        while not self._stopped.wait(JOB_HEARTBEAT_INTERVAL):
+            db = SessionLocal()
+            try:
+                db.execute(
+                    text("""
+                        UPDATE jobs SET locked_at = now() AT TIME ZONE 'utc'
+                        WHERE id = :id AND status = 'running' AND attempts = :attempts
+                    """),
+                    {"id": self.job_id, "attempts": self.attempts}
+                )
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                print(f"Не удалось продлить аренду задачи {self.job_id}: {e}")
+            finally:
+                db.close()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self.join()
+
+
+def run_job(db: Session, job: Job) -> None:
+    """Выполняет задачу и фиксирует результат: done, повтор с задержкой или failed"""
+    handler = _HANDLERS.get(job.kind)
+    heartbeat = _LeaseHeartbeat(job.id, job.attempts)
+    heartbeat.start()
+    try:
+        if handler is None:
+            raise LookupError(f"Нет обработчика для задачи '{job.kind}'")
+        result = handler(db, dict(job.payload or {}))
+        heartbeat.stop()
+        db.commit()
+        job.status = "done"
+        job.result = result
+        job.last_error = None
+    except Exception:
+        heartbeat.stop()
+        db.rollback()
+        job = db.query(Job).filter(Job.id == job.id).first()
+        job.last_error = traceback.format_exc()[-4000:]
+        if job.attempts >= job.max_attempts:
+            job.status = "failed"
+        else:
+            job.status = "pending"
+            job.run_at = datetime.datetime.utcnow() + datetime.timedelta(seconds=_backoff_seconds(job.attempts))
+    job.locked_at = None
+    job.updated_at = datetime.datetime.utcnow()
+    db.commit()
+
+    if job.kind in _PERIODIC and job.status in ("done", "failed"):
+        enqueue_job(db, job.kind, delay=_PERIODIC[job.kind], dedupe_key=f"periodic:{job.kind}")
+        db.commit()
+
+
+def get_job(db: Session, job_id: int) -> Optional[Job]:
+    return db.query(Job).filter(Job.id == job_id).first()
+
+
+def job_in_progress(db: Session, kind: str) -> bool:
+    """
+    Есть ли ожидающая или выполняющаяся задача этого типа. Для задач-цепочек,
+    которые ставят продолжение под новым dedupe_key: общий ключ на всю цепочку
+    невозможен, пока текущее звено держит его в статусе running.
+    """
+    return db.query(Job.id).filter(Job.kind == kind, Job.status.in_(["pending", "running"])).first() is not None
+
+
+def retry_job(db: Session, job_id: int) -> Optional[Job]:
+    """
+    Возвращает упавшую задачу в очередь с обнулённым счётчиком попыток.
+    Задачи в других статусах не трогает (JobNotRetryable): повтор running
+    выполнил бы её дважды, а done — заново сделал бы законченную работу.
+    """
+    job = db.query(Job).filter(Job.id == job_id).with_for_update().first()
+    if job is None:
+        return None
+    if job.status != "failed":
+        db.rollback()
+        raise JobNotRetryable(f"Задача в статусе {job.status}, повторить можно только failed")
+    job.status = "pending"
+    job.attempts = 0
+    job.run_at = datetime.datetime.utcnow()
+    job.updated_at = datetime.datetime.utcnow()
+    try:
+        db.commit()
+    except IntegrityError as e:
+        # Такая же задача (по dedupe_key) уже ждёт или выполняется
+        db.rollback()
+        raise JobNotRetryable("Такая же задача уже в очереди") from e
+    db.refresh(job)
+    return job
+
+
+def get_queue_stats(db: Session, failures_limit: int = 20) -> Dict[str, Any]:
+    """Глубина очереди по типам и статусам, возраст самой старой задачи и последние ошибки"""
+    counts = db.query(Job.kind, Job.status, func.count(Job.id)) \
+        .group_by(Job.kind, Job.status).all()
+
+    by_kind: Dict[str, Dict[str, int]] = {}
+    totals: Dict[str, int] = {"pending": 0, "running": 0, "done": 0, "failed": 0}
+    for kind, job_status, count in counts:
+        by_kind.setdefault(kind, {})[job_status] = count
+        totals[job_status] = totals.get(job_status, 0) + count
+
+    oldest_pending = db.query(func.min(Job.run_at)).filter(
+        Job.status == "pending", Job.run_at <= func.timezone("utc", func.now())
+    ).scalar()
+    oldest_pending_age = None
+    if oldest_pending is not None:
+        oldest_pending_age = max((datetime.datetime.utcnow() - oldest_pending).total_seconds(), 0.0)
+
+    recent_failures: List[Job] = db.query(Job).filter(Job.status == "failed") \
+        .order_by(Job.updated_at.desc()).limit(failures_limit).all()
+
+    return {
+        "totals": totals,
+        "by_kind": by_kind,
+        "oldest_pending_age_seconds": oldest_pending_age,
+        "recent_failures": recent_failures,
+    }
+
+
+def run_worker(poll_interval: float = JOB_POLL_INTERVAL, once: bool = False) -> None:
+    """
+    Основной цикл воркера. Несколько воркеров можно запускать параллельно —
+    SKIP LOCKED гарантирует, что задача достанется только одному из них.
+    """
+    stopping = {"flag": False}
+
+    def _stop(signum, frame):
+        stopping["flag"] = True
+
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+
+    db = SessionLocal()
+    try:
+        schedule_periodic_jobs(db)
+    except Exception as e:
+        db.rollback()
+        print(f"Не удалось запланировать периодические задачи: {e}")
+    finally:
+        db.close()
+
+    while not stopping["flag"]:
+        db = SessionLocal()
+        try:
+            job = claim_next_job(db)
+            if job is not None:
+                run_job(db, job)
+        except Exception as e:
+            db.rollback()
+            print(f"Ошибка воркера очереди: {e}")
+            job = None
+        finally:
+            db.close()
+
+        if once and job is None:
+            break
+        if job is None:
+            time.sleep(poll_interval)
@@ -0,0 +1,210 @@
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Optional
+
+from sqlalchemy.orm import Session
+
+from app.analytics import refresh_analytics
+from app.dedup import scan_duplicates
+from app.fulltext import index_file_text, stale_text_file_ids
+from app.graph import compute_pagerank, verify_citation_counts
+from app.idempotency import cleanup_expired_keys
+from app.jobs.jobs import enqueue_job, job_handler, periodic_job
+from app.minio_client import delete_file, open_file
+from app.models import ProjectFile, Report
+from app.purge import purge_project
+from app.reconcile import reconcile_storage, RECONCILE_RUN_SECONDS
+from app.reports import build_report
+from app.similarity import reindex_projects
+from app.previews import preview_kind, preview_key, render_preview, PREVIEW_SOURCE_LIMIT
+from app.storage import get_storage, ObjectNotFound
+from app.taxonomy import continue_relocation
+
+PREVIEW_WORKERS = int(os.getenv("PREVIEW_WORKERS", "2"))
+PREVIEW_TIMEOUT = float(os.getenv("PREVIEW_TIMEOUT", "120"))
+TEXT_BACKFILL_BATCH = int(os.getenv("TEXT_BACKFILL_BATCH", "500"))
+IDEMPOTENCY_CLEANUP_INTERVAL = float(os.getenv("IDEMPOTENCY_CLEANUP_INTERVAL", "3600"))
+CITATION_VERIFY_INTERVAL = float(os.getenv("CITATION_VERIFY_INTERVAL", str(24 * 3600)))
+PAGERANK_INTERVAL = float(os.getenv("PAGERANK_INTERVAL", str(24 * 3600)))
+ANALYTICS_REFRESH_INTERVAL = float(os.getenv("ANALYTICS_REFRESH_INTERVAL", "900"))
+
+_preview_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _get_preview_pool() -> ProcessPoolExecutor:
+    # Декодирование изображений и PDF нагружает CPU — выносим в отдельные процессы
+    global _preview_pool
+    if _preview_pool is None:
+        _preview_pool = ProcessPoolExecutor(max_workers=PREVIEW_WORKERS)
+    return _preview_pool
+
+
+def _read_limited(stream, limit: int) -> bytes:
+    chunks = []
+    left = limit
+    try:
+        while left > 0:
+            chunk = stream.read(min(left, 256 * 1024))
+            if not chunk:
+                break
+            chunks.append(chunk)
+            left -= len(chunk)
+    finally:
+        stream.close()
+        if hasattr(stream, "release_conn"):
+            stream.release_conn()
+    return b"".join(chunks)
+
+
+@job_handler("storage.delete")
+def delete_object_task(db: Session, payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Удаляет объект из хранилища. Удаление отсутствующего объекта считается успешным."""
+    delete_file(payload["object_name"])
+    return {"deleted": payload["object_name"]}
+
+
+@job_handler("preview.generate")
+def generate_preview_task(db: Session, payload: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Строит превью файла (миниатюра изображения, первая страница PDF, первые строки CSV).
+    Превью адресуется хэшем содержимого: если такое уже есть, повторно не строится.
+    """
+    pf = db.query(ProjectFile).filter(ProjectFile.id == payload["file_id"]).first()
+    if pf is None:
+        return {"skipped": "file deleted"}
+
+    metadata = pf.file_metadata or {}
+    sha256 = metadata.get("sha256")
+    kind = preview_kind(metadata.get("detected_type"), pf.name)
+    if not sha256 or not kind:
+        return {"skipped": "unsupported"}
+
+    key, content_type = preview_key(sha256, kind)
+    storage = get_storage()
+    try:
+        storage.stat(key)
+        return {"preview": key, "reused": True}
+    except ObjectNotFound:
+        pass
+
+    limit = PREVIEW_SOURCE_LIMIT[kind]
+    data = _read_limited(open_file(pf.storage_key, metadata.get("codec")), limit + 1)
+    if len(data) > limit:
+        if kind != "csv":
+            return {"skipped": "too large"}
+        data = data[:limit]
+
+    # Без Pillow/PyMuPDF задача падает (и видна в /admin/jobs/stats), а не пропускается молча
+    preview = _get_preview_pool().submit(render_preview, kind, data).result(timeout=PREVIEW_TIMEOUT)
+
+    storage.put(key, io.BytesIO(preview), len(preview), content_type)
+    return {"preview": key, "size": len(preview)}
+
+
+@job_handler("text.extract")
+def extract_text_task(db: Session, payload: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Извлекает текст файла и обновляет его запись в file_texts.
+    Неизменившееся содержимое не переиндексируется, одинаковое — индексируется один раз.
+    """
+    pf = db.query(ProjectFile).filter(ProjectFile.id == payload["file_id"]).first()
+    if pf is None:
+        return {"skipped": "file deleted"}
+
+    codec = (pf.file_metadata or {}).get("codec")
+    return index_file_text(db, pf, lambda limit: _read_limited(open_file(pf.storage_key, codec), limit))
+
+
+@job_handler("text.backfill")
+def backfill_text_task(db: Session, payload: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Ставит индексацию для файлов без актуальной записи в file_texts.
+    Обрабатывает одну порцию и ставит себя же на следующую.
+    """
+    after_id = payload.get("after_id", 0)
+    stale = stale_text_file_ids(db, after_id, TEXT_BACKFILL_BATCH)
+    for file_id, sha256 in stale:
+        enqueue_job(db, "text.extract", {"file_id": file_id}, max_attempts=3, dedupe_key=f"text:{file_id}:{sha256}")
+    if len(stale) == TEXT_BACKFILL_BATCH:
+        last_id = stale[-1][0]
+        enqueue_job(db, "text.backfill", {"after_id": last_id}, dedupe_key=f"text.backfill:{last_id}")
+    return {"enqueued": len(stale), "after_id": after_id}
+
+
+@job_handler("report.build")
+def build_report_task(db: Session, payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Разбирает табличный файл порциями и сохраняет агрегаты и строки в reports.table_data"""
+    report = db.query(Report).filter(Report.id == payload["report_id"]).first()
+    if report is None:
+        return {"skipped": "report deleted"}
+    pf = db.query(ProjectFile).filter(ProjectFile.id == report.file_id).first()
+    if pf is None:
+        return {"skipped": "file deleted"}
+    codec = (pf.file_metadata or {}).get("codec")
+    return build_report(db, report, lambda: open_file(pf.storage_key, codec))
+
+
+@job_handler("storage.reconcile")
+def reconcile_storage_task(db: Session, payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Сверка хранилища с project_files; по умолчанию только отчёт (dry_run). При нехватке времени ставит продолжение"""
+    return reconcile_storage(
+        db, dry_run=payload.get("dry_run", True), prefix=payload.get("prefix", ""),
+        after_key=payload.get("after_key"), previous=payload.get("report"),
+        run_seconds=RECONCILE_RUN_SECONDS
+    )
+
+
+@job_handler("project.purge")
+def purge_project_task(db: Session, payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Очистка удалённого проекта порциями; при нехватке времени задача ставит продолжение"""
+    return purge_project(db, payload["project_id"])
+
+
+@periodic_job("idempotency.cleanup", IDEMPOTENCY_CLEANUP_INTERVAL)
+def cleanup_idempotency_keys_task(db: Session, payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Удаляет ключи идемпотентности с истёкшим сроком хранения"""
+    return {"deleted": cleanup_expired_keys(db)}
+
+
+@job_handler("subject_area.relocate")
+def relocate_subject_area_task(db: Session, payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Перезапись путей большого поддерева предметных областей после переноса"""
+    return continue_relocation(db, payload)
+
+
+@periodic_job("citations.verify", CITATION_VERIFY_INTERVAL)
+def verify_citations_task(db: Session, payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Сверка и исправление счётчиков цитируемости, которые триггер ведёт инкрементально"""
+    return verify_citation_counts(db, repair=payload.get("repair", True))
+
+
+@periodic_job("graph.pagerank", PAGERANK_INTERVAL)
+def compute_pagerank_task(db: Session, payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Пересчёт PageRank проектов по графу связей; в результате — метрики сходимости и времени"""
+    return compute_pagerank(db)
+
+
+@job_handler("similarity.reindex")
+def reindex_similarity_task(db: Session, payload: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Пересчитывает сигнатуры похожести для порции проектов
+    и ставит себя же на следующую.
+    """
+    after_id = payload.get("after_id", 0)
+    scanned, updated, last_id = reindex_projects(db, after_id)
+    if last_id is not None:
+        enqueue_job(db, "similarity.reindex", {"after_id": last_id}, dedupe_key=f"similarity.reindex:{last_id}")
+    return {"scanned": scanned, "updated": updated, "after_id": after_id}
+
+
+@job_handler("projects.duplicates.scan")
+def scan_duplicates_task(db: Session, payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Пакетный поиск кластеров дублей проектов; при нехватке времени задача ставит продолжение"""
+    return scan_duplicates(db, payload.get("after_id", 0))
+
+
+@periodic_job("analytics.refresh", ANALYTICS_REFRESH_INTERVAL)
+def refresh_analytics_task(db: Session, payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Обновление материализованных представлений аналитики (REFRESH CONCURRENTLY)"""
+    return refresh_analytics(db)
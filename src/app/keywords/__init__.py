@@ -0,0 +1,3 @@
+from .keywords import (
+    top_keywords, trending_keywords, related_keywords, rebuild_keyword_stats, KEYWORD_STATUS_CODES
+)
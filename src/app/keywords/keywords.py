@@ -0,0 +1,216 @@
+import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+# Счётчики ключевых слов (keyword_counts, keyword_pairs, keyword_monthly) ведёт
+# триггер trg_keyword_stats на projects через keyword_stats_apply (init.sql).
+# Статус в них хранится кодом, проекты без предметной области — под
+# subject_area_id = 0. Коды должны совпадать с CASE в keyword_stats_apply.
+KEYWORD_STATUS_CODES = {"в работе": 1, "приостановлен": 2, "завершен": 3}
+# Пары считаются по первым KEYWORD_PAIR_LIMIT словам проекта в порядке id словаря —
+# должно совпадать с pair_ids в keyword_stats_apply. Через API больше слов не
+# приходит (ProjectCreate), предел защищает и от прямой записи в projects
+KEYWORD_PAIR_LIMIT = 50
+
+_STATUS_CODE_SQL = """
+    CASE p.status WHEN 'в работе' THEN 1 WHEN 'приостановлен' THEN 2 WHEN 'завершен' THEN 3 ELSE 0 END
+"""
+
+_SUBTREE_SQL = """
+    subject_area_id IN (
+        SELECT id FROM subject_areas
+        WHERE path <@ (SELECT path FROM subject_areas WHERE id = :subject_area_id)
+    )
+"""
+
+
+def _scope(
+        status: Optional[str],
+        subject_area_id: Optional[int],
+        include_subtree: bool,
+        public_only: bool,
+        conditions: List[str],
+        params: Dict[str, Any]
+) -> None:
+    if status:
+        conditions.append("status = :status_code")
+        params["status_code"] = KEYWORD_STATUS_CODES.get(status, 0)
+    if subject_area_id is not None:
+        conditions.append(_SUBTREE_SQL if include_subtree else "subject_area_id = :subject_area_id")
+        params["subject_area_id"] = subject_area_id
+    if public_only:
+        conditions.append("is_public")
+
+
+def _where(conditions: List[str]) -> str:
+    return ("WHERE " + " AND ".join(conditions)) if conditions else ""
+
+
+def top_keywords(
+        db: Session,
+        status: Optional[str] = None,
+        subject_area_id: Optional[int] = None,
+        include_subtree: bool = True,
+        public_only: bool = False,
+        skip: int = 0,
+        limit: int = 50
+) -> List[Dict[str, Any]]:
+    """Самые частые ключевые слова живых проектов: слово и число проектов с ним"""
+    conditions: List[str] = []
+    params: Dict[str, Any] = {"skip": skip, "limit": limit}
+    _scope(status, subject_area_id, include_subtree, public_only, conditions, params)
+    return [dict(row) for row in db.execute(text(f"""
+        SELECT k.keyword, c.projects
+        FROM (
+            SELECT keyword_id, sum(projects)::bigint AS projects
+            FROM keyword_counts
+            {_where(conditions)}
+            GROUP BY keyword_id
+        ) c
+        JOIN keywords k ON k.id = c.keyword_id
+        WHERE c.projects > 0
+        ORDER BY c.projects DESC, k.keyword
+        OFFSET :skip LIMIT :limit
+    """), params).mappings()]
+
+
+def trending_keywords(
+        db: Session,
+        month: Optional[datetime.date] = None,
+        status: Optional[str] = None,
+        subject_area_id: Optional[int] = None,
+        include_subtree: bool = True,
+        public_only: bool = False,
+        skip: int = 0,
+        limit: int = 50
+) -> List[Dict[str, Any]]:
+    """
+    Ключевые слова проектов, созданных в месяце month (по умолчанию — текущем),
+    по убыванию числа проектов; previous — то же за предыдущий месяц
+    """
+    month = (month or datetime.datetime.utcnow().date()).replace(day=1)
+    previous = (month - datetime.timedelta(days=1)).replace(day=1)
+    conditions: List[str] = ["month IN (:month, :previous)"]
+    params: Dict[str, Any] = {"month": month, "previous": previous, "skip": skip, "limit": limit}
+    _scope(status, subject_area_id, include_subtree, public_only, conditions, params)
+    return [dict(row) for row in db.execute(text(f"""
+        SELECT k.keyword, m.projects, m.previous, m.projects - m.previous AS growth
+        FROM (
+            SELECT keyword_id,
+                   coalesce(sum(projects) FILTER (WHERE month = :month), 0)::bigint AS projects,
+                   coalesce(sum(projects) FILTER (WHERE month = :previous), 0)::bigint AS previous
+            FROM keyword_monthly
+            {_where(conditions)}
+            GROUP BY keyword_id
+        ) m
+        JOIN keywords k ON k.id = m.keyword_id
+        WHERE m.projects > 0
+        ORDER BY m.projects DESC, growth DESC, k.keyword
+        OFFSET :skip LIMIT :limit
+    """), params).mappings()]
+
+
+def related_keywords(
+        db: Session,
+        keyword: str,
+        status: Optional[str] = None,
+        subject_area_id: Optional[int] = None,
+        include_subtree: bool = True,
+        public_only: bool = False,
+        skip: int = 0,
+        limit: int = 50
+) -> Optional[List[Dict[str, Any]]]:
+    """
+    Ключевые слова, встречающиеся в одних проектах с keyword, по убыванию
+    числа общих проектов. None, если такого слова нет в словаре.
+    """
+    keyword_id = db.execute(
+        text("SELECT id FROM keywords WHERE keyword = lower(btrim(:keyword))"), {"keyword": keyword}
+    ).scalar()
+    if keyword_id is None:
+        return None
+    conditions: List[str] = []
+    params: Dict[str, Any] = {"keyword_id": keyword_id, "skip": skip, "limit": limit}
+    _scope(status, subject_area_id, include_subtree, public_only, conditions, params)
+    # Пара хранится один раз (keyword_a < keyword_b): слово ищем с обеих сторон
+    return [dict(row) for row in db.execute(text(f"""
+        SELECT k.keyword, r.projects
+        FROM (
+            SELECT other_id, sum(projects)::bigint AS projects
+            FROM (
+                SELECT keyword_b AS other_id, status, subject_area_id, is_public, projects
+                FROM keyword_pairs WHERE keyword_a = :keyword_id
+                UNION ALL
+                SELECT keyword_a, status, subject_area_id, is_public, projects
+                FROM keyword_pairs WHERE keyword_b = :keyword_id
+            ) p
+            {_where(conditions)}
+            GROUP BY other_id
+        ) r
+        JOIN keywords k ON k.id = r.other_id
+        WHERE r.projects > 0
+        ORDER BY r.projects DESC, k.keyword
+        OFFSET :skip LIMIT :limit
+    """), params).mappings()]
+
+
+def rebuild_keyword_stats(db: Session) -> int:
+    """
+    Пересчитывает счётчики ключевых слов с нуля (после миграции или для сверки).
+    Словарь не очищается — id слов остаются прежними. Возвращает число строк keyword_counts.
+    """
+    db.execute(text("LOCK TABLE keywords, keyword_counts, keyword_pairs, keyword_monthly IN EXCLUSIVE MODE"))
+    db.execute(text("""
+        INSERT INTO keywords (keyword)
+        SELECT DISTINCT lower(btrim(k))
+        FROM projects p
+        CROSS JOIN LATERAL jsonb_array_elements_text(
+            CASE WHEN jsonb_typeof(p.keywords) = 'array' THEN p.keywords ELSE '[]'::jsonb END
+        ) AS k
+        WHERE p.deleted_at IS NULL AND btrim(k) <> ''
+        ON CONFLICT (keyword) DO NOTHING
+    """))
+    db.execute(text(f"""
+        CREATE TEMP TABLE keyword_rebuild ON COMMIT DROP AS
+        SELECT d.*, row_number() OVER (PARTITION BY d.project_id ORDER BY d.keyword_id) AS rn
+        FROM (
+            SELECT DISTINCT p.id AS project_id, w.id AS keyword_id,
+                   ({_STATUS_CODE_SQL})::smallint AS status,
+                   coalesce(p.subject_area_id, 0) AS subject_area_id,
+                   p.is_public,
+                   date_trunc('month', p.created_at)::date AS month
+            FROM projects p
+            CROSS JOIN LATERAL jsonb_array_elements_text(
+                CASE WHEN jsonb_typeof(p.keywords) = 'array' THEN p.keywords ELSE '[]'::jsonb END
+            ) AS k
+            JOIN keywords w ON w.keyword = lower(btrim(k))
+            WHERE p.deleted_at IS NULL
+        ) d
+    """))
+    db.execute(text("DELETE FROM keyword_counts"))
+    db.execute(text("DELETE FROM keyword_pairs"))
+    db.execute(text("DELETE FROM keyword_monthly"))
+    inserted = db.execute(text("""
+        INSERT INTO keyword_counts (keyword_id, status, subject_area_id, is_public, projects)
+        SELECT keyword_id, status, subject_area_id, is_public, count(*)
+        FROM keyword_rebuild
+        GROUP BY keyword_id, status, subject_area_id, is_public
+    """)).rowcount
+    db.execute(text("""
+        INSERT INTO keyword_monthly (month, keyword_id, status, subject_area_id, is_public, projects)
+        SELECT month, keyword_id, status, subject_area_id, is_public, count(*)
+        FROM keyword_rebuild
+        GROUP BY month, keyword_id, status, subject_area_id, is_public
+    """))
+    db.execute(text("""
+        INSERT INTO keyword_pairs (keyword_a, keyword_b, status, subject_area_id, is_public, projects)
+        SELECT a.keyword_id, b.keyword_id, a.status, a.subject_area_id, a.is_public, count(*)
+        FROM keyword_rebuild a
+        JOIN keyword_rebuild b ON b.project_id = a.project_id AND b.keyword_id > a.keyword_id
+        WHERE a.rn <= :pair_limit AND b.rn <= :pair_limit
+        GROUP BY a.keyword_id, b.keyword_id, a.status, a.subject_area_id, a.is_public
+    """), {"pair_limit": KEYWORD_PAIR_LIMIT})
+    db.commit()
+    return inserted
@@ -3,9 +3,13 @@ from fastapi.middleware.cors import CORSMiddleware
 # from database import engine, Base
 from app.api import router as api_router
 from app.auth import router as auth_router
+from app.idempotency import IdempotencyMiddleware
 
 app = FastAPI(title="Система управления проектами")
 
+# Повторы запросов с Idempotency-Key получают сохранённый ответ
+app.add_middleware(IdempotencyMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # Разрешить все домены (для разработки)
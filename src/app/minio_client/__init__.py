@@ -1 +1,5 @@
-from .minio_client import upload_file, download_file, update_file_with_rename, delete_file
+from .minio_client import (
+    upload_file, upload_files, download_file, open_file, open_local_decoded, delete_file,
+    new_object_key, local_file_path, iter_file_chunks,
+    get_file_etag, cached_file_path, release_cached_file, download_cache_stats
+)
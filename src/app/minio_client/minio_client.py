@@ -1,92 +1,178 @@
-from minio import Minio
-from minio.error import S3Error
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple, BinaryIO
+import uuid
 import os
 
-MINIO_ENDPOINT = os.getenv("MINIO_ENDPOINT", "localhost:9000")
-MINIO_ACCESS_KEY = os.getenv("MINIO_ACCESS_KEY", "minioadmin")
-MINIO_SECRET_KEY = os.getenv("MINIO_SECRET_KEY", "minioadmin")
-MINIO_SECURE = False
-
-client = Minio(
-    MINIO_ENDPOINT,
-    access_key=MINIO_ACCESS_KEY,
-    secret_key=MINIO_SECRET_KEY,
-    secure=MINIO_SECURE
+from app.storage import get_storage, StorageError
+from app.storage.cache import DiskCache, get_download_cache
+from app.storage.inspect import InspectingReader
+from app.storage.compression import (
+    choose_codec, compress_stream, decompress_stream, CountingReader
 )
 
-BUCKET_NAME = "project-files"
+# Модуль оставлен фасадом над app.storage: конкретное хранилище (MinIO или
+# локальный диск) выбирается переменной окружения STORAGE_BACKEND
+UPLOAD_WORKERS = int(os.getenv("MINIO_UPLOAD_WORKERS", "8"))
+
+def new_object_key(project_id: int, file_name: str) -> str:
+    """
+    Новый уникальный ключ объекта. Ключ не зависит от отображаемого имени файла,
+    поэтому переименование не трогает хранилище, а новая версия содержимого
+    всегда пишется под новым ключом.
+    """
+    ext = os.path.splitext(file_name or "")[1].lower()
+    return f"projects/{project_id}/{uuid.uuid4().hex}{ext}"
 
-def ensure_bucket_exists():
-    if not client.bucket_exists(BUCKET_NAME):
-        client.make_bucket(BUCKET_NAME)
+class UploadResult(NamedTuple):
+    url: str
+    etag: Optional[str]
+    size: int                     # исходный размер файла
+    codec: Optional[str] = None   # кодек сжатия в хранилище (None — без сжатия)
+    stored_size: Optional[int] = None
+    inspection: Optional[Dict[str, Any]] = None  # sha256, md5, detected_type, properties
 
-def upload_file(file_data, file_name: str, content_type: str):
+    def metadata(self, content_type: Optional[str]) -> Dict[str, Any]:
+        """Метаданные для ProjectFile.file_metadata"""
+        result = {"content_type": content_type, "size": self.size, "etag": self.etag}
+        if self.codec:
+            result["codec"] = self.codec
+            result["stored_size"] = self.stored_size
+        if self.inspection:
+            result.update(self.inspection)
+        return result
+
+def _check_etag(storage, file_name: str, etag: Optional[str], md5: str) -> None:
+    """
+    Сверяет ETag хранилища с MD5 отправленных байт. Для составных (multipart)
+    загрузок ETag не является MD5 содержимого — их не проверяем.
+    """
+    if not etag:
+        return
+    etag = etag.strip('"')
+    if "-" in etag or etag == md5:
+        return
+    storage.delete(file_name)
+    raise StorageError(f"Контрольная сумма не совпала для {file_name}: {etag} != {md5}")
+
+def upload_file(file_data, file_name: str, content_type: str) -> UploadResult:
     """
     file_data — объект с методом read(), например UploadFile.file
     """
-    ensure_bucket_exists()
     # Если file_data — объект с read(), можно передать длину файла, если известна
     file_data.seek(0, 2)  # Перемещаемся в конец файла, чтобы узнать размер
     size = file_data.tell()
     file_data.seek(0)     # Возвращаемся в начало
 
-    client.put_object(
-        bucket_name=BUCKET_NAME,
-        object_name=file_name,
-        data=file_data,
-        length=size,
-        content_type=content_type
-    )
-    return f"{MINIO_ENDPOINT}/{BUCKET_NAME}/{file_name}"
+    storage = get_storage()
+    # Хэши, размер и тип содержимого считаем по ходу записи — без повторного чтения
+    inspector = InspectingReader(file_data, file_name)
+    codec = choose_codec(content_type, file_name)
+    if codec is None:
+        stat = storage.put(file_name, inspector, size, content_type)
+        _check_etag(storage, file_name, stat.etag, inspector.md5)
+        return UploadResult(storage.url(file_name), stat.etag, inspector.size,
+                            inspection=inspector.result())
+
+    # Сжимаем на лету: итоговый размер заранее неизвестен
+    compressed = CountingReader(compress_stream(inspector, codec))
+    stat = storage.put(file_name, compressed, -1, content_type)
+    _check_etag(storage, file_name, stat.etag, compressed.md5)
+    return UploadResult(storage.url(file_name), stat.etag, inspector.size, codec, compressed.count,
+                        inspection=inspector.result())
+
+def upload_files(files: List[Tuple[BinaryIO, str, str]], max_workers: int = UPLOAD_WORKERS) -> List[UploadResult]:
+    """
+    Параллельно загружает несколько файлов: files — список (file_data, file_name, content_type).
+    Возвращает результаты загрузки в том же порядке. Если хотя бы одна загрузка не удалась,
+    уже загруженные объекты удаляются, а исключение пробрасывается.
+    """
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(files) or 1))) as pool:
+        futures = [
+            pool.submit(upload_file, file_data, file_name, content_type)
+            for file_data, file_name, content_type in files
+        ]
+        errors = []
+        for (_, file_name, _), future in zip(files, futures):
+            try:
+                future.result()
+            except Exception as e:
+                errors.append(f"{file_name}: {e}")
+
+    if errors:
+        uploaded = [
+            file_name for (_, file_name, _), future in zip(files, futures)
+            if future.exception() is None
+        ]
+        get_storage().delete_many(uploaded)
+        raise Exception(f"Ошибка загрузки файлов: {'; '.join(errors)}")
+
+    return [future.result() for future in futures]
 
 def download_file(file_name: str):
     """
-    Скачивает файл из MinIO.
-    Возвращает объект Response или поток байт.
+    Скачивает файл из хранилища.
+    Возвращает поток байт (read()/stream()), который нужно закрыть после чтения.
     """
     try:
-        response = client.get_object(BUCKET_NAME, file_name)
-        return response
-    except S3Error as err:
+        return get_storage().get(file_name)
+    except StorageError as err:
         raise Exception(f"Ошибка при скачивании файла: {err}")
 
-def delete_file(file_name: str):
+def open_file(file_name: str, codec: Optional[str] = None):
+    """Поток с исходным содержимым файла: сжатый объект распаковывается на лету"""
+    return decompress_stream(download_file(file_name), codec)
+
+def open_local_decoded(path: str, codec: Optional[str]):
+    """Распаковывающий поток для локальной копии объекта (локальное хранилище или кэш)"""
+    return decompress_stream(open(path, "rb"), codec)
+
+def iter_file_chunks(file_obj, chunk_size: int = 256 * 1024):
+    """Читает поток из download_file блоками и закрывает его по завершении"""
     try:
-        client.remove_object(BUCKET_NAME, file_name)
-    except S3Error as err:
-        raise Exception(f"Ошибка при удалении файла: {err}")
+        if hasattr(file_obj, "stream"):
+            yield from file_obj.stream(chunk_size)
+        else:
+            while True:
+                chunk = file_obj.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        file_obj.close()
+        if hasattr(file_obj, "release_conn"):
+            file_obj.release_conn()
 
-def update_file_with_rename(new_file_data, old_file_name: str, new_file_name: str, content_type: str):
-    """
-    Обновляет файл в MinIO, удаляя старый файл с old_file_name и загружая новый под new_file_name.
+def local_file_path(file_name: str) -> Optional[str]:
+    """Путь к файлу на диске, если хранилище локальное (для отдачи через sendfile)"""
+    return get_storage().local_path(file_name)
 
-    new_file_data — объект с методом read(), например UploadFile.file
-    old_file_name — текущее имя файла в MinIO (для удаления)
-    new_file_name — новое имя файла для загрузки
+def get_file_etag(file_name: str) -> Optional[str]:
+    """ETag объекта — запрос метаданных без скачивания содержимого"""
+    try:
+        return get_storage().stat(file_name).etag
+    except StorageError as err:
+        raise Exception(f"Ошибка при получении сведений о файле: {err}")
+
+def cached_file_path(file_name: str, etag: Optional[str], size: Optional[int] = None) -> Optional[str]:
+    """
+    Путь к копии объекта в локальном дисковом кэше (DOWNLOAD_CACHE_DIR) для
+    одного ответа; после отдачи его нужно освободить release_cached_file().
+    None — кэш выключен или объект не кэшируется, тогда файл нужно стримить из хранилища.
     """
+    cache = get_download_cache()
+    if cache is None:
+        return None
+    return cache.checkout(get_storage(), file_name, etag, size)
 
-    ensure_bucket_exists()
+def release_cached_file(path: str) -> None:
+    DiskCache.release(path)
 
-    # Удаляем старый файл, если он существует
+def download_cache_stats() -> Optional[Dict[str, Any]]:
+    cache = get_download_cache()
+    return cache.stats() if cache is not None else None
+
+def delete_file(file_name: str):
     try:
-        client.remove_object(BUCKET_NAME, old_file_name)
-    except S3Error as err:
-        # Игнорируем ошибку если файла не было, иначе пробрасываем
-        if "not found" not in str(err).lower():
-            raise Exception(f"Ошибка при удалении старого файла: {err}")
-
-    # Определяем размер нового файла
-    new_file_data.seek(0, os.SEEK_END)
-    size = new_file_data.tell()
-    new_file_data.seek(0)
-
-    # Загружаем новый файл с новым именем
-    client.put_object(
-        bucket_name=BUCKET_NAME,
-        object_name=new_file_name,
-        data=new_file_data,
-        length=size,
-        content_type=content_type
-    )
-
-    return f"{MINIO_ENDPOINT}/{BUCKET_NAME}/{new_file_name}"
\ No newline at end of file
+        get_storage().delete(file_name)
+    except StorageError as err:
+        raise Exception(f"Ошибка при удалении файла: {err}")
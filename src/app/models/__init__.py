@@ -1 +1 @@
-from .models import User, Project, SubjectArea, ProjectConnection, TeamMember, ProjectFile
\ No newline at end of file
+from .models import User, Project, Report, SubjectArea, SubjectAreaProjectStats, ProjectConnection, TeamMember, ProjectFile, FileText, ProjectMinhash, ProjectLshBucket, ProjectDuplicatePair, Keyword, KeywordCount, KeywordPair, KeywordMonthly, IdempotencyKey, Job
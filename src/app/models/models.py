@@ -3,10 +3,11 @@ from sqlalchemy_utils import LtreeType
 from sqlalchemy_utils import Ltree
 from typing import Optional, List, Dict, Any
 from sqlalchemy import (
-    Column, Integer, String, DateTime, Text, Boolean, ForeignKey, CheckConstraint
+    Column, Integer, BigInteger, SmallInteger, Float, String, Date, DateTime, Text, Boolean, ForeignKey, CheckConstraint, LargeBinary
 )
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import deferred
+from sqlalchemy.dialects.postgresql import JSONB, TSVECTOR
 from pydantic import BaseModel, EmailStr, Field
 
 Base = declarative_base()
@@ -40,18 +41,33 @@ class Project(Base):
     citation_count = Column(Integer)
     created_at = Column(DateTime, default=datetime.datetime.utcnow, nullable=False)
     is_public = Column(Boolean, default=False, nullable=False)
+    # Проект помечен удалённым и ждёт фоновой очистки (задача project.purge)
+    deleted_at = Column(DateTime)
+    # Важность в графе цитирования, пересчитывается задачей graph.pagerank
+    pagerank = Column(Float)
 
     __table_args__ = (
         CheckConstraint("status IN ('в работе', 'приостановлен', 'завершен')", name='check_status'),
     )
 
-# class Report(Base):
-#     __tablename__ = 'reports'
-#     id = Column(Integer, primary_key=True, autoincrement=True)
-#     file_id = Column(Integer, ForeignKey('project_files.id'), nullable=False)
-#     table_data = Column(JSONB, nullable=False)
-#     view_options = Column(JSONB)
-#     created_at = Column(DateTime, default=datetime.datetime.utcnow, nullable=False)
+class Report(Base):
+    """Отчёт по табличному файлу, собираемый задачей report.build (см. app.reports)"""
+    __tablename__ = 'reports'
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    file_id = Column(Integer, ForeignKey('project_files.id', ondelete='CASCADE'), nullable=False)
+    # Документ может быть большим — загружается только при явном обращении
+    table_data = deferred(Column(JSONB, nullable=False, default=dict))
+    view_options = Column(JSONB)
+    status = Column(String(20), default='pending', nullable=False)
+    error = Column(Text)
+    row_count = Column(BigInteger)
+    source_sha256 = Column(String(64))
+    created_at = Column(DateTime, default=datetime.datetime.utcnow, nullable=False)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        CheckConstraint("status IN ('pending', 'ready', 'failed')", name='check_report_status'),
+    )
 
 class SubjectArea(Base):
     __tablename__ = 'subject_areas'
@@ -63,6 +79,15 @@ class SubjectArea(Base):
     created_at = Column(DateTime, default=datetime.datetime.utcnow, nullable=False)
     path = Column(LtreeType)
 
+class SubjectAreaProjectStats(Base):
+    """Счётчики проектов области по статусам (без подобластей); ведутся триггером на projects"""
+    __tablename__ = 'subject_area_project_stats'
+    subject_area_id = Column(Integer, ForeignKey('subject_areas.id', ondelete='CASCADE'), primary_key=True)
+    projects_total = Column(Integer, default=0, nullable=False)
+    projects_active = Column(Integer, default=0, nullable=False)
+    projects_paused = Column(Integer, default=0, nullable=False)
+    projects_completed = Column(Integer, default=0, nullable=False)
+
 class ProjectConnection(Base):
     __tablename__ = 'project_connections'
     project_id = Column(Integer, ForeignKey('projects.id'), primary_key=True)
@@ -91,8 +116,141 @@ class ProjectFile(Base):
     project_id = Column(Integer, ForeignKey('projects.id', ondelete='CASCADE'), nullable=False)
     name = Column(String(255), nullable=False)
     url = Column(Text, nullable=False)
+    # Ключ объекта в хранилище. У старых записей пуст — тогда ключом служит name
+    object_key = Column(Text, unique=True)
     file_metadata = Column(JSONB, default=dict, nullable=False)
     uploaded_by = Column(Integer, ForeignKey('users.id'), nullable=False)
     uploaded_at = Column(DateTime, default=datetime.datetime.utcnow, nullable=False)
     is_public = Column(Boolean, default=False, nullable=False)
 
+    @property
+    def storage_key(self) -> str:
+        return self.object_key or self.name
+
+
+class FileText(Base):
+    """Полнотекстовый индекс содержимого файла (см. app.fulltext)"""
+    __tablename__ = 'file_texts'
+    file_id = Column(Integer, ForeignKey('project_files.id', ondelete='CASCADE'), primary_key=True)
+    project_id = Column(Integer, nullable=False)
+    sha256 = Column(String(64), nullable=False)
+    content_tsv = Column(TSVECTOR, nullable=False)
+    excerpt = Column(Text)
+    extracted_at = Column(DateTime, default=datetime.datetime.utcnow, nullable=False)
+
+
+class ProjectMinhash(Base):
+    """MinHash-сигнатура признаков проекта для поиска похожих (см. app.similarity)"""
+    __tablename__ = 'project_minhash'
+    project_id = Column(Integer, ForeignKey('projects.id', ondelete='CASCADE'), primary_key=True)
+    signature = Column(LargeBinary, nullable=False)
+    features = Column(Integer, nullable=False)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow, nullable=False)
+
+
+class ProjectLshBucket(Base):
+    """Корзина LSH: проекты с совпавшей полосой сигнатуры"""
+    __tablename__ = 'project_lsh_buckets'
+    band = Column(SmallInteger, primary_key=True)
+    bucket = Column(BigInteger, primary_key=True)
+    project_id = Column(Integer, ForeignKey('projects.id', ondelete='CASCADE'), primary_key=True)
+
+
+class ProjectDuplicatePair(Base):
+    """Пара вероятных дублей из пакетного поиска (см. app.dedup); project_id < duplicate_id"""
+    __tablename__ = 'project_duplicate_pairs'
+    project_id = Column(Integer, ForeignKey('projects.id', ondelete='CASCADE'), primary_key=True)
+    duplicate_id = Column(Integer, ForeignKey('projects.id', ondelete='CASCADE'), primary_key=True)
+    title_similarity = Column(Float, nullable=False)
+    keyword_similarity = Column(Float, nullable=False)
+    found_at = Column(DateTime, default=datetime.datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        CheckConstraint("project_id < duplicate_id", name='check_duplicate_pair_order'),
+    )
+
+
+
+class Keyword(Base):
+    """Словарь ключевых слов проектов (в нижнем регистре, без пробелов по краям)"""
+    __tablename__ = 'keywords'
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    keyword = Column(Text, unique=True, nullable=False)
+
+
+class KeywordCount(Base):
+    """
+    Число живых проектов с ключевым словом в разрезе статуса (код, см. app.keywords),
+    предметной области (0 — без области) и публичности; ведётся триггером на projects
+    """
+    __tablename__ = 'keyword_counts'
+    keyword_id = Column(Integer, primary_key=True)
+    status = Column(SmallInteger, primary_key=True)
+    subject_area_id = Column(Integer, primary_key=True)
+    is_public = Column(Boolean, primary_key=True)
+    projects = Column(Integer, nullable=False)
+
+
+class KeywordPair(Base):
+    """Число проектов, где ключевые слова встречаются вместе; keyword_a < keyword_b"""
+    __tablename__ = 'keyword_pairs'
+    keyword_a = Column(Integer, primary_key=True)
+    keyword_b = Column(Integer, primary_key=True)
+    status = Column(SmallInteger, primary_key=True)
+    subject_area_id = Column(Integer, primary_key=True)
+    is_public = Column(Boolean, primary_key=True)
+    projects = Column(Integer, nullable=False)
+
+    __table_args__ = (
+        CheckConstraint("keyword_a < keyword_b", name='keyword_pairs_order_check'),
+    )
+
+
+class KeywordMonthly(Base):
+    """То же, что KeywordCount, по месяцам создания проекта"""
+    __tablename__ = 'keyword_monthly'
+    month = Column(Date, primary_key=True)
+    keyword_id = Column(Integer, primary_key=True)
+    status = Column(SmallInteger, primary_key=True)
+    subject_area_id = Column(Integer, primary_key=True)
+    is_public = Column(Boolean, primary_key=True)
+    projects = Column(Integer, nullable=False)
+
+class IdempotencyKey(Base):
+    """Сохранённый ответ на запрос с заголовком Idempotency-Key (см. app.idempotency)"""
+    __tablename__ = 'idempotency_keys'
+    scope = Column(String(320), primary_key=True)
+    key = Column(String(255), primary_key=True)
+    fingerprint = Column(String(64), nullable=False)
+    status = Column(String(20), default='in_progress', nullable=False)
+    response_status = Column(Integer)
+    response_headers = Column(JSONB)
+    response_body = Column(LargeBinary)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow, nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        CheckConstraint("status IN ('in_progress', 'done')", name='check_idempotency_status'),
+    )
+
+
+class Job(Base):
+    """Задача фоновой очереди (см. app.jobs)"""
+    __tablename__ = 'jobs'
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    kind = Column(String(100), nullable=False)
+    payload = Column(JSONB, default=dict, nullable=False)
+    status = Column(String(20), default='pending', nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    max_attempts = Column(Integer, default=5, nullable=False)
+    run_at = Column(DateTime, default=datetime.datetime.utcnow, nullable=False)
+    locked_at = Column(DateTime)
+    last_error = Column(Text)
+    result = Column(JSONB)
+    dedupe_key = Column(String(255))
+    created_at = Column(DateTime, default=datetime.datetime.utcnow, nullable=False)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        CheckConstraint("status IN ('pending', 'running', 'done', 'failed')", name='check_job_status'),
+    )
@@ -0,0 +1 @@
+from .previews import preview_kind, preview_key, render_preview, PREVIEW_SOURCE_LIMIT
@@ -0,0 +1,98 @@
+import csv
+import io
+import json
+import os
+from typing import Optional, Tuple
+
+# Превью хранятся рядом с файлами в том же хранилище, по хэшу содержимого:
+# одинаковые файлы в разных проектах получают одно превью
+PREVIEW_PREFIX = "previews/"
+PREVIEW_MAX_SIDE = int(os.getenv("PREVIEW_MAX_SIDE", "320"))
+PREVIEW_CSV_ROWS = int(os.getenv("PREVIEW_CSV_ROWS", "20"))
+PREVIEW_CSV_HEAD_BYTES = 64 * 1024
+
+# Сколько байт исходника читаем для построения превью по типу
+PREVIEW_SOURCE_LIMIT = {
+    "image": int(os.getenv("PREVIEW_MAX_IMAGE_BYTES", str(40 * 1024 * 1024))),
+    "pdf": int(os.getenv("PREVIEW_MAX_PDF_BYTES", str(100 * 1024 * 1024))),
+    "csv": PREVIEW_CSV_HEAD_BYTES,
+}
+
+_PREVIEW_TYPES = {"image": "image/png", "pdf": "image/png", "csv": "application/json"}
+
+
+def preview_kind(detected_type: Optional[str], file_name: Optional[str] = None) -> Optional[str]:
+    """Какое превью строим для файла: image, pdf, csv или None"""
+    detected_type = (detected_type or "").lower()
+    if detected_type in ("image/png", "image/jpeg", "image/gif", "image/webp", "image/bmp", "image/tiff"):
+        return "image"
+    if detected_type == "application/pdf":
+        return "pdf"
+    ext = os.path.splitext(file_name or "")[1].lower()
+    if detected_type in ("text/csv", "text/tab-separated-values") or ext in (".csv", ".tsv"):
+        return "csv"
+    return None
+
+
+def preview_key(sha256: str, kind: str) -> Tuple[str, str]:
+    """Ключ объекта превью и его content-type"""
+    ext = "json" if kind == "csv" else "png"
+    return f"{PREVIEW_PREFIX}{sha256[:2]}/{sha256}.{ext}", _PREVIEW_TYPES[kind]
+
+
+def render_preview(kind: str, data: bytes) -> bytes:
+    """
+    Строит превью. Вызывается в пуле процессов воркера, поэтому получает
+    и возвращает только байты. Pillow и PyMuPDF — обязательные зависимости
+    (requirements.txt)
+    """
+    if kind == "image":
+        return _render_image(data)
+    if kind == "pdf":
+        return _render_pdf(data)
+    if kind == "csv":
+        return _render_csv(data)
+    raise ValueError(f"Неизвестный тип превью: {kind}")
+
+
+def _render_image(data: bytes) -> bytes:
+    from PIL import Image
+
+    with Image.open(io.BytesIO(data)) as img:
+        img.draft("RGB", (PREVIEW_MAX_SIDE, PREVIEW_MAX_SIDE))  # быстрый даунскейл для JPEG
+        img = img.convert("RGBA" if img.mode in ("RGBA", "LA", "P") else "RGB")
+        img.thumbnail((PREVIEW_MAX_SIDE, PREVIEW_MAX_SIDE))
+        out = io.BytesIO()
+        img.save(out, format="PNG", optimize=True)
+        return out.getvalue()
+
+
+def _render_pdf(data: bytes) -> bytes:
+    import fitz  # PyMuPDF
+
+    with fitz.open(stream=data, filetype="pdf") as doc:
+        page = doc.load_page(0)
+        zoom = PREVIEW_MAX_SIDE / max(page.rect.width, page.rect.height, 1)
+        pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+        return pix.tobytes("png")
+
+
+def _render_csv(data: bytes) -> bytes:
+    text = data.decode("utf-8-sig", errors="replace")
+    # Последняя строка в отрезанном начале файла может быть неполной
+    if len(data) >= PREVIEW_CSV_HEAD_BYTES and "\n" in text:
+        text = text[:text.rfind("\n")]
+    try:
+        dialect = csv.Sniffer().sniff(text[:4096], delimiters=",;\t|")
+    except csv.Error:
+        dialect = csv.excel
+    rows = []
+    for row in csv.reader(io.StringIO(text), dialect):
+        rows.append(row)
+        if len(rows) > PREVIEW_CSV_ROWS:
+            break
+    preview = {
+        "columns": rows[0] if rows else [],
+        "rows": rows[1:PREVIEW_CSV_ROWS + 1],
+    }
+    return json.dumps(preview, ensure_ascii=False).encode("utf-8")
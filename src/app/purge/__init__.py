@@ -0,0 +1 @@
+from .purge import purge_project
@@ -0,0 +1,144 @@
+import os
+import time
+from typing import Any, Dict
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.jobs.jobs import enqueue_job
+from app.models import Project
+from app.storage import get_storage, StorageBackend
+
+PURGE_BATCH = int(os.getenv("PURGE_BATCH", "1000"))
+# Сколько секунд работает один запуск задачи; потом она ставит продолжение,
+# чтобы не занимать воркер и не держать транзакции надолго
+PURGE_RUN_SECONDS = float(os.getenv("PURGE_RUN_SECONDS", "30"))
+
+
+def _delete_connections_batch(db: Session, project_id: int) -> int:
+    # Триггер цитируемости обновлял бы счётчик на каждую строку — отключаем
+    # его в этой транзакции и уменьшаем счётчики тем же запросом: одним UPDATE
+    # на проект по строкам из DELETE ... RETURNING. Сдвиг, а не пересчёт,
+    # не затирает изменения от параллельно добавляемых связей
+    db.execute(text("SET LOCAL app.skip_citation_trigger = 'on'"))
+    deleted = db.execute(text("""
+        WITH deleted AS (
+            DELETE FROM project_connections
+            WHERE (project_id, related_project_id) IN (
+                SELECT project_id, related_project_id FROM project_connections
+                WHERE project_id = :pid OR related_project_id = :pid
+                LIMIT :batch
+            )
+            RETURNING related_project_id
+        ), decremented AS (
+            UPDATE projects p SET citation_count = greatest(coalesce(p.citation_count, 0) - d.cnt, 0)
+            FROM (
+                SELECT related_project_id, count(*) AS cnt FROM deleted
+                WHERE related_project_id <> :pid
+                GROUP BY related_project_id
+            ) d
+            WHERE p.id = d.related_project_id
+        )
+        SELECT count(*) FROM deleted
+    """), {"pid": project_id, "batch": PURGE_BATCH}).scalar()
+    db.commit()
+    return deleted
+
+
+def _delete_by_ids_batch(db: Session, table: str, select_ids: str, project_id: int) -> int:
+    deleted = db.execute(text(f"""
+        DELETE FROM {table} WHERE id IN ({select_ids} LIMIT :batch)
+    """), {"pid": project_id, "batch": PURGE_BATCH}).rowcount
+    db.commit()
+    return deleted
+
+
+def _delete_files_batch(db: Session, storage: StorageBackend, project_id: int) -> Dict[str, int]:
+    rows = db.execute(text("""
+        SELECT id, coalesce(object_key, name) AS key FROM project_files
+        WHERE project_id = :pid ORDER BY id LIMIT :batch
+    """), {"pid": project_id, "batch": PURGE_BATCH}).all()
+    if not rows:
+        return {"rows": 0, "objects": 0, "failed": 0}
+
+    ids = [r.id for r in rows]
+    # Старые файлы адресуются именем, и под одним именем могут лежать
+    # записи других проектов — такие объекты не трогаем
+    shared = {
+        key for (key,) in db.execute(text("""
+            SELECT DISTINCT coalesce(object_key, name) FROM project_files
+            WHERE coalesce(object_key, name) = ANY(:keys) AND project_id <> :pid
+        """), {"keys": [r.key for r in rows], "pid": project_id}).all()
+    }
+    keys = sorted({r.key for r in rows} - shared)
+
+    failed = storage.delete_many(keys) if keys else []
+    # Неудавшиеся удаления отдаём обычной задаче storage.delete с повторами
+    for key in failed:
+        enqueue_job(db, "storage.delete", {"object_name": key})
+    db.execute(text("DELETE FROM project_files WHERE id = ANY(:ids)"), {"ids": ids})
+    db.commit()
+    return {"rows": len(ids), "objects": len(keys) - len(failed), "failed": len(failed)}
+
+
+def purge_project(db: Session, project_id: int) -> Dict[str, Any]:
+    """
+    Удаляет помеченный удалённым проект порциями по PURGE_BATCH строк:
+    связи, участников, отчёты, файлы (объекты — пакетным удалением
+    хранилища) и саму запись проекта. Каждая порция — отдельная короткая
+    транзакция, поэтому повторный запуск после сбоя просто продолжает работу.
+    Цитируемость проектов, на которые ссылался удаляемый, уменьшается в той же
+    транзакции, что удаляет связи, — в том числе связи, добавленные уже после
+    пометки проекта удалённым.
+    """
+    project = db.query(Project).filter(Project.id == project_id).first()
+    if project is None:
+        return {"skipped": "already purged"}
+    if project.deleted_at is None:
+        return {"skipped": "project is not marked deleted"}
+
+    storage = get_storage()
+    deadline = time.monotonic() + PURGE_RUN_SECONDS
+    stats = {"connections": 0, "team_members": 0, "reports": 0, "files": 0, "objects": 0, "failed_objects": 0}
+
+    def out_of_time() -> bool:
+        return time.monotonic() > deadline
+
+    steps = [
+        ("connections", lambda: _delete_connections_batch(db, project_id)),
+        ("team_members", lambda: _delete_by_ids_batch(
+            db, "team_members", "SELECT id FROM team_members WHERE project_id = :pid", project_id)),
+        ("reports", lambda: _delete_by_ids_batch(
+            db, "reports",
+            "SELECT r.id FROM reports r JOIN project_files f ON f.id = r.file_id WHERE f.project_id = :pid",
+            project_id)),
+    ]
+    for name, step in steps:
+        while True:
+            deleted = step()
+            stats[name] += deleted
+            if deleted < PURGE_BATCH:
+                break
+            if out_of_time():
+                return _continue(db, project_id, stats)
+
+    while True:
+        result = _delete_files_batch(db, storage, project_id)
+        stats["files"] += result["rows"]
+        stats["objects"] += result["objects"]
+        stats["failed_objects"] += result["failed"]
+        if result["rows"] < PURGE_BATCH:
+            break
+        if out_of_time():
+            return _continue(db, project_id, stats)
+
+    db.execute(text("DELETE FROM projects WHERE id = :pid"), {"pid": project_id})
+    db.commit()
+    stats["done"] = True
+    return stats
+
+
+def _continue(db: Session, project_id: int, stats: Dict[str, Any]) -> Dict[str, Any]:
+    enqueue_job(db, "project.purge", {"project_id": project_id})
+    stats["continued"] = True
+    return stats
@@ -0,0 +1 @@
+from .reconcile import reconcile_storage, RECONCILE_RUN_SECONDS
@@ -0,0 +1,19 @@
+# Сверка хранилища с таблицей project_files: python -m app.reconcile [--repair]
+import argparse
+import json
+
+from app.database import SessionLocal
+from app.reconcile import reconcile_storage
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Сверка объектов хранилища с таблицей project_files")
+    parser.add_argument("--repair", action="store_true", help="Удалить лишние объекты и записи без объектов")
+    parser.add_argument("--prefix", default="", help="Проверять только ключи с этим префиксом")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        report = reconcile_storage(db, dry_run=not args.repair, prefix=args.prefix)
+    finally:
+        db.close()
+    print(json.dumps(report, ensure_ascii=False, indent=2, default=str))
@@ -0,0 +1,255 @@
+import datetime
+import os
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import func, literal_column
+from sqlalchemy.orm import Session
+
+from app.jobs.jobs import enqueue_job
+from app.models import ProjectFile
+from app.previews import PREVIEW_PREFIX
+from app.storage import get_storage, ObjectNotFound, StorageBackend
+
+RECONCILE_DB_BATCH = int(os.getenv("RECONCILE_DB_BATCH", "5000"))
+RECONCILE_DELETE_BATCH = int(os.getenv("RECONCILE_DELETE_BATCH", "1000"))
+# Объект пишется в хранилище раньше, чем коммитится запись о нём: свежие
+# объекты без записи не считаем лишними, пока не пройдёт это время
+RECONCILE_GRACE_SECONDS = int(os.getenv("RECONCILE_GRACE_SECONDS", "3600"))
+RECONCILE_SAMPLE = 100
+# Сколько секунд работает один запуск задачи сверки; потом она ставит
+# продолжение с ключа, на котором остановилась
+RECONCILE_RUN_SECONDS = float(os.getenv("RECONCILE_RUN_SECONDS", "60"))
+
+# Служебные префиксы, объекты которых не соответствуют строкам project_files
+SKIP_PREFIXES = (PREVIEW_PREFIX,)
+
+# Ключ объекта, как его вычисляет ProjectFile.storage_key, с побайтовым
+# порядком сортировки — так же упорядочивает ключи S3 (и Python для str)
+_storage_key = func.coalesce(ProjectFile.object_key, ProjectFile.name).collate("C")
+
+
+def _iter_rows(db: Session, prefix: str, batch: int, after_key: Optional[str] = None) -> Iterator[Tuple[str, int]]:
+    """(ключ, id) файлов с ключом больше after_key в порядке ключей, порциями по keyset-пагинации"""
+    last = after_key
+    while True:
+        query = db.query(_storage_key.label("key"), ProjectFile.id)
+        if prefix:
+            query = query.filter(_storage_key >= prefix)
+        if last is not None:
+            query = query.filter(_storage_key > last)
+        rows = query.order_by(literal_column("key")).limit(batch).all()
+        for key, file_id in rows:
+            if prefix and not key.startswith(prefix):
+                return
+            yield key, file_id
+        if len(rows) < batch:
+            return
+        last = rows[-1][0]
+        # Не держим снимок между порциями: сверка может идти долго
+        db.rollback()
+
+
+def _iter_objects(storage: StorageBackend, prefix: str, after_key: Optional[str] = None):
+    for obj in storage.list(prefix=prefix, start_after=after_key):
+        if obj.key.startswith(SKIP_PREFIXES):
+            continue
+        yield obj
+
+
+class _Report:
+    def __init__(self, dry_run: bool):
+        self.dry_run = dry_run
+        self.objects = 0
+        self.rows = 0
+        self.matched = 0
+        self.orphans = 0
+        self.orphan_bytes = 0
+        self.orphans_recent = 0
+        self.missing = 0
+        self.deleted_objects = 0
+        self.deleted_rows = 0
+        self.failed: List[str] = []
+        self.orphan_sample: List[str] = []
+        self.missing_sample: List[Dict[str, Any]] = []
+        self.elapsed = 0.0
+
+    @classmethod
+    def resume(cls, data: Dict[str, Any]) -> "_Report":
+        """Отчёт предыдущих запусков цепочки, к которому добавляется текущий"""
+        report = cls(data["dry_run"])
+        report.objects = data["objects_scanned"]
+        report.rows = data["rows_scanned"]
+        report.matched = data["matched"]
+        report.orphans = data["orphan_objects"]
+        report.orphan_bytes = data["orphan_bytes"]
+        report.orphans_recent = data["orphan_objects_too_recent"]
+        report.missing = data["missing_objects"]
+        report.deleted_objects = data["deleted_objects"]
+        report.deleted_rows = data["deleted_rows"]
+        report.failed = list(data["failed_deletes"])
+        report.orphan_sample = list(data["orphan_sample"])
+        report.missing_sample = list(data["missing_sample"])
+        report.elapsed = data["elapsed_seconds"]
+        return report
+
+    def as_dict(self, elapsed: float) -> Dict[str, Any]:
+        elapsed += self.elapsed
+        return {
+            "dry_run": self.dry_run,
+            "objects_scanned": self.objects,
+            "rows_scanned": self.rows,
+            "matched": self.matched,
+            "orphan_objects": self.orphans,
+            "orphan_bytes": self.orphan_bytes,
+            "orphan_objects_too_recent": self.orphans_recent,
+            "missing_objects": self.missing,
+            "deleted_objects": self.deleted_objects,
+            "deleted_rows": self.deleted_rows,
+            "failed_deletes": self.failed[:RECONCILE_SAMPLE],
+            "orphan_sample": self.orphan_sample,
+            "missing_sample": self.missing_sample,
+            "elapsed_seconds": round(elapsed, 3),
+            "objects_per_second": round(self.objects / elapsed, 1) if elapsed > 0 else None,
+        }
+
+
+def _delete_orphans(db: Session, storage: StorageBackend, keys: List[str], report: _Report) -> None:
+    # Между чтением порции строк и удалением могла закоммититься запись
+    # о только что загруженном файле — перепроверяем одним запросом
+    referenced = {
+        key for (key,) in db.query(_storage_key).filter(_storage_key.in_(keys)).all()
+    }
+    db.rollback()
+    keys = [k for k in keys if k not in referenced]
+    if not keys:
+        return
+    failed = storage.delete_many(keys)
+    report.failed.extend(failed)
+    report.deleted_objects += len(keys) - len(failed)
+
+
+def _delete_dangling(db: Session, storage: StorageBackend, rows: List[Tuple[str, int]], report: _Report) -> None:
+    # Запись удаляем, только если объекта действительно нет (а не пропущен в листинге)
+    ids = []
+    for key, file_id in rows:
+        try:
+            storage.stat(key)
+        except ObjectNotFound:
+            ids.append(file_id)
+    if not ids:
+        return
+    try:
+        report.deleted_rows += db.query(ProjectFile).filter(ProjectFile.id.in_(ids)) \
+            .delete(synchronize_session=False)
+        db.commit()
+    except Exception:
+        # Например, на запись ещё ссылаются отчёты — оставляем её в отчёте сверки
+        db.rollback()
+        report.failed.extend(f"project_files:{file_id}" for file_id in ids)
+
+
+def reconcile_storage(
+        db: Session,
+        dry_run: bool = True,
+        prefix: str = "",
+        storage: Optional[StorageBackend] = None,
+        after_key: Optional[str] = None,
+        previous: Optional[Dict[str, Any]] = None,
+        run_seconds: Optional[float] = None
+) -> Dict[str, Any]:
+    """
+    Сверяет объекты хранилища со строками project_files слиянием двух
+    отсортированных по ключу потоков (листинг бакета и keyset-выборка из БД),
+    поэтому память не зависит от числа объектов.
+
+    Лишние объекты (без записи, старше RECONCILE_GRACE_SECONDS) и записи без
+    объектов попадают в отчёт; при dry_run=False первые удаляются из хранилища,
+    вторые — из таблицы.
+
+    С run_seconds (задача очереди) сверка через это время останавливается на
+    границе ключа и ставит продолжение с after_key = последний полностью
+    сверенный ключ; отчёт (previous) переходит в продолжение, так что
+    результат последней задачи цепочки — итог по всему бакету.
+    """
+    storage = storage or get_storage()
+    report = _Report.resume(previous) if previous else _Report(dry_run)
+    started = time.monotonic()
+    deadline = started + run_seconds if run_seconds is not None else None
+    grace_border = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(seconds=RECONCILE_GRACE_SECONDS)
+
+    orphan_batch: List[str] = []
+    missing_batch: List[Tuple[str, int]] = []
+
+    def flush(final: bool = False):
+        if dry_run:
+            orphan_batch.clear()
+            missing_batch.clear()
+            return
+        if orphan_batch and (final or len(orphan_batch) >= RECONCILE_DELETE_BATCH):
+            _delete_orphans(db, storage, list(orphan_batch), report)
+            orphan_batch.clear()
+        if missing_batch and (final or len(missing_batch) >= RECONCILE_DELETE_BATCH):
+            _delete_dangling(db, storage, list(missing_batch), report)
+            missing_batch.clear()
+
+    def on_orphan(obj):
+        modified = obj.last_modified
+        if modified is not None and modified.tzinfo is None:
+            modified = modified.replace(tzinfo=datetime.timezone.utc)
+        if modified is not None and modified > grace_border:
+            report.orphans_recent += 1
+            return
+        report.orphans += 1
+        report.orphan_bytes += obj.size or 0
+        if len(report.orphan_sample) < RECONCILE_SAMPLE:
+            report.orphan_sample.append(obj.key)
+        orphan_batch.append(obj.key)
+        flush()
+
+    def on_missing(key, file_id):
+        report.missing += 1
+        if len(report.missing_sample) < RECONCILE_SAMPLE:
+            report.missing_sample.append({"file_id": file_id, "key": key})
+        missing_batch.append((key, file_id))
+        flush()
+
+    objects = _iter_objects(storage, prefix, after_key)
+    rows = _iter_rows(db, prefix, RECONCILE_DB_BATCH, after_key)
+    obj = next(objects, None)
+    row = next(rows, None)
+    obj_matched = False  # на один объект могут ссылаться несколько старых записей (ключ = имя файла)
+    while obj is not None or row is not None:
+        # Ключ, до которого включительно сверены оба потока (None — ещё не граница)
+        boundary: Optional[str] = None
+        if obj is not None and (row is None or obj.key < row[0]):
+            report.objects += 1
+            if not obj_matched:
+                on_orphan(obj)
+            boundary = obj.key
+            obj = next(objects, None)
+            obj_matched = False
+        elif obj is None or row[0] < obj.key:
+            report.rows += 1
+            on_missing(*row)
+            key = row[0]
+            row = next(rows, None)
+            if row is None or row[0] != key:
+                boundary = key
+        else:
+            report.rows += 1
+            report.matched += 1
+            obj_matched = True
+            row = next(rows, None)
+
+        if boundary is not None and deadline is not None and time.monotonic() > deadline \
+                and (obj is not None or row is not None):
+            flush(final=True)
+            result = report.as_dict(time.monotonic() - started)
+            enqueue_job(db, "storage.reconcile", {
+                "dry_run": dry_run, "prefix": prefix, "after_key": boundary, "report": result
+            }, max_attempts=1)
+            return {**result, "after_key": boundary, "continued": True}
+    flush(final=True)
+
+    return {**report.as_dict(time.monotonic() - started), "done": True}
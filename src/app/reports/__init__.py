@@ -0,0 +1,2 @@
+from .engine import build_table, table_kind, ReportError
+from .reports import build_report, report_summary, report_rows, REPORT_SORT_DIRECTIONS
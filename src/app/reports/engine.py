@@ -0,0 +1,337 @@
+import csv
+import datetime
+import io
+import math
+import os
+import tempfile
+from typing import Any, Dict, Iterator, List, Optional
+
+try:
+    import numpy as np
+    import pandas as pd
+except ImportError:  # отчёты необязательны: без pandas задача построения пропускается
+    np = None
+    pd = None
+
+# Разбор идёт порциями по REPORT_CHUNK_ROWS строк; агрегаты считаются по всем
+# строкам, а в reports.table_data сохраняются не больше REPORT_MAX_ROWS строк
+REPORT_CHUNK_ROWS = int(os.getenv("REPORT_CHUNK_ROWS", "50000"))
+REPORT_MAX_ROWS = int(os.getenv("REPORT_MAX_ROWS", "200000"))
+REPORT_MAX_COLUMNS = int(os.getenv("REPORT_MAX_COLUMNS", "500"))
+REPORT_MAX_GROUPS = int(os.getenv("REPORT_MAX_GROUPS", "10000"))
+# XLSX — ZIP-архив, openpyxl нужен файл с произвольным доступом: до этого
+# размера держим его в памяти, больше — во временном файле
+REPORT_SPOOL_BYTES = 32 * 1024 * 1024
+REPORT_SNIFF_BYTES = 64 * 1024
+
+_XLSX_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+class ReportError(ValueError):
+    """Файл нельзя разобрать как таблицу или параметры отчёта неверны"""
+
+
+def table_kind(detected_type: Optional[str], file_name: Optional[str] = None) -> Optional[str]:
+    """Формат таблицы: csv, tsv, xlsx или None, если файл не табличный"""
+    ext = os.path.splitext(file_name or "")[1].lower()
+    if detected_type == _XLSX_TYPE or ext == ".xlsx":
+        return "xlsx"
+    if detected_type == "text/tab-separated-values" or ext == ".tsv":
+        return "tsv"
+    if detected_type == "text/csv" or ext == ".csv":
+        return "csv"
+    return None
+
+
+class _PrefixedReader(io.RawIOBase):
+    # Уже прочитанное начало потока (для определения разделителя) + остаток
+    def __init__(self, head: bytes, stream):
+        self._head = head
+        self._stream = stream
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        if self._head:
+            n = min(len(b), len(self._head))
+            b[:n] = self._head[:n]
+            self._head = self._head[n:]
+            return n
+        data = self._stream.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+
+def _sniff_delimiter(head: bytes) -> str:
+    sample = head.decode("utf-8", errors="ignore")
+    # Последняя строка образца может быть обрезана
+    sample = sample[:sample.rfind("\n")] if "\n" in sample else sample
+    try:
+        return csv.Sniffer().sniff(sample, delimiters=",;\t|").delimiter
+    except csv.Error:
+        return ","
+
+
+def _csv_chunks(stream, delimiter: Optional[str]) -> Iterator["pd.DataFrame"]:
+    head = stream.read(REPORT_SNIFF_BYTES)
+    if not delimiter:
+        delimiter = _sniff_delimiter(head)
+    reader = pd.read_csv(
+        io.BufferedReader(_PrefixedReader(head, stream)),
+        sep=delimiter,
+        dtype=str,
+        encoding="utf-8-sig",
+        encoding_errors="replace",
+        skipinitialspace=True,
+        chunksize=REPORT_CHUNK_ROWS,
+    )
+    with reader:
+        yield from reader
+
+
+def _cell_text(value: Any) -> Optional[str]:
+    # Ячейки приводятся к строкам, как в CSV: дальше обе ветки разбираются одинаково
+    if value is None:
+        return None
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    return str(value)
+
+
+def _xlsx_chunks(stream, sheet: Optional[str]) -> Iterator["pd.DataFrame"]:
+    try:
+        import openpyxl
+    except ImportError as e:
+        raise ReportError("Для отчётов по XLSX нужен пакет openpyxl") from e
+
+    # SpooledTemporaryFile не годится: до Python 3.11 у него нет seekable(),
+    # без которого zipfile внутри openpyxl не открывает архив
+    head = stream.read(REPORT_SPOOL_BYTES + 1)
+    spool = io.BytesIO(head) if len(head) <= REPORT_SPOOL_BYTES else tempfile.TemporaryFile()
+    with spool:
+        if not isinstance(spool, io.BytesIO):
+            spool.write(head)
+            del head
+            while True:
+                block = stream.read(1024 * 1024)
+                if not block:
+                    break
+                spool.write(block)
+        spool.seek(0)
+        workbook = openpyxl.load_workbook(spool, read_only=True, data_only=True)
+        try:
+            if sheet and sheet not in workbook.sheetnames:
+                raise ReportError(f"Нет листа '{sheet}'")
+            worksheet = workbook[sheet] if sheet else workbook.worksheets[0]
+            rows = worksheet.iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                return
+            columns = [str(c) if c is not None else f"column_{i + 1}" for i, c in enumerate(header)]
+            batch: List[List[Optional[str]]] = []
+            for row in rows:
+                cells = [_cell_text(v) for v in row[:len(columns)]]
+                cells.extend([None] * (len(columns) - len(cells)))
+                batch.append(cells)
+                if len(batch) == REPORT_CHUNK_ROWS:
+                    yield pd.DataFrame(batch, columns=columns, dtype=object)
+                    batch = []
+            if batch:
+                yield pd.DataFrame(batch, columns=columns, dtype=object)
+        finally:
+            workbook.close()
+
+
+class _ColumnStats:
+    """Агрегаты столбца, сливаемые по порциям"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.count = 0
+        self.nulls = 0
+        self.non_numeric = 0
+        self.numeric_count = 0
+        self.sum = 0.0
+        self.sum_sq = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+
+    def update(self, present: "pd.Series", numbers: "pd.Series") -> None:
+        present_count = int(present.sum())
+        self.count += present_count
+        self.nulls += len(present) - present_count
+        self.non_numeric += int((present & numbers.isna()).sum())
+        valid = numbers.dropna()
+        if len(valid):
+            self.numeric_count += len(valid)
+            self.sum += float(valid.sum())
+            self.sum_sq += float((valid * valid).sum())
+            low, high = float(valid.min()), float(valid.max())
+            self.min = low if self.min is None else min(self.min, low)
+            self.max = high if self.max is None else max(self.max, high)
+
+    @property
+    def numeric(self) -> bool:
+        return self.numeric_count > 0 and self.non_numeric == 0
+
+    def result(self) -> Dict[str, Any]:
+        result: Dict[str, Any] = {
+            "name": self.name,
+            "type": "number" if self.numeric else "text",
+            "count": self.count,
+            "nulls": self.nulls,
+        }
+        if self.numeric:
+            mean = self.sum / self.numeric_count
+            variance = max(self.sum_sq / self.numeric_count - mean * mean, 0.0)
+            result.update({
+                "sum": self.sum,
+                "mean": mean,
+                "std": math.sqrt(variance),
+                "min": self.min,
+                "max": self.max,
+            })
+        return result
+
+
+def _to_numbers(values: "pd.Series") -> "pd.Series":
+    numbers = pd.to_numeric(values, errors="coerce")
+    # inf/-inf не сериализуются в JSON — считаем их пустыми
+    return numbers.where(np.isfinite(numbers))
+
+
+def _json_rows(frame: "pd.DataFrame") -> List[List[Any]]:
+    # NaN -> null
+    frame = frame.astype(object).where(frame.notna(), None)
+    return frame.values.tolist()
+
+
+class _GroupAggregator:
+    """Группировка по столбцам group_by с суммами/минимумами/максимумами по столбцам aggregate"""
+
+    def __init__(self, group_by: List[str], aggregate: List[str]):
+        self.group_by = group_by
+        self.aggregate = aggregate
+        self._partial: Optional["pd.DataFrame"] = None
+
+    def update(self, keys: "pd.DataFrame", numbers: "pd.DataFrame") -> None:
+        frame = pd.concat([keys, numbers], axis=1)
+        grouped = frame.groupby(self.group_by, dropna=False, sort=False)
+        partial = grouped[self.aggregate].agg(["count", "sum", "min", "max"])
+        partial[("__rows__", "count")] = grouped.size()
+        if self._partial is not None:
+            partial = pd.concat([self._partial, partial])
+            partial = partial.groupby(level=list(range(len(self.group_by))), dropna=False, sort=False).agg(
+                {(column, stat): ("sum" if stat in ("count", "sum") else stat) for column, stat in partial.columns}
+            )
+        if len(partial) > REPORT_MAX_GROUPS:
+            raise ReportError(f"Больше {REPORT_MAX_GROUPS} групп — уточните group_by")
+        self._partial = partial
+
+    def result(self) -> List[Dict[str, Any]]:
+        if self._partial is None:
+            return []
+        groups = []
+        for key, row in self._partial.sort_values(("__rows__", "count"), ascending=False).iterrows():
+            key = key if isinstance(key, tuple) else (key,)
+            group: Dict[str, Any] = {
+                "key": [None if pd.isna(k) else k for k in key],
+                "rows": int(row[("__rows__", "count")]),
+                "values": {},
+            }
+            for column in self.aggregate:
+                count = int(row[(column, "count")])
+                stats: Dict[str, Any] = {"count": count}
+                if count:
+                    total = float(row[(column, "sum")])
+                    stats.update({
+                        "sum": total,
+                        "mean": total / count,
+                        "min": float(row[(column, "min")]),
+                        "max": float(row[(column, "max")]),
+                    })
+                group["values"][column] = stats
+            groups.append(group)
+        return groups
+
+
+def build_table(stream, kind: str, view_options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Разбирает таблицу из потока порциями и возвращает документ для
+    reports.table_data: описание и агрегаты столбцов, строки (не больше
+    REPORT_MAX_ROWS, значения числовых столбцов — числами) и, если в
+    view_options заданы group_by/aggregate, агрегаты по группам.
+    Все вычисления по порции векторные (pandas), целиком файл в памяти не держится.
+    """
+    if pd is None:
+        raise ReportError("Для построения отчётов нужен пакет pandas")
+    options = view_options or {}
+    group_by = list(options.get("group_by") or [])
+    aggregate = list(options.get("aggregate") or [])
+
+    if kind == "xlsx":
+        chunks = _xlsx_chunks(stream, options.get("sheet"))
+    else:
+        chunks = _csv_chunks(stream, "\t" if kind == "tsv" else options.get("delimiter"))
+
+    columns: Optional[List[str]] = None
+    stats: List[_ColumnStats] = []
+    groups: Optional[_GroupAggregator] = None
+    # Строки копятся текстом: тип столбца известен только после всех порций
+    stored: List["pd.DataFrame"] = []
+    stored_rows = 0
+    row_count = 0
+
+    for chunk in chunks:
+        if columns is None:
+            columns = [str(c) for c in chunk.columns]
+            if len(columns) > REPORT_MAX_COLUMNS:
+                raise ReportError(f"Больше {REPORT_MAX_COLUMNS} столбцов")
+            missing = [c for c in group_by + aggregate if c not in columns]
+            if missing:
+                raise ReportError(f"Нет столбцов: {', '.join(missing)}")
+            if set(group_by) & set(aggregate):
+                raise ReportError("Столбец не может быть одновременно в group_by и aggregate")
+            stats = [_ColumnStats(c) for c in columns]
+            if group_by:
+                groups = _GroupAggregator(group_by, aggregate)
+        chunk.columns = columns
+
+        # Пустые строки и строки из пробелов считаются отсутствующими значениями
+        values = chunk.apply(lambda s: s.str.strip())
+        values = values.where(values.notna() & (values != ""))
+        present = values.notna()
+        numbers = values.apply(_to_numbers)
+        for i, column in enumerate(columns):
+            stats[i].update(present.iloc[:, i], numbers.iloc[:, i])
+
+        if groups is not None:
+            groups.update(values[group_by], numbers[aggregate])
+
+        if stored_rows < REPORT_MAX_ROWS:
+            part = values.iloc[:REPORT_MAX_ROWS - stored_rows]
+            stored.append(part)
+            stored_rows += len(part)
+        row_count += len(chunk)
+
+    rows: List[List[Any]] = []
+    if stored:
+        frame = pd.concat(stored, ignore_index=True)
+        # Числами сохраняются только значения числовых столбцов, остальные — строками как есть
+        for i, column_stats in enumerate(stats):
+            if column_stats.numeric:
+                frame.iloc[:, i] = _to_numbers(frame.iloc[:, i])
+        rows = _json_rows(frame)
+
+    table: Dict[str, Any] = {
+        "columns": [s.result() for s in stats],
+        "row_count": row_count,
+        "stored_rows": len(rows),
+        "truncated": row_count > len(rows),
+        "rows": rows,
+    }
+    if groups is not None:
+        table["group_by"] = group_by
+        table["groups"] = groups.result()
+    return table
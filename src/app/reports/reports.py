@@ -0,0 +1,110 @@
+import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.models import ProjectFile, Report
+from app.reports.engine import build_table, table_kind, ReportError
+
+REPORT_SORT_DIRECTIONS = {"asc": "ASC", "desc": "DESC"}
+
+
+def build_report(db: Session, report: Report, open_source: Callable[[], Any]) -> Dict[str, Any]:
+    """
+    Строит отчёт по табличному файлу и сохраняет результат в reports.table_data.
+    Если содержимое файла не изменилось с прошлой сборки, ничего не делает.
+    open_source() должен вернуть поток с исходным содержимым файла.
+    Ошибки разбора переводят отчёт в статус failed (без повторов задачи).
+    """
+    pf = db.query(ProjectFile).filter(ProjectFile.id == report.file_id).first()
+    if pf is None:
+        return {"skipped": "file deleted"}
+    metadata = pf.file_metadata or {}
+    sha256 = metadata.get("sha256")
+    if report.status == "ready" and sha256 and report.source_sha256 == sha256:
+        return {"skipped": "unchanged"}
+
+    kind = table_kind(metadata.get("detected_type"), pf.name)
+    try:
+        if kind is None:
+            raise ReportError("Файл не является таблицей CSV, TSV или XLSX")
+        # Ошибки хранилища пробрасываются — задача повторится
+        stream = open_source()
+        try:
+            table = build_table(stream, kind, report.view_options)
+        except ReportError:
+            raise
+        except Exception as e:
+            # Непредвиденная ошибка разбора повторами не лечится: файл тот же
+            raise ReportError(f"Не удалось разобрать файл: {type(e).__name__}: {e}") from e
+        finally:
+            stream.close()
+            if hasattr(stream, "release_conn"):
+                stream.release_conn()
+    except ReportError as e:
+        report.status = "failed"
+        report.error = str(e)
+        report.updated_at = datetime.datetime.utcnow()
+        return {"failed": str(e)}
+
+    report.table_data = table
+    report.row_count = table["row_count"]
+    report.source_sha256 = sha256
+    report.status = "ready"
+    report.error = None
+    report.updated_at = datetime.datetime.utcnow()
+    return {"rows": table["row_count"], "stored_rows": table["stored_rows"], "columns": len(table["columns"])}
+
+
+def report_summary(db: Session, report_id: int) -> Optional[Dict[str, Any]]:
+    """table_data без строк таблицы: столбцы с агрегатами, группы, счётчики"""
+    return db.execute(
+        text("SELECT table_data - 'rows' FROM reports WHERE id = :id"), {"id": report_id}
+    ).scalar()
+
+
+def report_rows(
+        db: Session,
+        report_id: int,
+        offset: int,
+        limit: int,
+        sort: Optional[str] = None,
+        order: str = "asc"
+) -> Dict[str, Any]:
+    """
+    Страница строк таблицы отчёта. Строки выбираются из JSONB на стороне
+    PostgreSQL: без сортировки — срезом jsonpath $.rows[lo to hi], с сортировкой —
+    через jsonb_array_elements; документ целиком в Python не загружается.
+    sort — имя столбца; пустые значения идут последними.
+    """
+    meta = db.execute(text("""
+        SELECT jsonb_path_query_array(table_data, '$.columns[*].name') AS columns,
+               coalesce((table_data->>'stored_rows')::bigint, 0) AS stored_rows
+        FROM reports WHERE id = :id
+    """), {"id": report_id}).mappings().first()
+    columns: List[str] = meta["columns"] or []
+    total = meta["stored_rows"]
+    page = {"columns": columns, "total": total, "offset": offset, "rows": []}
+    if offset >= total:
+        return page
+
+    if sort is None:
+        page["rows"] = list(db.execute(text("""
+            SELECT jsonb_path_query(table_data, '$.rows[$lo to $hi]', jsonb_build_object('lo', :lo, 'hi', :hi))
+            FROM reports WHERE id = :id
+        """), {"id": report_id, "lo": offset, "hi": offset + limit - 1}).scalars())
+        return page
+
+    if sort not in columns:
+        raise ReportError(f"Нет столбца '{sort}'")
+    direction = REPORT_SORT_DIRECTIONS[order]
+    page["rows"] = list(db.execute(text(f"""
+        SELECT t.row
+        FROM reports r
+        CROSS JOIN LATERAL jsonb_array_elements(r.table_data->'rows') WITH ORDINALITY AS t(row, ord)
+        WHERE r.id = :id
+        ORDER BY jsonb_typeof(t.row->:col) = 'null', t.row->:col {direction}, t.ord
+        LIMIT :limit OFFSET :offset
+    """), {"id": report_id, "col": columns.index(sort), "limit": limit, "offset": offset}).scalars())
+    return page
@@ -1,8 +1,15 @@
 from .schemas import (
     UserCreate, UserRead,
-    ProjectCreate, ProjectRead,
-    SubjectAreaCreate, SubjectAreaRead,
+    ProjectCreate, ProjectRead, SimilarProject,
+    DuplicateCandidate, DuplicateCheck, ProjectCreateResult, DuplicateCluster,
+    ReportCreate, ReportRead, ReportDetail, ReportRows,
+    SubjectAreaCreate, SubjectAreaRead, SubjectAreaNode, SubjectAreaStats,
     ProjectConnectionCreate, ProjectConnectionRead,
+    GraphNode, GraphNeighbourhood, GraphPath, GraphComponent,
     TeamMemberCreate, TeamMemberRead,
-    ProjectFileCreate, ProjectFileRead
+    ProjectFileCreate, ProjectFileRead, ProjectFileUpdate,
+    JobRead, JobQueueStats,
+    ProjectsWeeklyRow, UploadsMonthlyRow, TeamGrowthRow, AnalyticsRefresh,
+    KeywordCount, KeywordTrend,
+    FileSearchHit, ProjectSearchHit, FileSearchResult
 )
\ No newline at end of file
@@ -38,34 +38,83 @@ class ProjectBase(BaseModel):
     subject_area_id: Optional[int]
     is_public: Optional[bool] = False
 
+# Больше слов не принимаем: статистика пар ключевых слов растёт как k² на проект
+MAX_PROJECT_KEYWORDS = 50
+
 class ProjectCreate(ProjectBase):
-    pass
+    keywords: List[str] = Field(..., max_length=MAX_PROJECT_KEYWORDS)
 
 class ProjectRead(ProjectBase):
     id: int
     citation_count: Optional[int]
+    pagerank: Optional[float] = None
     created_at: datetime.datetime
 
     model_config = {
         "from_attributes": True
     }
 
+class SimilarProject(BaseModel):
+    project: ProjectRead
+    similarity: float  # оценка коэффициента Жаккара по MinHash, 0..1
+    shared_bands: int  # в скольких полосах LSH совпали сигнатуры
+
+# --- Поиск дублей проектов ---
+class DuplicateCandidate(BaseModel):
+    id: int
+    title: str
+    status: str
+    title_similarity: float  # триграммное сходство названий, 0..1
+    keyword_similarity: float  # коэффициент Жаккара по ключевым словам, 0..1
+
+class DuplicateCheck(BaseModel):
+    candidates: List[DuplicateCandidate]
+    complete: bool  # false — проверка не уложилась в бюджет времени
+
+class ProjectCreateResult(ProjectRead):
+    # Предупреждение о вероятных дублях; проект создаётся в любом случае
+    duplicate_candidates: List[DuplicateCandidate] = []
+    duplicate_check_complete: bool = True
+
+class DuplicateClusterMember(BaseModel):
+    id: int
+    title: Optional[str]
+
+class DuplicateCluster(BaseModel):
+    size: int
+    max_title_similarity: float
+    projects: List[DuplicateClusterMember]
+
 # --- Report ---
-# class ReportBase(BaseModel):
-#     file_id: int
-#     table_data: Dict[str, Any]
-#     view_options: Optional[Dict[str, Any]]
-#
-# class ReportCreate(ReportBase):
-#     pass
-#
-# class ReportRead(ReportBase):
-#     id: int
-#     created_at: datetime.datetime
-#
-#     model_config = {
-#         "from_attributes": True
-#     }
+class ReportBase(BaseModel):
+    file_id: int
+    # Параметры сборки: group_by и aggregate (списки столбцов), delimiter для CSV, sheet для XLSX
+    view_options: Optional[Dict[str, Any]] = None
+
+class ReportCreate(ReportBase):
+    pass
+
+class ReportRead(ReportBase):
+    id: int
+    status: str
+    error: Optional[str]
+    row_count: Optional[int]
+    created_at: datetime.datetime
+    updated_at: datetime.datetime
+
+    model_config = {
+        "from_attributes": True
+    }
+
+class ReportDetail(ReportRead):
+    # table_data без строк: столбцы с агрегатами, группы, число строк
+    summary: Optional[Dict[str, Any]] = None
+
+class ReportRows(BaseModel):
+    columns: List[str]
+    total: int  # сохранённых строк (не больше REPORT_MAX_ROWS)
+    offset: int
+    rows: List[List[Any]]
 
 # --- SubjectArea ---
 class SubjectAreaBase(BaseModel):
@@ -77,10 +126,20 @@ class SubjectAreaBase(BaseModel):
 class SubjectAreaCreate(SubjectAreaBase):
     pass
 
+class SubjectAreaStats(BaseModel):
+    # Число проектов по статусам: active — "в работе", paused — "приостановлен", completed — "завершен"
+    total: int
+    active: int
+    paused: int
+    completed: int
+
 class SubjectAreaRead(SubjectAreaBase):
     id: int
     created_at: datetime.datetime
     path: Optional[str]  # воспринимаем ltree как строку
+    # Заполняются при with_stats=true: проекты самой области и всего её поддерева
+    own_stats: Optional[SubjectAreaStats] = None
+    subtree_stats: Optional[SubjectAreaStats] = None
 
     model_config = {
         "arbitrary_types_allowed": True,
@@ -92,6 +151,19 @@ class SubjectAreaRead(SubjectAreaBase):
     def ltree_to_str(cls, v):
         return str(v) if v is not None else v
 
+class SubjectAreaNode(BaseModel):
+    # Узел дерева GET /subject_areas/tree
+    id: int
+    name: str
+    description: Optional[str]
+    user_id: int
+    parent_id: Optional[int]
+    created_at: datetime.datetime
+    path: str
+    own_stats: Optional[SubjectAreaStats] = None
+    subtree_stats: Optional[SubjectAreaStats] = None
+    children: List["SubjectAreaNode"] = []
+
 # --- ProjectConnection ---
 class ProjectConnectionBase(BaseModel):
     project_id: int
@@ -107,6 +179,37 @@ class ProjectConnectionRead(ProjectConnectionBase):
         "from_attributes": True
     }
 
+# --- Граф связей проектов ---
+class GraphNode(BaseModel):
+    id: int
+    title: str
+    status: str
+    is_public: bool
+    citation_count: Optional[int]
+    distance: Optional[int] = None  # число шагов от исходного проекта
+
+    model_config = {
+        "from_attributes": True
+    }
+
+class GraphNeighbourhood(BaseModel):
+    root_id: int
+    nodes: List[GraphNode]
+    edges: List[List[int]]  # [project_id, related_project_id] между возвращёнными проектами
+    truncated: bool
+
+class GraphPath(BaseModel):
+    source_id: int
+    target_id: int
+    length: int
+    path: List[Optional[GraphNode]]  # недоступные пользователю проекты скрыты (null)
+
+class GraphComponent(BaseModel):
+    root_id: int
+    size: int
+    nodes: List[GraphNode]
+    truncated: bool
+
 # --- TeamMember ---
 class TeamMemberBase(BaseModel):
     project_id: int
@@ -136,6 +239,11 @@ class ProjectFileBase(BaseModel):
 class ProjectFileCreate(ProjectFileBase):
     pass
 
+class ProjectFileUpdate(BaseModel):
+    # Только метаданные: содержимое файла заменяется через PUT /project_files/{file_id}
+    name: Optional[str] = None
+    is_public: Optional[bool] = None
+
 class ProjectFileRead(ProjectFileBase):
     id: int
     uploaded_at: datetime.datetime
@@ -143,3 +251,79 @@ class ProjectFileRead(ProjectFileBase):
     model_config = {
         "from_attributes": True
     }
+
+# --- Job (фоновая очередь) ---
+class JobRead(BaseModel):
+    id: int
+    kind: str
+    payload: Dict[str, Any]
+    status: str
+    attempts: int
+    max_attempts: int
+    run_at: datetime.datetime
+    last_error: Optional[str]
+    result: Optional[Dict[str, Any]] = None
+    created_at: datetime.datetime
+    updated_at: datetime.datetime
+
+    model_config = {
+        "from_attributes": True
+    }
+
+class JobQueueStats(BaseModel):
+    totals: Dict[str, int]
+    by_kind: Dict[str, Dict[str, int]]
+    oldest_pending_age_seconds: Optional[float]
+    recent_failures: List[JobRead]
+
+# --- Аналитика ---
+class ProjectsWeeklyRow(BaseModel):
+    week: datetime.date  # понедельник недели
+    status: str
+    subject_area_id: Optional[int] = None
+    projects: int
+
+class UploadsMonthlyRow(BaseModel):
+    month: datetime.date  # первое число месяца
+    project_id: int
+    files: int
+    bytes: int
+
+class TeamGrowthRow(BaseModel):
+    week: datetime.date
+    joined: int
+    total: int  # участников, пришедших до конца недели включительно
+
+class AnalyticsRefresh(BaseModel):
+    view_name: str
+    refreshed_at: datetime.datetime
+    seconds: float
+
+# --- Ключевые слова ---
+class KeywordCount(BaseModel):
+    keyword: str
+    projects: int
+
+class KeywordTrend(BaseModel):
+    keyword: str
+    projects: int  # проектов, созданных в месяце
+    previous: int  # то же за предыдущий месяц
+    growth: int
+
+# --- Полнотекстовый поиск по файлам ---
+class FileSearchHit(BaseModel):
+    file: ProjectFileRead
+    project_title: str
+    excerpt: Optional[str]
+    rank: float
+
+class ProjectSearchHit(BaseModel):
+    project_id: int
+    title: str
+    matched_files: int
+    best_rank: float
+
+class FileSearchResult(BaseModel):
+    files: List[FileSearchHit]
+    projects: List[ProjectSearchHit]
+
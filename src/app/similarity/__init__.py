@@ -0,0 +1,4 @@
+from .similarity import (
+    project_features, minhash_signature, index_project, similar_projects, reindex_projects,
+    SIMILARITY_BACKFILL_BATCH
+)
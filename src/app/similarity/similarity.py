@@ -0,0 +1,200 @@
+import datetime
+import hashlib
+import os
+import random
+import re
+import struct
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import delete, select, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from app.models import Project, ProjectLshBucket, ProjectMinhash
+
+# Сигнатура — SIMILARITY_BANDS полос по SIMILARITY_ROWS значений MinHash.
+# При 16 x 4 проекты с оценкой Жаккара от ~0.5 почти наверняка попадают
+# в общую корзину хотя бы одной полосы. После смены параметров индекс нужно
+# перестроить (POST /admin/similarity/reindex).
+SIMILARITY_BANDS = int(os.getenv("SIMILARITY_BANDS", "16"))
+SIMILARITY_ROWS = int(os.getenv("SIMILARITY_ROWS", "4"))
+SIMILARITY_NUM_PERM = SIMILARITY_BANDS * SIMILARITY_ROWS
+# Сколько проектов берём из одной корзины: корзины популярных ключевых слов
+# бывают огромными, а для подсказок достаточно их начала
+SIMILARITY_BUCKET_FANOUT = int(os.getenv("SIMILARITY_BUCKET_FANOUT", "200"))
+SIMILARITY_MAX_CANDIDATES = int(os.getenv("SIMILARITY_MAX_CANDIDATES", "500"))
+SIMILARITY_MAX_TEXT_CHARS = int(os.getenv("SIMILARITY_MAX_TEXT_CHARS", "20000"))
+SIMILARITY_BACKFILL_BATCH = int(os.getenv("SIMILARITY_BACKFILL_BATCH", "1000"))
+
+_PRIME = (1 << 61) - 1
+_MASK32 = 0xFFFFFFFF
+# Фиксированное зерно: сигнатуры, посчитанные в разных процессах, сравнимы
+_rng = random.Random(0x5EED)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(SIMILARITY_NUM_PERM)]
+_SIGNATURE_FORMAT = f"<{SIMILARITY_NUM_PERM}I"
+
+_WORD_RE = re.compile(r"\w+")
+_MIN_WORD_LEN = 3  # короткие слова — в основном предлоги и союзы
+
+
+def _words(value: Optional[str]) -> List[str]:
+    value = (value or "")[:SIMILARITY_MAX_TEXT_CHARS].lower()
+    return [w for w in _WORD_RE.findall(value) if len(w) >= _MIN_WORD_LEN and not w.isdigit()]
+
+
+def project_features(title: Optional[str], description: Optional[str], keywords: Optional[Iterable[Any]]) -> Set[str]:
+    """
+    Множество признаков проекта: ключевые слова целиком, слова названия
+    и пары соседних слов (шинглы) названия и описания
+    """
+    features = set()
+    for keyword in keywords or []:
+        keyword = str(keyword).strip().lower()
+        if keyword:
+            features.add("k:" + keyword)
+    title_words = _words(title)
+    features.update("t:" + w for w in title_words)
+    for words in (title_words, _words(description)):
+        features.update(f"s:{a} {b}" for a, b in zip(words, words[1:]))
+    return features
+
+
+def minhash_signature(features: Iterable[str]) -> Tuple[int, ...]:
+    """MinHash множества признаков: минимум каждой из SIMILARITY_NUM_PERM хэш-функций"""
+    signature = [_PRIME] * SIMILARITY_NUM_PERM
+    for feature in features:
+        x = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+        for i, (a, b) in enumerate(_PERMUTATIONS):
+            h = (a * x + b) % _PRIME
+            if h < signature[i]:
+                signature[i] = h
+    # Храним младшие 32 бита: 4 байта на значение, сравнимость сохраняется
+    return tuple(v & _MASK32 for v in signature)
+
+
+def pack_signature(signature: Tuple[int, ...]) -> bytes:
+    return struct.pack(_SIGNATURE_FORMAT, *signature)
+
+
+def unpack_signature(data: bytes) -> Tuple[int, ...]:
+    return struct.unpack(_SIGNATURE_FORMAT, data)
+
+
+def lsh_buckets(signature: Tuple[int, ...]) -> List[Tuple[int, int]]:
+    """(номер полосы, корзина) для каждой полосы сигнатуры; корзина — 64-битный хэш полосы"""
+    buckets = []
+    for band in range(SIMILARITY_BANDS):
+        chunk = signature[band * SIMILARITY_ROWS:(band + 1) * SIMILARITY_ROWS]
+        digest = hashlib.blake2b(struct.pack(f"<{SIMILARITY_ROWS}I", *chunk), digest_size=8).digest()
+        buckets.append((band, int.from_bytes(digest, "little", signed=True)))
+    return buckets
+
+
+def estimate_similarity(a: Tuple[int, ...], b: Tuple[int, ...]) -> float:
+    """Оценка коэффициента Жаккара по доле совпавших значений MinHash"""
+    return sum(1 for x, y in zip(a, b) if x == y) / SIMILARITY_NUM_PERM
+
+
+def index_project(db: Session, project: Project) -> bool:
+    """
+    Обновляет сигнатуру и корзины LSH проекта в текущей транзакции (коммитит
+    вызывающий). Если сигнатура не изменилась, ничего не пишет; возвращает,
+    была ли запись.
+    """
+    features = project_features(project.title, project.description, project.keywords)
+    current = db.get(ProjectMinhash, project.id)
+    if not features:
+        if current is None:
+            return False
+        db.execute(delete(ProjectLshBucket).where(ProjectLshBucket.project_id == project.id))
+        db.delete(current)
+        return True
+
+    packed = pack_signature(minhash_signature(features))
+    if current is not None and current.signature == packed:
+        return False
+
+    db.execute(delete(ProjectLshBucket).where(ProjectLshBucket.project_id == project.id))
+    db.execute(
+        insert(ProjectMinhash)
+        .values(project_id=project.id, signature=packed, features=len(features), updated_at=datetime.datetime.utcnow())
+        .on_conflict_do_update(
+            index_elements=[ProjectMinhash.project_id],
+            set_={"signature": packed, "features": len(features), "updated_at": datetime.datetime.utcnow()},
+        )
+    )
+    db.execute(insert(ProjectLshBucket), [
+        {"band": band, "bucket": bucket, "project_id": project.id}
+        for band, bucket in lsh_buckets(unpack_signature(packed))
+    ])
+    if current is not None:
+        db.expire(current)
+    return True
+
+
+def similar_projects(
+        db: Session,
+        project_id: int,
+        min_similarity: float = 0.0,
+        exclude_connected: bool = True
+) -> List[Dict[str, Any]]:
+    """
+    Кандидаты в похожие проекты: те, что делят с проектом хотя бы одну
+    корзину LSH, с оценкой сходства по сигнатурам, по убыванию сходства.
+    Попарного сравнения со всеми проектами нет — только с кандидатами
+    из корзин (не больше SIMILARITY_MAX_CANDIDATES). Видимость проектов
+    проверяет вызывающий.
+    """
+    source = db.get(ProjectMinhash, project_id)
+    if source is None:
+        return []
+
+    rows = db.execute(text("""
+        SELECT c.project_id, count(*) AS bands, m.signature
+        FROM project_lsh_buckets b
+        CROSS JOIN LATERAL (
+            SELECT o.project_id FROM project_lsh_buckets o
+            WHERE o.band = b.band AND o.bucket = b.bucket AND o.project_id <> b.project_id
+            LIMIT :fanout
+        ) c
+        JOIN project_minhash m ON m.project_id = c.project_id
+        WHERE b.project_id = :project_id
+          AND (NOT :exclude_connected OR NOT EXISTS (
+              SELECT 1 FROM project_connections pc
+              WHERE (pc.project_id = :project_id AND pc.related_project_id = c.project_id)
+                 OR (pc.project_id = c.project_id AND pc.related_project_id = :project_id)
+          ))
+        GROUP BY c.project_id, m.signature
+        ORDER BY bands DESC, c.project_id
+        LIMIT :candidates
+    """), {
+        "project_id": project_id,
+        "fanout": SIMILARITY_BUCKET_FANOUT,
+        "candidates": SIMILARITY_MAX_CANDIDATES,
+        "exclude_connected": exclude_connected,
+    }).all()
+
+    signature = unpack_signature(source.signature)
+    result = []
+    for candidate_id, bands, packed in rows:
+        score = estimate_similarity(signature, unpack_signature(packed))
+        if score >= min_similarity:
+            result.append({"project_id": candidate_id, "similarity": score, "shared_bands": bands})
+    result.sort(key=lambda r: (-r["similarity"], r["project_id"]))
+    return result
+
+
+def reindex_projects(db: Session, after_id: int, limit: int = SIMILARITY_BACKFILL_BATCH) -> Tuple[int, int, Optional[int]]:
+    """
+    Переиндексирует порцию живых проектов с id > after_id.
+    Возвращает (просмотрено, обновлено, последний id или None, если порция была последней).
+    """
+    projects = db.execute(
+        select(Project)
+        .where(Project.id > after_id, Project.deleted_at.is_(None))
+        .order_by(Project.id)
+        .limit(limit)
+    ).scalars().all()
+    updated = sum(1 for project in projects if index_project(db, project))
+    last_id = projects[-1].id if len(projects) == limit else None
+    return len(projects), updated, last_id
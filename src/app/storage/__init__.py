@@ -0,0 +1,4 @@
+from .storage import (
+    StorageBackend, MinioBackend, LocalFSBackend, ObjectStat,
+    StorageError, ObjectNotFound, get_storage, set_storage
+)
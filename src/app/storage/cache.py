@@ -0,0 +1,218 @@
+import hashlib
+import os
+import tempfile
+import threading
+import time
+import uuid
+from typing import Dict, Optional
+
+from app.storage.storage import StorageBackend, STREAM_CHUNK_SIZE
+
+# Локальный дисковый кэш для часто скачиваемых файлов
+DOWNLOAD_CACHE_DIR = os.getenv("DOWNLOAD_CACHE_DIR", "")  # пусто — кэш выключен
+DOWNLOAD_CACHE_MAX_BYTES = int(os.getenv("DOWNLOAD_CACHE_MAX_BYTES", str(2 * 1024 * 1024 * 1024)))
+DOWNLOAD_CACHE_MAX_OBJECT_BYTES = int(os.getenv("DOWNLOAD_CACHE_MAX_OBJECT_BYTES", str(100 * 1024 * 1024)))
+# Временные файлы (.fill-*, .serve-*) старше этого считаются брошенными упавшим процессом
+DOWNLOAD_CACHE_STALE_SECONDS = float(os.getenv("DOWNLOAD_CACHE_STALE_SECONDS", "3600"))
+
+_TEMP_PREFIXES = (".fill-", ".serve-")
+
+
+class DiskCache:
+    """
+    Ограниченный по размеру LRU-кэш объектов хранилища на локальном диске.
+
+    Ключ кэша — (ключ объекта, ETag): новая версия объекта получает новую запись,
+    а старая вытесняется по LRU. Одновременные промахи по одному объекту
+    заполняют кэш один раз — остальные запросы ждут первый.
+
+    Каталог может быть общим для нескольких процессов (воркеры uvicorn):
+    состояние кэша — сам каталог. Попадание проверяется по наличию файла,
+    давность использования — по mtime, а предел размера при вытеснении
+    считается по содержимому каталога, а не по счётчику процесса.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, max_object_bytes: int):
+        self.directory = os.path.abspath(directory)
+        self.max_bytes = max_bytes
+        self.max_object_bytes = max_object_bytes
+        self._lock = threading.Lock()
+        self._filling: Dict[str, threading.Event] = {}
+        self._size = 0
+        self._entries = 0
+        self.hits = 0
+        self.misses = 0
+        self.fills = 0
+        self.evictions = 0
+        self.bypasses = 0
+        os.makedirs(self.directory, exist_ok=True)
+        with self._lock:
+            self._evict_locked()
+
+    @staticmethod
+    def _entry_name(key: str, etag: str) -> str:
+        return hashlib.sha256(f"{key}\0{etag}".encode("utf-8")).hexdigest()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _evict_locked(self):
+        # Пересчёт по каталогу: записи других процессов тоже занимают место.
+        # Временные файлы удаляем, только если они давно брошены — свежие
+        # принадлежат идущим заполнениям и ответам других процессов
+        now = time.time()
+        files = []
+        for entry in os.scandir(self.directory):
+            try:
+                st = entry.stat()
+            except FileNotFoundError:
+                continue
+            if entry.name.startswith(_TEMP_PREFIXES):
+                if now - st.st_mtime > DOWNLOAD_CACHE_STALE_SECONDS:
+                    self.release(entry.path)
+            elif entry.is_file():
+                files.append((st.st_mtime, entry.name, st.st_size))
+        total = sum(size for _, _, size in files)
+        files.sort()
+        evicted = 0
+        while total > self.max_bytes and evicted < len(files):
+            _, name, size = files[evicted]
+            evicted += 1
+            total -= size
+            self.release(self._path(name))
+        self.evictions += evicted
+        self._size = total
+        self._entries = len(files) - evicted
+
+    def _link(self, name: str) -> Optional[str]:
+        # Жёсткая ссылка на запись для одного ответа; None — записи нет
+        # (не заполнялась или её вытеснил другой процесс)
+        path = self._path(f".serve-{uuid.uuid4().hex}")
+        try:
+            os.link(self._path(name), path)
+        except FileNotFoundError:
+            return None
+        # ctime ссылки обновляется, а mtime — нет: им отмечаем использование для LRU
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return path
+
+    def checkout(
+            self,
+            storage: StorageBackend,
+            key: str,
+            etag: Optional[str],
+            size: Optional[int] = None
+    ) -> Optional[str]:
+        """
+        Путь к локальной копии объекта для одного ответа или None, если объект
+        не кэшируется (нет ETag или он больше DOWNLOAD_CACHE_MAX_OBJECT_BYTES).
+        При промахе объект скачивается в кэш. Возвращается жёсткая ссылка на
+        запись кэша: вытеснение записи во время отдачи (sendfile) её не трогает.
+        После ответа путь отдают в release().
+        """
+        if not etag or (size is not None and size > self.max_object_bytes):
+            with self._lock:
+                self.bypasses += 1
+            return None
+
+        name = self._entry_name(key, etag)
+        while True:
+            path = self._link(name)
+            if path is not None:
+                with self._lock:
+                    self.hits += 1
+                return path
+            with self._lock:
+                event = self._filling.get(name)
+                if event is None:
+                    event = threading.Event()
+                    self._filling[name] = event
+                    self.misses += 1
+                    break
+            # Этот объект уже качает другой запрос — ждём и проверяем снова
+            event.wait()
+
+        try:
+            return self._fill(storage, key, name)
+        finally:
+            with self._lock:
+                del self._filling[name]
+            event.set()
+
+    @staticmethod
+    def release(path: str) -> None:
+        """Удаляет ссылку, выданную checkout(), после отдачи ответа"""
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+    def _fill(self, storage: StorageBackend, key: str, name: str) -> Optional[str]:
+        fd, tmp = tempfile.mkstemp(dir=self.directory, prefix=".fill-")
+        size = 0
+        try:
+            src = storage.get(key)
+            try:
+                with os.fdopen(fd, "wb") as out:
+                    while True:
+                        chunk = src.read(STREAM_CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        size += len(chunk)
+                        if size > self.max_object_bytes:
+                            raise OverflowError
+                        out.write(chunk)
+            finally:
+                src.close()
+                if hasattr(src, "release_conn"):
+                    src.release_conn()
+            os.replace(tmp, self._path(name))
+        except OverflowError:
+            os.unlink(tmp)
+            with self._lock:
+                self.bypasses += 1
+            return None
+        except BaseException:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+
+        with self._lock:
+            self.fills += 1
+            self._evict_locked()
+        # Объект мог сразу же вытесниться, если кэш меньше объекта
+        return self._link(name)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "bypasses": self.bypasses,
+                "fills": self.fills,
+                "evictions": self.evictions,
+                "hit_ratio": (self.hits / lookups) if lookups else 0.0,
+                "entries": self._entries,  # по последнему пересчёту каталога
+                "size_bytes": self._size,
+                "max_bytes": self.max_bytes,
+            }
+
+
+_cache: Optional[DiskCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_download_cache() -> Optional[DiskCache]:
+    """Кэш скачиваний или None, если DOWNLOAD_CACHE_DIR не задан"""
+    global _cache
+    if not DOWNLOAD_CACHE_DIR:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = DiskCache(DOWNLOAD_CACHE_DIR, DOWNLOAD_CACHE_MAX_BYTES, DOWNLOAD_CACHE_MAX_OBJECT_BYTES)
+    return _cache
@@ -0,0 +1,117 @@
+import hashlib
+import os
+from typing import Optional
+
+try:
+    import zstandard
+except ImportError:  # сжатие необязательно: без пакета файлы хранятся как есть
+    zstandard = None
+
+# Прозрачное сжатие хорошо сжимаемых файлов при записи в хранилище
+STORAGE_COMPRESSION = os.getenv("STORAGE_COMPRESSION", "off")  # off | zstd
+STORAGE_COMPRESSION_LEVEL = int(os.getenv("STORAGE_COMPRESSION_LEVEL", "3"))
+
+CODEC_ZSTD = "zstd"
+
+COMPRESSIBLE_TYPES = {
+    "application/json",
+    "application/ld+json",
+    "application/x-ndjson",
+    "application/xml",
+    "application/javascript",
+    "application/sql",
+    "application/x-yaml",
+    "application/yaml",
+    "image/svg+xml",
+}
+COMPRESSIBLE_EXTENSIONS = {
+    ".csv", ".tsv", ".txt", ".json", ".jsonl", ".ndjson", ".xml", ".md",
+    ".log", ".sql", ".yaml", ".yml", ".html", ".htm", ".svg", ".tex",
+}
+
+
+def choose_codec(content_type: Optional[str], file_name: Optional[str] = None) -> Optional[str]:
+    """Кодек для записи файла или None, если файл хранится без сжатия"""
+    if STORAGE_COMPRESSION != CODEC_ZSTD or zstandard is None:
+        return None
+    ctype = (content_type or "").split(";")[0].strip().lower()
+    if ctype.startswith("text/") or ctype in COMPRESSIBLE_TYPES:
+        return CODEC_ZSTD
+    # Браузеры часто присылают CSV и JSON как application/octet-stream
+    ext = os.path.splitext(file_name or "")[1].lower()
+    if ctype in ("", "application/octet-stream") and ext in COMPRESSIBLE_EXTENSIONS:
+        return CODEC_ZSTD
+    return None
+
+
+class CountingReader:
+    """Обёртка над потоком, считающая прочитанные байты и их MD5"""
+
+    def __init__(self, raw):
+        self._raw = raw
+        self._md5 = hashlib.md5()
+        self.count = 0
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._raw.read(size)
+        self._md5.update(data)
+        self.count += len(data)
+        return data
+
+    @property
+    def md5(self) -> str:
+        return self._md5.hexdigest()
+
+
+def compress_stream(reader, codec: str):
+    """Поток со сжатыми данными, читаемый по мере чтения исходного"""
+    if codec == CODEC_ZSTD:
+        return zstandard.ZstdCompressor(level=STORAGE_COMPRESSION_LEVEL).stream_reader(reader)
+    raise ValueError(f"Неизвестный кодек: {codec}")
+
+
+class _DecompressingReader:
+    def __init__(self, raw, codec: str):
+        if codec != CODEC_ZSTD:
+            raise ValueError(f"Неизвестный кодек: {codec}")
+        if zstandard is None:
+            raise RuntimeError("Для чтения файла нужен пакет zstandard")
+        self._raw = raw
+        self._reader = zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True)
+
+    def read(self, size: int = -1) -> bytes:
+        return self._reader.read(size)
+
+    def close(self):
+        try:
+            self._reader.close()
+        finally:
+            self._raw.close()
+            if hasattr(self._raw, "release_conn"):
+                self._raw.release_conn()
+
+
+def decompress_stream(raw, codec: Optional[str]):
+    """Поток с исходным содержимым объекта, записанного с кодеком codec"""
+    if not codec:
+        return raw
+    return _DecompressingReader(raw, codec)
+
+
+def accepts_encoding(accept_encoding: Optional[str], codec: str) -> bool:
+    """Принимает ли клиент ответ с Content-Encoding: codec"""
+    if not accept_encoding:
+        return False
+    for part in accept_encoding.split(","):
+        token, *params = [p.strip() for p in part.split(";")]
+        if token.lower() != codec:
+            continue
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    return float(value) > 0
+                except ValueError:
+                    return False
+        return True
+    return False
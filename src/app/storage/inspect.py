@@ -0,0 +1,221 @@
+import hashlib
+import os
+import re
+import struct
+from typing import Any, Dict, Optional, Tuple
+
+# Сколько первых байт файла сохраняем для определения типа и свойств
+INSPECT_HEAD_BYTES = 64 * 1024
+
+_PDF_PAGE_RE = re.compile(rb"/Type\s*/Page(?![a-zA-Z])")
+_PDF_OVERLAP = 32
+
+
+class InspectingReader:
+    """
+    Обёртка над загружаемым потоком: пока данные идут в хранилище, считает
+    SHA-256 и MD5, размер, запоминает начало файла для определения типа
+    и считает страницы PDF. Повторно читать объект не требуется.
+    """
+
+    def __init__(self, raw, file_name: Optional[str] = None):
+        self._raw = raw
+        self._file_name = file_name
+        self._sha256 = hashlib.sha256()
+        self._md5 = hashlib.md5()
+        self._head = bytearray()
+        self._pdf_tail = b""
+        self._pdf_pages = 0
+        self._is_pdf: Optional[bool] = None
+        self.size = 0
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._raw.read(size)
+        if data:
+            self._consume(data)
+        return data
+
+    def _consume(self, data: bytes) -> None:
+        self._sha256.update(data)
+        self._md5.update(data)
+        self.size += len(data)
+        if len(self._head) < INSPECT_HEAD_BYTES:
+            self._head += data[:INSPECT_HEAD_BYTES - len(self._head)]
+        if self._is_pdf is None and len(self._head) >= 5:
+            self._is_pdf = bytes(self._head[:5]) == b"%PDF-"
+        if self._is_pdf:
+            self._scan_pdf(data, final=False)
+
+    def _scan_pdf(self, data: bytes, final: bool) -> None:
+        # Совпадения на границе блоков: учитываем только те, что не были
+        # полностью в хвосте прошлого блока, а совпадение в самом конце
+        # откладываем до следующего блока (нужен символ после "/Page")
+        buf = self._pdf_tail + data
+        tail_len = len(self._pdf_tail)
+        for m in _PDF_PAGE_RE.finditer(buf):
+            if m.end() >= tail_len and (final or m.end() < len(buf)):
+                self._pdf_pages += 1
+        self._pdf_tail = buf[-_PDF_OVERLAP:]
+
+    @property
+    def sha256(self) -> str:
+        return self._sha256.hexdigest()
+
+    @property
+    def md5(self) -> str:
+        return self._md5.hexdigest()
+
+    def result(self) -> Dict[str, Any]:
+        """Итог проверки для file_metadata; вызывать после того, как поток дочитан"""
+        if self._is_pdf:
+            self._scan_pdf(b"", final=True)
+        head = bytes(self._head)
+        detected = sniff_mime(head, self._file_name)
+        result: Dict[str, Any] = {
+            "sha256": self.sha256,
+            "md5": self.md5,
+            "detected_type": detected,
+        }
+        properties: Dict[str, Any] = {}
+        if detected == "application/pdf" and self._pdf_pages:
+            properties["pages"] = self._pdf_pages
+        if detected.startswith("image/"):
+            dims = image_dimensions(head, detected)
+            if dims:
+                properties["width"], properties["height"] = dims
+        if properties:
+            result["properties"] = properties
+        return result
+
+
+def _zip_kind(head: bytes) -> str:
+    # Документы Office — это ZIP; различаем их по именам первых записей
+    if b"word/" in head:
+        return "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+    if b"xl/" in head:
+        return "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    if b"ppt/" in head:
+        return "application/vnd.openxmlformats-officedocument.presentationml.presentation"
+    if b"mimetypeapplication/vnd.oasis.opendocument.text" in head:
+        return "application/vnd.oasis.opendocument.text"
+    if b"mimetypeapplication/vnd.oasis.opendocument.spreadsheet" in head:
+        return "application/vnd.oasis.opendocument.spreadsheet"
+    return "application/zip"
+
+
+_MAGIC = [
+    (b"%PDF-", "application/pdf"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"BM", "image/bmp"),
+    (b"II*\x00", "image/tiff"),
+    (b"MM\x00*", "image/tiff"),
+    (b"\x1f\x8b", "application/gzip"),
+    (b"BZh", "application/x-bzip2"),
+    (b"\x28\xb5\x2f\xfd", "application/zstd"),
+    (b"7z\xbc\xaf\x27\x1c", "application/x-7z-compressed"),
+    (b"Rar!\x1a\x07", "application/vnd.rar"),
+    (b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1", "application/x-ole-storage"),
+    (b"ID3", "audio/mpeg"),
+    (b"OggS", "audio/ogg"),
+    (b"fLaC", "audio/flac"),
+    (b"\x1aE\xdf\xa3", "video/webm"),
+]
+
+_TEXT_EXTENSIONS = {
+    ".csv": "text/csv",
+    ".tsv": "text/tab-separated-values",
+    ".json": "application/json",
+    ".md": "text/markdown",
+    ".html": "text/html",
+    ".htm": "text/html",
+    ".xml": "application/xml",
+}
+
+
+def sniff_mime(head: bytes, file_name: Optional[str] = None) -> str:
+    """Тип содержимого по сигнатуре первых байт (без libmagic)"""
+    if head.startswith(b"PK\x03\x04"):
+        return _zip_kind(head)
+    for magic, mime in _MAGIC:
+        if head.startswith(magic):
+            return mime
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    if head[:4] == b"RIFF" and head[8:12] == b"WAVE":
+        return "audio/wav"
+    if head[4:8] == b"ftyp":
+        return "video/mp4"
+
+    # Текст: отрезаем возможный недописанный многобайтовый символ в конце
+    sample = head[:8192]
+    if b"\x00" in sample:
+        return "application/octet-stream"
+    try:
+        text = sample.decode("utf-8")
+    except UnicodeDecodeError as e:
+        if e.start < len(sample) - 4:
+            return "application/octet-stream"
+        text = sample[:e.start].decode("utf-8")
+
+    stripped = text.lstrip("﻿ \t\r\n").lower()
+    if stripped.startswith("<?xml"):
+        return "image/svg+xml" if "<svg" in stripped[:1024] else "application/xml"
+    if stripped.startswith("<svg"):
+        return "image/svg+xml"
+    if stripped.startswith("<!doctype html") or stripped.startswith("<html"):
+        return "text/html"
+    ext = os.path.splitext(file_name or "")[1].lower()
+    if ext in _TEXT_EXTENSIONS:
+        return _TEXT_EXTENSIONS[ext]
+    if stripped[:1] in ("{", "["):
+        return "application/json"
+    return "text/plain"
+
+
+def image_dimensions(head: bytes, mime: str) -> Optional[Tuple[int, int]]:
+    """Ширина и высота изображения по заголовку файла"""
+    try:
+        if mime == "image/png" and len(head) >= 24:
+            return struct.unpack(">II", head[16:24])
+        if mime == "image/gif" and len(head) >= 10:
+            return struct.unpack("<HH", head[6:10])
+        if mime == "image/bmp" and len(head) >= 26:
+            width, height = struct.unpack("<ii", head[18:26])
+            return width, abs(height)
+        if mime == "image/webp" and len(head) >= 30:
+            chunk = head[12:16]
+            if chunk == b"VP8 ":
+                width, height = struct.unpack("<HH", head[26:30])
+                return width & 0x3FFF, height & 0x3FFF
+            if chunk == b"VP8L":
+                bits = int.from_bytes(head[21:25], "little")
+                return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+            if chunk == b"VP8X":
+                return int.from_bytes(head[24:27], "little") + 1, int.from_bytes(head[27:30], "little") + 1
+        if mime == "image/jpeg":
+            return _jpeg_dimensions(head)
+    except struct.error:
+        return None
+    return None
+
+
+def _jpeg_dimensions(head: bytes) -> Optional[Tuple[int, int]]:
+    # Идём по сегментам до маркера SOFn
+    i = 2
+    while i + 9 < len(head):
+        if head[i] != 0xFF:
+            i += 1
+            continue
+        marker = head[i + 1]
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7 or marker == 0xFF:
+            i += 1 if marker == 0xFF else 2
+            continue
+        length = struct.unpack(">H", head[i + 2:i + 4])[0]
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            height, width = struct.unpack(">HH", head[i + 5:i + 9])
+            return width, height
+        i += 2 + length
+    return None
@@ -0,0 +1,415 @@
+import datetime
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from abc import ABC, abstractmethod
+from typing import BinaryIO, Dict, Iterator, List, NamedTuple, Optional
+
+# Выбор и настройка хранилища
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "minio")  # minio | local
+STORAGE_LOCAL_ROOT = os.getenv("STORAGE_LOCAL_ROOT", "/var/lib/projecthub/files")
+
+MINIO_ENDPOINT = os.getenv("MINIO_ENDPOINT", "localhost:9000")
+MINIO_ACCESS_KEY = os.getenv("MINIO_ACCESS_KEY", "minioadmin")
+MINIO_SECRET_KEY = os.getenv("MINIO_SECRET_KEY", "minioadmin")
+MINIO_SECURE = os.getenv("MINIO_SECURE", "false").lower() == "true"
+MINIO_BUCKET = os.getenv("MINIO_BUCKET", "project-files")
+MINIO_POOL_MAXSIZE = int(os.getenv("MINIO_POOL_MAXSIZE", "32"))
+MINIO_CONNECT_TIMEOUT = float(os.getenv("MINIO_CONNECT_TIMEOUT", "5"))
+MINIO_READ_TIMEOUT = float(os.getenv("MINIO_READ_TIMEOUT", "60"))
+MINIO_RETRIES = int(os.getenv("MINIO_RETRIES", "3"))
+
+STREAM_CHUNK_SIZE = 256 * 1024
+
+
+class StorageError(Exception):
+    pass
+
+
+class ObjectNotFound(StorageError):
+    pass
+
+
+class ObjectStat(NamedTuple):
+    key: str
+    size: int
+    etag: Optional[str]
+    content_type: Optional[str]
+    last_modified: Optional[datetime.datetime]
+
+
+class StorageBackend(ABC):
+    """
+    Интерфейс хранилища объектов. Все ключи — строки вида "projects/1/abc.pdf".
+    Потоки, возвращаемые get/get_range, нужно закрывать вызовом close().
+    """
+
+    @abstractmethod
+    def put(self, key: str, data: BinaryIO, length: int, content_type: Optional[str] = None) -> ObjectStat:
+        """Записывает объект; length = -1, если размер заранее неизвестен"""
+
+    @abstractmethod
+    def get(self, key: str):
+        """Поток с содержимым объекта (read()/stream())"""
+
+    @abstractmethod
+    def get_range(self, key: str, offset: int, length: Optional[int] = None):
+        """Поток с частью объекта начиная с offset"""
+
+    @abstractmethod
+    def stat(self, key: str) -> ObjectStat:
+        pass
+
+    @abstractmethod
+    def copy(self, src_key: str, dst_key: str) -> None:
+        """Копирование на стороне хранилища, без передачи данных через приложение"""
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        """Удаление; удаление отсутствующего объекта не считается ошибкой"""
+
+    def delete_many(self, keys: List[str]) -> List[str]:
+        """Удаляет несколько объектов, возвращает ключи, которые удалить не удалось"""
+        failed = []
+        for key in keys:
+            try:
+                self.delete(key)
+            except StorageError:
+                failed.append(key)
+        return failed
+
+    @abstractmethod
+    def list(self, prefix: str = "", start_after: Optional[str] = None) -> Iterator[ObjectStat]:
+        """Объекты с префиксом в лексикографическом порядке ключей"""
+
+    @abstractmethod
+    def url(self, key: str) -> str:
+        pass
+
+    def local_path(self, key: str) -> Optional[str]:
+        """Путь на локальном диске, если объект можно отдать через sendfile"""
+        return None
+
+
+class MinioBackend(StorageBackend):
+    def __init__(
+            self,
+            endpoint: str = MINIO_ENDPOINT,
+            access_key: str = MINIO_ACCESS_KEY,
+            secret_key: str = MINIO_SECRET_KEY,
+            secure: bool = MINIO_SECURE,
+            bucket: str = MINIO_BUCKET,
+            pool_maxsize: int = MINIO_POOL_MAXSIZE,
+            connect_timeout: float = MINIO_CONNECT_TIMEOUT,
+            read_timeout: float = MINIO_READ_TIMEOUT,
+            retries: int = MINIO_RETRIES
+    ):
+        import certifi
+        import urllib3
+        from minio import Minio
+
+        # Собственный пул соединений: размер пула должен покрывать параллельные
+        # загрузки и предвыборку ZIP, иначе потоки ждут свободное соединение
+        http_client = urllib3.PoolManager(
+            num_pools=4,
+            maxsize=pool_maxsize,
+            timeout=urllib3.Timeout(connect=connect_timeout, read=read_timeout),
+            cert_reqs="CERT_REQUIRED",
+            ca_certs=certifi.where(),
+            retries=urllib3.Retry(
+                total=retries,
+                backoff_factor=0.2,
+                status_forcelist=[500, 502, 503, 504]
+            )
+        )
+        self.client = Minio(
+            endpoint,
+            access_key=access_key,
+            secret_key=secret_key,
+            secure=secure,
+            http_client=http_client
+        )
+        self.endpoint = endpoint
+        self.bucket = bucket
+        self._bucket_ready = False
+        self._bucket_lock = threading.Lock()
+
+    def _ensure_bucket(self):
+        # Проверяем бакет один раз на процесс, а не перед каждой загрузкой
+        if self._bucket_ready:
+            return
+        with self._bucket_lock:
+            if not self._bucket_ready:
+                if not self.client.bucket_exists(self.bucket):
+                    self.client.make_bucket(self.bucket)
+                self._bucket_ready = True
+
+    def _wrap(self, err, key: str):
+        from minio.error import S3Error
+        if isinstance(err, S3Error) and err.code in ("NoSuchKey", "NoSuchObject"):
+            return ObjectNotFound(key)
+        return StorageError(str(err))
+
+    def put(self, key, data, length, content_type=None):
+        from minio.error import S3Error
+        self._ensure_bucket()
+        try:
+            result = self.client.put_object(
+                bucket_name=self.bucket,
+                object_name=key,
+                data=data,
+                length=length,
+                content_type=content_type or "application/octet-stream",
+                part_size=10 * 1024 * 1024 if length < 0 else 0
+            )
+        except S3Error as err:
+            raise self._wrap(err, key) from err
+        return ObjectStat(key, length, result.etag, content_type, None)
+
+    def get(self, key):
+        from minio.error import S3Error
+        try:
+            return self.client.get_object(self.bucket, key)
+        except S3Error as err:
+            raise self._wrap(err, key) from err
+
+    def get_range(self, key, offset, length=None):
+        from minio.error import S3Error
+        try:
+            return self.client.get_object(self.bucket, key, offset=offset, length=length or 0)
+        except S3Error as err:
+            raise self._wrap(err, key) from err
+
+    def stat(self, key):
+        from minio.error import S3Error
+        try:
+            st = self.client.stat_object(self.bucket, key)
+        except S3Error as err:
+            raise self._wrap(err, key) from err
+        return ObjectStat(key, st.size, st.etag, st.content_type, st.last_modified)
+
+    def copy(self, src_key, dst_key):
+        from minio.commonconfig import CopySource
+        from minio.error import S3Error
+        try:
+            self.client.copy_object(self.bucket, dst_key, CopySource(self.bucket, src_key))
+        except S3Error as err:
+            raise self._wrap(err, src_key) from err
+
+    def delete(self, key):
+        from minio.error import S3Error
+        try:
+            self.client.remove_object(self.bucket, key)
+        except S3Error as err:
+            raise self._wrap(err, key) from err
+
+    def delete_many(self, keys):
+        from minio.deleteobjects import DeleteObject
+        failed = []
+        # remove_objects сам разбивает список на запросы по 1000 ключей
+        for error in self.client.remove_objects(self.bucket, (DeleteObject(k) for k in keys)):
+            failed.append(error.name)
+        return failed
+
+    def list(self, prefix="", start_after=None):
+        for obj in self.client.list_objects(
+                self.bucket, prefix=prefix or None, recursive=True, start_after=start_after
+        ):
+            if obj.is_dir:
+                continue
+            yield ObjectStat(obj.object_name, obj.size, obj.etag, None, obj.last_modified)
+
+    def url(self, key):
+        return f"{self.endpoint}/{self.bucket}/{key}"
+
+
+class _RangeReader:
+    """Чтение не более length байт из открытого файла"""
+
+    def __init__(self, f, length: Optional[int]):
+        self._f = f
+        self._left = length
+
+    def read(self, size: int = -1) -> bytes:
+        if self._left is not None:
+            if self._left <= 0:
+                return b""
+            size = self._left if size is None or size < 0 else min(size, self._left)
+        data = self._f.read(size)
+        if self._left is not None:
+            self._left -= len(data)
+        return data
+
+    def close(self):
+        self._f.close()
+
+
+class LocalFSBackend(StorageBackend):
+    """
+    Хранилище в локальной директории. Служебные метаданные (ETag, content-type)
+    лежат рядом в каталоге .meta. Удобно для тестов и нагрузочных прогонов
+    без MinIO, а скачивание идёт напрямую с диска через FileResponse.
+    """
+
+    META_DIR = ".meta"
+
+    def __init__(self, root: str = STORAGE_LOCAL_ROOT):
+        self.root = os.path.abspath(root)
+        os.makedirs(os.path.join(self.root, self.META_DIR), exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        path = os.path.abspath(os.path.join(self.root, key))
+        if not path.startswith(self.root + os.sep) or key.startswith(self.META_DIR + "/"):
+            raise StorageError(f"Недопустимый ключ объекта: {key}")
+        return path
+
+    def _meta_path(self, key: str) -> str:
+        return os.path.join(self.root, self.META_DIR, key + ".json")
+
+    def _read_meta(self, key: str) -> Dict:
+        try:
+            with open(self._meta_path(key), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def put(self, key, data, length, content_type=None):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        md5 = hashlib.md5()
+        size = 0
+        # Пишем во временный файл и атомарно переименовываем
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".upload-")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                while True:
+                    chunk = data.read(STREAM_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    md5.update(chunk)
+                    out.write(chunk)
+                    size += len(chunk)
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+
+        etag = md5.hexdigest()
+        meta_path = self._meta_path(key)
+        os.makedirs(os.path.dirname(meta_path), exist_ok=True)
+        with open(meta_path, "w", encoding="utf-8") as f:
+            json.dump({"etag": etag, "content_type": content_type}, f)
+        return ObjectStat(key, size, etag, content_type, None)
+
+    def get(self, key):
+        try:
+            return open(self._path(key), "rb")
+        except FileNotFoundError as err:
+            raise ObjectNotFound(key) from err
+
+    def get_range(self, key, offset, length=None):
+        f = self.get(key)
+        f.seek(offset)
+        return _RangeReader(f, length)
+
+    def stat(self, key):
+        try:
+            st = os.stat(self._path(key))
+        except FileNotFoundError as err:
+            raise ObjectNotFound(key) from err
+        meta = self._read_meta(key)
+        return ObjectStat(
+            key, st.st_size, meta.get("etag"), meta.get("content_type"),
+            datetime.datetime.utcfromtimestamp(st.st_mtime)
+        )
+
+    def copy(self, src_key, dst_key):
+        dst = self._path(dst_key)
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        try:
+            shutil.copyfile(self._path(src_key), dst)
+        except FileNotFoundError as err:
+            raise ObjectNotFound(src_key) from err
+        meta_dst = self._meta_path(dst_key)
+        os.makedirs(os.path.dirname(meta_dst), exist_ok=True)
+        with open(meta_dst, "w", encoding="utf-8") as f:
+            json.dump(self._read_meta(src_key), f)
+
+    def delete(self, key):
+        for path in (self._path(key), self._meta_path(key)):
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+    def list(self, prefix="", start_after=None):
+        yield from self._walk(self.root, "", prefix, start_after)
+
+    def _walk(self, directory: str, rel: str, prefix: str, start_after: Optional[str]):
+        # Каталог сортируется как "имя/", тогда порядок совпадает с порядком полных ключей
+        try:
+            entries = list(os.scandir(directory))
+        except FileNotFoundError:
+            return
+        keyed = []
+        for entry in entries:
+            if not rel and entry.name == self.META_DIR:
+                continue
+            if entry.name.startswith(".upload-"):
+                continue
+            is_dir = entry.is_dir(follow_symlinks=False)
+            keyed.append((rel + entry.name + ("/" if is_dir else ""), entry, is_dir))
+        keyed.sort(key=lambda item: item[0])
+
+        for key, entry, is_dir in keyed:
+            if is_dir:
+                # Пропускаем каталоги, которые целиком не подходят под префикс
+                if not (key.startswith(prefix) or prefix.startswith(key)):
+                    continue
+                yield from self._walk(entry.path, key, prefix, start_after)
+                continue
+            if not key.startswith(prefix):
+                continue
+            if start_after is not None and key <= start_after:
+                continue
+            st = entry.stat()
+            yield ObjectStat(
+                key, st.st_size, self._read_meta(key).get("etag"), None,
+                datetime.datetime.utcfromtimestamp(st.st_mtime)
+            )
+
+    def url(self, key):
+        return f"file://{self._path(key)}"
+
+    def local_path(self, key):
+        path = self._path(key)
+        return path if os.path.exists(path) else None
+
+
+_storage: Optional[StorageBackend] = None
+_storage_lock = threading.Lock()
+
+
+def get_storage() -> StorageBackend:
+    """Хранилище, выбранное переменной окружения STORAGE_BACKEND (создаётся один раз)"""
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                if STORAGE_BACKEND == "local":
+                    _storage = LocalFSBackend()
+                elif STORAGE_BACKEND == "minio":
+                    _storage = MinioBackend()
+                else:
+                    raise StorageError(f"Неизвестное хранилище: {STORAGE_BACKEND}")
+    return _storage
+
+
+def set_storage(backend: StorageBackend) -> None:
+    """Подменяет хранилище (для тестов и нагрузочных прогонов)"""
+    global _storage
+    _storage = backend
@@ -0,0 +1,6 @@
+from .taxonomy import get_subject_tree, invalidate_subject_tree, build_forest, SubtreeNotFound
+from .relocation import (
+    relocate_subject_area, continue_relocation, RelocationError, RelocationInProgress
+)
+from .stats import subject_area_stats, attach_subject_area_stats, rebuild_subject_area_stats
+from .importer import import_taxonomy, parse_nested_json, parse_parent_csv, TaxonomyImportError
@@ -0,0 +1,36 @@
+# Импорт классификатора предметных областей:
+# python -m app.taxonomy import taxonomy.json --user-id 1 [--parent-id 10]
+import argparse
+import json
+import sys
+import time
+
+from app.database import SessionLocal
+from app.taxonomy import import_taxonomy, parse_nested_json, parse_parent_csv, TaxonomyImportError
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Импорт предметных областей")
+    sub = parser.add_subparsers(dest="command", required=True)
+    imp = sub.add_parser("import", help="Импорт из вложенного JSON или CSV (ref, parent_ref, name, description)")
+    imp.add_argument("file")
+    imp.add_argument("--user-id", type=int, required=True, help="Автор создаваемых областей")
+    imp.add_argument("--parent-id", type=int, default=None, help="Существующая область, под которую встанут корни")
+    imp.add_argument("--format", choices=["json", "csv"], default=None, help="По умолчанию — по расширению файла")
+    args = parser.parse_args()
+
+    fmt = args.format or ("csv" if args.file.lower().endswith(".csv") else "json")
+    with open(args.file, "rb") as f:
+        data = f.read()
+
+    started = time.monotonic()
+    db = SessionLocal()
+    try:
+        nodes = parse_parent_csv(data) if fmt == "csv" else parse_nested_json(data)
+        result = import_taxonomy(db, nodes, args.user_id, args.parent_id)
+    except TaxonomyImportError as e:
+        db.rollback()
+        print("\n".join(e.errors), file=sys.stderr)
+        sys.exit(1)
+    finally:
+        db.close()
+    print(json.dumps({"imported": result["imported"], "seconds": round(time.monotonic() - started, 2)}))
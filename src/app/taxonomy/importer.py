@@ -0,0 +1,181 @@
+import csv
+import datetime
+import io
+import json
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+MAX_NAME_LENGTH = 255
+MAX_REPORTED_ERRORS = 100
+
+
+class TaxonomyImportError(ValueError):
+    def __init__(self, errors: List[str]):
+        super().__init__("; ".join(errors[:5]))
+        self.errors = errors[:MAX_REPORTED_ERRORS]
+
+
+# Узел импорта: (ref, parent_ref, name, description); parent_ref None — корень импорта
+ImportNode = Tuple[str, Optional[str], str, Optional[str]]
+
+
+def parse_nested_json(data: bytes) -> List[ImportNode]:
+    """
+    Вложенный JSON: список узлов {"name", "description", "children": [...]}
+    (или один такой объект). Ссылки на узлы генерируются по позиции.
+    """
+    try:
+        tree = json.loads(data.decode("utf-8-sig"))
+    except (UnicodeDecodeError, ValueError) as e:
+        raise TaxonomyImportError([f"Некорректный JSON: {e}"])
+    if isinstance(tree, dict):
+        tree = [tree]
+    if not isinstance(tree, list):
+        raise TaxonomyImportError(["Ожидается список узлов или один узел"])
+
+    nodes: List[ImportNode] = []
+    errors: List[str] = []
+    # Обход без рекурсии: глубина классификатора не ограничена стеком Python
+    stack = [(item, None, str(i)) for i, item in reversed(list(enumerate(tree)))]
+    while stack:
+        item, parent_ref, ref = stack.pop()
+        if not isinstance(item, dict):
+            errors.append(f"Узел {ref}: ожидается объект")
+            continue
+        nodes.append((ref, parent_ref, item.get("name"), item.get("description")))
+        children = item.get("children") or []
+        if not isinstance(children, list):
+            errors.append(f"Узел {ref}: children должен быть списком")
+            continue
+        for i in range(len(children) - 1, -1, -1):
+            stack.append((children[i], ref, f"{ref}.{i}"))
+    if errors:
+        raise TaxonomyImportError(errors)
+    return nodes
+
+
+def parse_parent_csv(data: bytes) -> List[ImportNode]:
+    """CSV со столбцами ref, parent_ref, name[, description]; пустой parent_ref — корень"""
+    try:
+        reader = csv.DictReader(io.StringIO(data.decode("utf-8-sig")))
+    except UnicodeDecodeError as e:
+        raise TaxonomyImportError([f"Файл не в UTF-8: {e}"])
+    missing = {"ref", "parent_ref", "name"} - set(reader.fieldnames or [])
+    if missing:
+        raise TaxonomyImportError([f"Нет столбцов: {', '.join(sorted(missing))}"])
+    return [
+        ((row["ref"] or "").strip(), (row["parent_ref"] or "").strip() or None,
+         row["name"], row.get("description") or None)
+        for row in reader
+    ]
+
+
+def validate_nodes(nodes: List[ImportNode]) -> List[int]:
+    """
+    Проверяет узлы до записи в БД: пустые и длинные имена, повторные ссылки,
+    несуществующие родители и циклы. Возвращает порядок узлов, в котором
+    родитель всегда идёт раньше детей.
+    """
+    errors: List[str] = []
+    index: Dict[str, int] = {}
+    for i, (ref, _, name, description) in enumerate(nodes):
+        if not ref:
+            errors.append(f"Строка {i + 1}: пустой ref")
+        elif ref in index:
+            errors.append(f"Повторяющийся ref: {ref}")
+        else:
+            index[ref] = i
+        if not isinstance(name, str) or not name.strip():
+            errors.append(f"Узел {ref}: пустое имя")
+        elif len(name) > MAX_NAME_LENGTH:
+            errors.append(f"Узел {ref}: имя длиннее {MAX_NAME_LENGTH} символов")
+        if description is not None and not isinstance(description, str):
+            errors.append(f"Узел {ref}: описание должно быть строкой")
+
+    children: Dict[int, List[int]] = {}
+    roots: List[int] = []
+    for i, (ref, parent_ref, _, _) in enumerate(nodes):
+        if parent_ref is None:
+            roots.append(i)
+        elif parent_ref not in index:
+            errors.append(f"Узел {ref}: родитель {parent_ref} не найден в файле")
+        else:
+            children.setdefault(index[parent_ref], []).append(i)
+    if errors:
+        raise TaxonomyImportError(errors)
+
+    # Обход от корней: узлы, до которых не дошли, лежат на циклах
+    order: List[int] = []
+    queue = deque(roots)
+    while queue:
+        i = queue.popleft()
+        order.append(i)
+        queue.extend(children.get(i, ()))
+    if len(order) != len(nodes):
+        reached = set(order)
+        cyclic = [nodes[i][0] for i in range(len(nodes)) if i not in reached]
+        raise TaxonomyImportError([f"Цикл в родительских ссылках: {', '.join(cyclic[:20])}"])
+    return order
+
+
+def import_taxonomy(
+        db: Session,
+        nodes: List[ImportNode],
+        user_id: int,
+        parent_id: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Импортирует узлы одной транзакцией: id резервируются из последовательности
+    одним запросом, пути считаются в памяти, строки пишутся через COPY.
+    parent_id — существующая область, под которую встают корни импорта.
+    """
+    order = validate_nodes(nodes)
+    if not nodes:
+        return {"imported": 0, "ids": {}}
+
+    parent_path = None
+    if parent_id is not None:
+        parent_path = db.execute(
+            text("SELECT path::text FROM subject_areas WHERE id = :id AND path IS NOT NULL"), {"id": parent_id}
+        ).scalar()
+        if parent_path is None:
+            raise TaxonomyImportError([f"Родительская область {parent_id} не найдена"])
+
+    new_ids = [r[0] for r in db.execute(
+        text("SELECT nextval('subject_areas_id_seq') FROM generate_series(1, :n)"), {"n": len(nodes)}
+    ).all()]
+
+    ids: Dict[str, int] = {}
+    paths: Dict[str, str] = {}
+    created_at = datetime.datetime.utcnow().isoformat(sep=" ")
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for new_id, i in zip(new_ids, order):
+        ref, parent_ref, name, description = nodes[i]
+        if parent_ref is None:
+            node_parent_id = parent_id
+            path = f"{parent_path}.{new_id}" if parent_path else str(new_id)
+        else:
+            node_parent_id = ids[parent_ref]
+            path = f"{paths[parent_ref]}.{new_id}"
+        ids[ref] = new_id
+        paths[ref] = path
+        writer.writerow([new_id, name.strip(), description if description is not None else None,
+                         user_id, node_parent_id, created_at, path])
+    buffer.seek(0)
+
+    # COPY через соединение сессии — в той же транзакции
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.copy_expert(
+            "COPY subject_areas (id, name, description, user_id, parent_id, created_at, path) "
+            "FROM STDIN WITH (FORMAT csv)",
+            buffer
+        )
+    finally:
+        cursor.close()
+    db.commit()
+    return {"imported": len(nodes), "ids": ids}
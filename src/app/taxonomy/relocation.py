@@ -0,0 +1,123 @@
+import os
+import time
+from typing import Any, Dict, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from sqlalchemy_utils import Ltree
+
+from app.jobs.jobs import enqueue_job
+from app.models import Job, SubjectArea
+from app.taxonomy.taxonomy import invalidate_subject_tree
+
+SUBJECT_MOVE_BATCH = int(os.getenv("SUBJECT_MOVE_BATCH", "1000"))
+# Поддеревья не больше этого размера переносятся сразу, в транзакции запроса;
+# большие — фоновой задачей порциями по SUBJECT_MOVE_BATCH строк
+SUBJECT_MOVE_INLINE_LIMIT = int(os.getenv("SUBJECT_MOVE_INLINE_LIMIT", "2000"))
+SUBJECT_MOVE_RUN_SECONDS = float(os.getenv("SUBJECT_MOVE_RUN_SECONDS", "30"))
+
+RELOCATE_JOB = "subject_area.relocate"
+
+_REWRITE_SQL = """
+    UPDATE subject_areas
+    SET path = CASE
+        WHEN path = CAST(:old_root AS ltree) THEN CAST(:new_root AS ltree)
+        ELSE CAST(:new_root AS ltree) || subpath(path, nlevel(CAST(:old_root AS ltree)))
+    END
+"""
+
+
+class RelocationError(ValueError):
+    pass
+
+
+class RelocationInProgress(RuntimeError):
+    pass
+
+
+def parent_path_for_move(db: Session, node_id: int, new_parent_id: int) -> str:
+    """
+    Путь нового родителя с проверкой цикла одним запросом: родитель не может
+    лежать в поддереве переносимого узла. LookupError — родителя нет.
+    """
+    row = db.execute(text("""
+        SELECT p.path::text AS parent_path, coalesce(p.path <@ n.path, false) AS in_subtree
+        FROM subject_areas p JOIN subject_areas n ON n.id = :node_id
+        WHERE p.id = :parent_id
+    """), {"node_id": node_id, "parent_id": new_parent_id}).first()
+    if row is None:
+        raise LookupError(new_parent_id)
+    if new_parent_id == node_id or row.in_subtree:
+        raise RelocationError("Нельзя перенести предметную область в её собственное поддерево")
+    return row.parent_path
+
+
+def relocation_in_progress(db: Session) -> bool:
+    return db.query(Job.id).filter(Job.kind == RELOCATE_JOB, Job.status.in_(["pending", "running"])).first() is not None
+
+
+def relocate_subject_area(db: Session, node: SubjectArea, new_parent_id: Optional[int]) -> bool:
+    """
+    Переносит узел под new_parent_id (None — в корень) в текущей транзакции
+    (коммит — за вызывающим кодом). Небольшое поддерево перезаписывается сразу;
+    для большого ставится фоновая задача, и функция возвращает True.
+    """
+    # Переносы выполняются по одному: без блокировки два встречных переноса
+    # (A под B и B под A) оба прошли бы проверку цикла. Блокировка держится
+    # до конца транзакции вызывающего, после неё путь узла перечитывается
+    db.execute(text("SELECT pg_advisory_xact_lock(hashtext(:key))"), {"key": RELOCATE_JOB})
+    db.refresh(node, ["path", "parent_id"])
+    if relocation_in_progress(db):
+        raise RelocationInProgress("Идёт перенос другого поддерева, повторите позже")
+
+    if new_parent_id is None:
+        new_root = str(node.id)
+    else:
+        parent_path = parent_path_for_move(db, node.id, new_parent_id)
+        new_root = f"{parent_path}.{node.id}" if parent_path else str(node.id)
+
+    node.parent_id = new_parent_id
+    old_root = str(node.path) if node.path is not None else None
+    if old_root is None or old_root == new_root:
+        node.path = Ltree(new_root)
+        return False
+
+    db.flush()
+    size = db.execute(text("SELECT count(*) FROM subject_areas WHERE path <@ CAST(:old_root AS ltree)"),
+                      {"old_root": old_root}).scalar()
+    if size <= SUBJECT_MOVE_INLINE_LIMIT:
+        db.execute(text(_REWRITE_SQL + " WHERE path <@ CAST(:old_root AS ltree)"),
+                   {"old_root": old_root, "new_root": new_root})
+        db.expire(node, ["path"])
+        return False
+
+    enqueue_job(db, RELOCATE_JOB, {
+        "subject_area_id": node.id, "old_root": old_root, "new_root": new_root, "total": size
+    }, dedupe_key=f"{RELOCATE_JOB}:{node.id}")
+    return True
+
+
+def continue_relocation(db: Session, payload: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Перезаписывает пути поддерева порциями, каждая — в своей транзакции.
+    Уже перенесённые строки не подходят под old_root, поэтому после сбоя
+    перезапуск просто продолжает с оставшихся.
+    """
+    deadline = time.monotonic() + SUBJECT_MOVE_RUN_SECONDS
+    params = {"old_root": payload["old_root"], "new_root": payload["new_root"], "batch": SUBJECT_MOVE_BATCH}
+    moved = 0
+    while True:
+        count = db.execute(text(_REWRITE_SQL + """
+            WHERE id IN (
+                SELECT id FROM subject_areas WHERE path <@ CAST(:old_root AS ltree)
+                ORDER BY path LIMIT :batch
+            )
+        """), params).rowcount
+        db.commit()
+        moved += count
+        if count < SUBJECT_MOVE_BATCH:
+            invalidate_subject_tree()
+            return {"moved": moved, "total": payload.get("total"), "done": True}
+        if time.monotonic() > deadline:
+            enqueue_job(db, RELOCATE_JOB, payload)
+            return {"moved": moved, "total": payload.get("total"), "continued": True}
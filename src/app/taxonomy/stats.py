@@ -0,0 +1,70 @@
+from typing import Any, Dict, List
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+# Собственные счётчики проектов хранятся по предметной области и ведутся
+# триггером на projects; суммы по поддереву считаются при чтении по path,
+# поэтому перенос поддерева не требует пересчёта
+_STATS_SQL = """
+    SELECT a.id,
+           coalesce(own.projects_total, 0) AS own_total,
+           coalesce(own.projects_active, 0) AS own_active,
+           coalesce(own.projects_paused, 0) AS own_paused,
+           coalesce(own.projects_completed, 0) AS own_completed,
+           coalesce(sum(s.projects_total), 0) AS subtree_total,
+           coalesce(sum(s.projects_active), 0) AS subtree_active,
+           coalesce(sum(s.projects_paused), 0) AS subtree_paused,
+           coalesce(sum(s.projects_completed), 0) AS subtree_completed
+    FROM subject_areas a
+    LEFT JOIN subject_area_project_stats own ON own.subject_area_id = a.id
+    LEFT JOIN subject_areas d ON d.path <@ a.path
+    LEFT JOIN subject_area_project_stats s ON s.subject_area_id = d.id
+    WHERE a.id = ANY(:ids)
+    GROUP BY a.id, own.projects_total, own.projects_active, own.projects_paused, own.projects_completed
+"""
+
+_FIELDS = ("total", "active", "paused", "completed")
+
+
+def subject_area_stats(db: Session, ids: List[int]) -> Dict[int, Dict[str, Dict[str, int]]]:
+    """Счётчики проектов для областей ids: {"own": {...}, "subtree": {...}} одним запросом"""
+    if not ids:
+        return {}
+    result: Dict[int, Dict[str, Dict[str, int]]] = {}
+    for row in db.execute(text(_STATS_SQL), {"ids": list(ids)}).mappings():
+        result[row["id"]] = {
+            "own": {f: int(row[f"own_{f}"]) for f in _FIELDS},
+            "subtree": {f: int(row[f"subtree_{f}"]) for f in _FIELDS},
+        }
+    return result
+
+
+def attach_subject_area_stats(db: Session, areas: List[Any]) -> List[Any]:
+    """Заполняет own_stats и subtree_stats у объектов SubjectArea для SubjectAreaRead"""
+    stats = subject_area_stats(db, [a.id for a in areas])
+    for area in areas:
+        area_stats = stats.get(area.id)
+        area.own_stats = area_stats["own"] if area_stats else None
+        area.subtree_stats = area_stats["subtree"] if area_stats else None
+    return areas
+
+
+def rebuild_subject_area_stats(db: Session) -> int:
+    """Пересчитывает таблицу счётчиков с нуля (после миграции или для сверки)"""
+    db.execute(text("LOCK TABLE subject_area_project_stats IN EXCLUSIVE MODE"))
+    db.execute(text("DELETE FROM subject_area_project_stats"))
+    inserted = db.execute(text("""
+        INSERT INTO subject_area_project_stats
+            (subject_area_id, projects_total, projects_active, projects_paused, projects_completed)
+        SELECT subject_area_id,
+               count(*),
+               count(*) FILTER (WHERE status = 'в работе'),
+               count(*) FILTER (WHERE status = 'приостановлен'),
+               count(*) FILTER (WHERE status = 'завершен')
+        FROM projects
+        WHERE subject_area_id IS NOT NULL AND deleted_at IS NULL
+        GROUP BY subject_area_id
+    """)).rowcount
+    db.commit()
+    return inserted
@@ -0,0 +1,158 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+# Кэш сериализованного дерева. В пределах процесса сбрасывается при изменении
+# предметных областей; TTL ограничивает устаревание в других процессах
+SUBJECT_TREE_CACHE_TTL = float(os.getenv("SUBJECT_TREE_CACHE_TTL", "60"))
+# Ключ кэша приходит от клиента (root_id, depth): число записей ограничено,
+# вытесняются давно не читанные; depth глубже предела равносилен пределу
+SUBJECT_TREE_CACHE_SIZE = int(os.getenv("SUBJECT_TREE_CACHE_SIZE", "256"))
+SUBJECT_TREE_MAX_DEPTH = int(os.getenv("SUBJECT_TREE_MAX_DEPTH", "64"))
+
+_cache: "OrderedDict[Tuple[Optional[int], Optional[int]], Tuple[float, str, bytes]]" = OrderedDict()
+_cache_lock = threading.Lock()
+_generation = 0
+
+
+class SubtreeNotFound(LookupError):
+    pass
+
+
+def invalidate_subject_tree() -> None:
+    """Сбрасывает кэш дерева (вызывается после изменения предметных областей)"""
+    global _generation
+    with _cache_lock:
+        _cache.clear()
+        _generation += 1
+
+
+_STATS_COLUMNS = ("projects_total", "projects_active", "projects_paused", "projects_completed")
+
+
+def _load_rows(db: Session, root_id: Optional[int], depth: Optional[int], with_stats: bool):
+    # Со статистикой поддерево читается целиком: суммы по поддереву должны
+    # учитывать и узлы глубже depth, лишние уровни отрезаются при сборке
+    columns = "a.id, a.name, a.description, a.user_id, a.parent_id, a.created_at, a.path::text AS path, nlevel(a.path) AS level"
+    joins = ""
+    if with_stats:
+        columns += "".join(f", coalesce(s.{c}, 0) AS {c}" for c in _STATS_COLUMNS)
+        joins = "LEFT JOIN subject_area_project_stats s ON s.subject_area_id = a.id"
+    sql_depth = None if with_stats else depth
+
+    if root_id is None:
+        rows = db.execute(text(f"""
+            SELECT {columns}
+            FROM subject_areas a {joins}
+            WHERE a.path IS NOT NULL AND (CAST(:depth AS integer) IS NULL OR nlevel(a.path) <= :depth + 1)
+            ORDER BY a.path
+        """), {"depth": sql_depth}).mappings().all()
+        return rows, (depth + 1 if depth is not None else None)
+
+    root = db.execute(text("SELECT path FROM subject_areas WHERE id = :id AND path IS NOT NULL"),
+                      {"id": root_id}).first()
+    if root is None:
+        raise SubtreeNotFound(root_id)
+    rows = db.execute(text(f"""
+        SELECT {columns}
+        FROM subject_areas a {joins}
+        WHERE a.path <@ CAST(:root AS ltree)
+          AND (CAST(:depth AS integer) IS NULL OR nlevel(a.path) <= nlevel(CAST(:root AS ltree)) + :depth)
+        ORDER BY a.path
+    """), {"root": str(root.path), "depth": sql_depth}).mappings().all()
+    root_level = len(str(root.path).split("."))
+    return rows, (root_level + depth if depth is not None else None)
+
+
+def build_forest(rows, max_level: Optional[int] = None, with_stats: bool = False) -> List[Dict[str, Any]]:
+    """
+    Вложенное дерево из строк, упорядоченных по path, за один проход:
+    узел цепляется к родителю, если тот есть в выборке, иначе становится корнем.
+    Со статистикой второй проход в обратном порядке складывает счётчики
+    проектов детей в родителей (subtree_stats).
+    """
+    nodes: Dict[int, Dict[str, Any]] = {}
+    ordered: List[Dict[str, Any]] = []
+    roots: List[Dict[str, Any]] = []
+    for row in rows:
+        node = {
+            "id": row["id"],
+            "name": row["name"],
+            "description": row["description"],
+            "user_id": row["user_id"],
+            "parent_id": row["parent_id"],
+            "created_at": row["created_at"].isoformat() if row["created_at"] else None,
+            "path": row["path"],
+            "children": [],
+        }
+        if with_stats:
+            own = {c[len("projects_"):]: row[c] for c in _STATS_COLUMNS}
+            node["own_stats"] = own
+            node["subtree_stats"] = dict(own)
+            ordered.append(node)
+        nodes[node["id"]] = node
+        if max_level is not None and row["level"] > max_level:
+            node["_hidden"] = True
+            continue
+        parent = nodes.get(node["parent_id"])
+        if parent is not None:
+            parent["children"].append(node)
+        else:
+            roots.append(node)
+
+    for node in reversed(ordered):
+        parent = nodes.get(node["parent_id"])
+        if parent is not None:
+            for name, value in node["subtree_stats"].items():
+                parent["subtree_stats"][name] += value
+    for node in nodes.values():
+        node.pop("_hidden", None)
+    return roots
+
+
+def get_subject_tree(
+        db: Session,
+        root_id: Optional[int] = None,
+        depth: Optional[int] = None,
+        with_stats: bool = False
+) -> Tuple[str, bytes]:
+    """
+    Дерево предметных областей (весь лес или поддерево root_id не глубже depth)
+    в виде готового JSON и его ETag. Бросает SubtreeNotFound, если корня нет.
+    with_stats добавляет к узлам счётчики проектов (свои и по поддереву);
+    такой вариант не кэшируется — счётчики меняются с каждым проектом.
+    """
+    if depth is not None:
+        depth = min(depth, SUBJECT_TREE_MAX_DEPTH)
+    cache_key = (root_id, depth)
+    now = time.monotonic()
+    with _cache_lock:
+        cached = None if with_stats else _cache.get(cache_key)
+        if cached is not None and now - cached[0] < SUBJECT_TREE_CACHE_TTL:
+            _cache.move_to_end(cache_key)
+            return cached[1], cached[2]
+        generation = _generation
+
+    rows, max_level = _load_rows(db, root_id, depth, with_stats)
+    body = json.dumps(build_forest(rows, max_level, with_stats), ensure_ascii=False,
+                      separators=(",", ":")).encode("utf-8")
+    etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+    if with_stats:
+        return etag, body
+    with _cache_lock:
+        # Если дерево успели изменить, пока мы его строили, не кэшируем
+        if generation == _generation:
+            _cache[cache_key] = (now, etag, body)
+            _cache.move_to_end(cache_key)
+            for key in [k for k, (cached_at, _, _) in _cache.items() if now - cached_at >= SUBJECT_TREE_CACHE_TTL]:
+                del _cache[key]
+            while len(_cache) > SUBJECT_TREE_CACHE_SIZE:
+                _cache.popitem(last=False)
+    return etag, body
@@ -0,0 +1,37 @@
+import io
+
+import pytest
+
+openpyxl = pytest.importorskip("openpyxl")
+pytest.importorskip("pandas")
+
+from app.reports.engine import build_table  # noqa: E402
+
+
+def _xlsx(rows):
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    for row in rows:
+        sheet.append(row)
+    data = io.BytesIO()
+    workbook.save(data)
+    data.seek(0)
+    return data
+
+
+def test_build_table_from_small_xlsx():
+    source = _xlsx([
+        ["id", "amount", "group"],
+        ["007", 1.5, "a"],
+        ["x9", 2, "b"],
+        ["010", None, "a"],
+    ])
+    table = build_table(source, "xlsx", {"group_by": ["group"], "aggregate": ["amount"]})
+
+    assert [(c["name"], c["type"]) for c in table["columns"]] == [
+        ("id", "text"), ("amount", "number"), ("group", "text")
+    ]
+    assert table["row_count"] == 3
+    assert table["rows"] == [["007", 1.5, "a"], ["x9", 2.0, "b"], ["010", None, "a"]]
+    assert {tuple(g["key"]): g["rows"] for g in table["groups"]} == {("a",): 2, ("b",): 1}
+    assert table["columns"][1]["sum"] == 3.5